@@ -0,0 +1,50 @@
+# -*- coding: UTF-8 -*-
+"""
+比较 example/json.py 的语法在解释执行、正则融合与编译后的吞吐量
+
+    $ python benchmarks/bench_json.py [语料大小(KB)]
+
+更多语法、执行方式及内存、对象数的比较见suite.py
+"""
+import sys
+import time
+
+from cases import json_corpus, json_grammar
+
+__author__ = 'Gaufoo, zhongzc_arch@outlook.com'
+
+
+def throughput(parser, text: str, repeat: int = 3) -> float:
+    """
+    :return float: 每秒解析的字符数（取多次运行中最快的一次）
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        state = parser.run(text)
+        elapsed = time.perf_counter() - start
+        assert state.is_successful() and state.text.isEOF()
+        best = elapsed if best is None else min(best, elapsed)
+    return len(text) / best
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    text = json_corpus(size * 1024)
+    parser = json_grammar()
+    optimized = parser.optimize()
+    compiled = parser.compile()
+    assert parser.run(text).result.get() == compiled.run(text).result.get()
+
+    slow = throughput(parser, text)
+    fused = throughput(optimized, text)
+    fast = throughput(compiled, text)
+    print('input:       {} chars'.format(len(text)))
+    print('interpreted: {:>12,.0f} chars/s'.format(slow))
+    print('optimized:   {:>12,.0f} chars/s'.format(fused))
+    print('compiled:    {:>12,.0f} chars/s'.format(fast))
+    print('speedup:     {:.1f}x'.format(fast / slow))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+# -*- coding: UTF-8 -*-
+"""
+基准测试用的语法及可复现的合成语料
+
+每个用例为 (语法工厂, 语料生成函数)，语料生成函数接受目标字符数及随机种子，
+同样的参数总是生成同样的语料，因此不同版本、不同执行方式的结果可以直接比较
+"""
+import importlib.util
+import os
+import random
+import string as _string
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import gparser as gp  # NOQA: E402
+
+__author__ = 'Gaufoo, zhongzc_arch@outlook.com'
+
+
+def load_example(name: str):
+    path = os.path.join(os.path.dirname(__file__), '..', 'example',
+                        name + '.py')
+    spec = importlib.util.spec_from_file_location('example_' + name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def json_corpus(size: int, seed: int = 0) -> str:
+    """
+    :return str: 由形状相同的对象组成的JSON数组
+    """
+    rnd = random.Random(seed)
+    items, total, i = [], 0, 0
+    while total < size:
+        item = (
+            '{"id": %d, "name": "user%d", "score": %d.%d, "active": %s, '
+            '"tags": ["a", "b", null], "pos": {"x": -%d, "y": %de3}}' % (
+                i, i, rnd.randint(0, 100), rnd.randint(0, 9),
+                rnd.choice(['true', 'false']), rnd.randint(0, 99),
+                rnd.randint(0, 9)))
+        items.append(item)
+        total += len(item) + 4
+        i += 1
+    return '[\n  ' + ',\n  '.join(items) + '\n]'
+
+
+def nested_corpus(size: int, seed: int = 0, depth: int = 40) -> str:
+    """
+    :return str: 由最深depth层的嵌套数组组成的JSON数组
+    """
+    rnd = random.Random(seed)
+    items, total = [], 0
+    while total < size:
+        d = rnd.randint(depth // 2, depth)
+        item = '[' * d + str(rnd.randint(0, 9)) + ']' * d
+        items.append(item)
+        total += len(item) + 2
+    return '[' + ', '.join(items) + ']'
+
+
+def calc_corpus(size: int, seed: int = 0) -> str:
+    """
+    :return str: 由带括号的四则运算项相加组成的表达式，除数均不为0
+    """
+    rnd = random.Random(seed)
+
+    def term(depth: int) -> str:
+        if depth == 0 or rnd.random() < 0.3:
+            return '{}.{}'.format(rnd.randint(1, 999), rnd.randint(0, 9))
+        op = rnd.choice('+-*/')
+        return '({} {} {})'.format(term(depth - 1), op, term(depth - 1))
+
+    terms, total = [], 0
+    while total < size:
+        t = term(4)
+        terms.append(t)
+        total += len(t) + 3
+    return ' + '.join(terms)
+
+
+def lines_corpus(size: int, seed: int = 0) -> str:
+    """
+    :return str: 长度不一的文本行
+    """
+    rnd = random.Random(seed)
+    letters = _string.ascii_letters + _string.digits + ' ,.;'
+    lines, total = [], 0
+    while total < size:
+        line = ''.join(rnd.choice(letters)
+                       for _ in range(rnd.randint(20, 200)))
+        lines.append(line)
+        total += len(line) + 1
+    return '\n'.join(lines) + '\n'
+
+
+def calls_corpus(size: int, seed: int = 0) -> str:
+    """
+    :return str: 以 ( [ ; 之一结尾的标识符序列
+    """
+    rnd = random.Random(seed)
+    words, total = [], 0
+    while total < size:
+        word = ''.join(rnd.choice(_string.ascii_lowercase)
+                       for _ in range(rnd.randint(3, 30)))
+        word += rnd.choice('([;')
+        words.append(word)
+        total += len(word)
+    return ''.join(words)
+
+
+def json_grammar() -> gp.Parser:
+    return load_example('json').json_parser()
+
+
+def calc_grammar() -> gp.Parser:
+    return load_example('calc').calc_parser()
+
+
+def lines_grammar() -> gp.Parser:
+    """
+    逐字符的长重复
+    """
+    return gp.many(gp.many(gp.none_of('\n')).map(''.join) << gp.char('\n'))
+
+
+def calls_grammar() -> gp.Parser:
+    """
+    共享长前缀的分支：前两个分支失败时回溯，同一个标识符最多被解析三次，
+    packrat模式下word的结果被记忆化
+    """
+    word = gp.undef()
+    word.assign(gp.many1(gp.one_of(_string.ascii_lowercase)).map(''.join))
+    call = gp.maybe(word << gp.char('(')).map(lambda w: ('call', w))
+    index = gp.maybe(word << gp.char('[')).map(lambda w: ('index', w))
+    stmt = (word << gp.char(';')).map(lambda w: ('stmt', w))
+    return gp.many(call | index | stmt)
+
+
+CASES = {
+    'json': (json_grammar, json_corpus),
+    'calc': (calc_grammar, calc_corpus),
+    'nested': (json_grammar, nested_corpus),
+    'lines': (lines_grammar, lines_corpus),
+    'backtrack': (calls_grammar, calls_corpus),
+}
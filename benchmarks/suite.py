@@ -0,0 +1,162 @@
+# -*- coding: UTF-8 -*-
+"""
+基准测试套件：在cases.py中的各语法及语料上，比较不同执行方式的
+吞吐量(chars/s)、峰值内存及每KB输入创建的对象数
+
+    $ python benchmarks/suite.py [--size KB] [--case json --mode compiled]
+                                 [--save out.json] [--compare old.json]
+
+--save保存结果，--compare与之前保存的结果（如上一个版本）逐项比较
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from cases import CASES, gp
+
+__author__ = 'Gaufoo, zhongzc_arch@outlook.com'
+
+
+def _chunks(text: str, size: int = 1 << 16):
+    for i in range(0, len(text), size):
+        yield text[i:i + size]
+
+
+# 执行方式 -> (准备Parser, 解析)
+MODES = {
+    'interpreted': (lambda p: p, lambda p, text: p.run(text)),
+    'optimized': (lambda p: p.optimize(), lambda p, text: p.run(text)),
+    'compiled': (lambda p: p.compile(), lambda p, text: p.run(text)),
+    'packrat': (lambda p: p, lambda p, text: p.run(text, packrat=True)),
+    'stream': (lambda p: p, lambda p, text: p.run_stream(_chunks(text))),
+}
+
+
+def throughput(run, parser, text: str, repeat: int) -> float:
+    """
+    :return float: 每秒解析的字符数（取多次运行中最快的一次）
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        state = run(parser, text)
+        elapsed = time.perf_counter() - start
+        if not state.is_successful() or state.pos != len(text):
+            raise RuntimeError('解析失败：\n{}'.format(state))
+        best = elapsed if best is None else min(best, elapsed)
+    return len(text) / best
+
+
+def peak_memory(run, parser, text: str) -> int:
+    """
+    :return int: 解析期间新分配内存的峰值（字节），不含输入本身
+    """
+    tracemalloc.start()
+    try:
+        run(parser, text)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def allocations(run, parser, text: str) -> int:
+    """
+    :return int: 解析期间gparser中各类对象（State、Result、Parser等）的
+                 构造次数，不含元组、列表等内置对象
+    """
+    root = os.path.dirname(os.path.abspath(gp.__file__))
+    ours = {}  # 代码对象 -> 是否为gparser中的构造函数
+    count = 0
+
+    def profile(frame, event, _):
+        nonlocal count
+        if event != 'call':
+            return
+        code = frame.f_code
+        hit = ours.get(code)
+        if hit is None:
+            hit = ours[code] = code.co_name == '__init__' and \
+                os.path.abspath(code.co_filename).startswith(root)
+        if hit:
+            count += 1
+
+    sys.setprofile(profile)
+    try:
+        run(parser, text)
+    finally:
+        sys.setprofile(None)
+    return count
+
+
+def measure(case: str, mode: str, size: int, repeat: int,
+            seed: int = 0) -> dict:
+    grammar, corpus = CASES[case]
+    prepare, run = MODES[mode]
+    text = corpus(size, seed)
+    parser = prepare(grammar())
+    run(parser, text)  # 预热：建立跳转表等只在首次解析时进行的工作
+    return {
+        'case': case,
+        'mode': mode,
+        'chars': len(text),
+        'chars_per_sec': throughput(run, parser, text, repeat),
+        'peak_kb': peak_memory(run, parser, text) / 1024,
+        'allocs_per_kb': allocations(run, parser, text) * 1024 / len(text),
+    }
+
+
+def report(results: list, baseline: list = None):
+    old = {(r['case'], r['mode']): r for r in baseline or ()}
+    header = '{:<10} {:<12} {:>14} {:>10} {:>11}'.format(
+        'case', 'mode', 'chars/s', 'peak KB', 'allocs/KB')
+    print(header + ('  vs baseline' if old else ''))
+    for r in results:
+        line = '{:<10} {:<12} {:>14,.0f} {:>10,.0f} {:>11,.1f}'.format(
+            r['case'], r['mode'], r['chars_per_sec'], r['peak_kb'],
+            r['allocs_per_kb'])
+        prev = old.get((r['case'], r['mode']))
+        if prev is not None:
+            line += '  {:>5.2f}x speed'.format(
+                r['chars_per_sec'] / prev['chars_per_sec'])
+            if prev['allocs_per_kb']:
+                line += ', {:>5.2f}x allocs'.format(
+                    r['allocs_per_kb'] / prev['allocs_per_kb'])
+        print(line)
+
+
+def main():
+    ap = argparse.ArgumentParser(description='gparser基准测试')
+    ap.add_argument('--size', type=int, default=64,
+                    help='每个语料的大小（KB），默认64')
+    ap.add_argument('--case', action='append', choices=sorted(CASES),
+                    help='只运行指定用例，可重复')
+    ap.add_argument('--mode', action='append', choices=list(MODES),
+                    help='只使用指定执行方式，可重复')
+    ap.add_argument('--repeat', type=int, default=3,
+                    help='计时的重复次数，取最快一次')
+    ap.add_argument('--seed', type=int, default=0, help='语料的随机种子')
+    ap.add_argument('--save', help='将结果保存为JSON文件')
+    ap.add_argument('--compare', help='与之前保存的结果比较')
+    args = ap.parse_args()
+
+    results = [measure(case, mode, args.size * 1024, args.repeat, args.seed)
+               for case in args.case or CASES
+               for mode in args.mode or MODES]
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    report(results, baseline)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': platform.python_version(),
+                       'size_kb': args.size, 'seed': args.seed,
+                       'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,8 @@
 # -*- coding: UTF-8 -*-
 import gparser as gp
 
-if __name__ == '__main__':
+
+def calc_parser() -> gp.Parser:
     pNum = (gp.regex(r'\d+(\.\d+)?').map(lambda n: float(n))).tk()
     pAdd = (gp.char('+') >> gp.just(lambda x, y: x + y)).tk()
     pSub = (gp.char('-') >> gp.just(lambda x, y: x - y)).tk()
@@ -9,18 +10,22 @@ if __name__ == '__main__':
     pDiv = (gp.char('/') >> gp.just(lambda x, y: x / y)).tk()
 
     pExp = gp.undef()
-    pFactor = gp.undef()
-    pTerm = gp.undef()
 
-    # Exp = Factor (( '+' | '-' ) Factor)*
-    pExp.assign(gp.chain_left(pFactor, pAdd | pSub).tk())
+    # Term = <数字> | '(' Exp ')'
+    pTerm = pNum | gp.between(gp.char('(').tk(), pExp, gp.char(')').tk())
 
+    # Exp = Factor (( '+' | '-' ) Factor)*
     # Factor = Term (( '*' | '/' ) Term)*
-    pFactor.assign(gp.chain_left(pTerm, pMul | pDiv).tk())
+    # 两级运算符由expression按优先级一次解析
+    pExp.assign(gp.expression(pTerm, [
+        ('left', pMul | pDiv),
+        ('left', pAdd | pSub),
+    ]).tk())
+    return pExp
 
-    # Term = <数字> | '(' Exp ')'
-    pTerm.assign(pNum | gp.between(gp.char('(').tk(), pExp, gp.char(')').tk()))
 
+if __name__ == '__main__':
+    pExp = calc_parser()
     res = pExp.run_strict('384.666 - 80 * (85.5 + 3)').result.value.get()
 
     assert res == (384.666 - 80 * (85.5 + 3))
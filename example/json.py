@@ -11,7 +11,8 @@ JObj = namedtuple('JObj', ['value'])
 JPair = namedtuple('JPair', ['key', 'value'])
 JArr = namedtuple('JArr', ['value'])
 
-if __name__ == '__main__':
+
+def json_parser() -> gp.Parser:
     digits = gp.regex(r'[0-9]+')
     exponent = (gp.one_of('eE') + gp.one_of('-+').or_not() +
                 digits).map(gp.concat)
@@ -35,7 +36,11 @@ if __name__ == '__main__':
         gp.char(',').tk()), gp.char('}')).map(JObj).tk()
 
     jExp.assign((obj | array | string | true | false | null | number).tk())
+    return jExp
 
+
+if __name__ == '__main__':
+    jExp = json_parser()
     str = """{
     "firstName": "John",
     "lastName": "Smith",
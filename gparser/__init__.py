@@ -1 +1,5 @@
 from .parser import *  # NOQA: F403,F401
+from .parallel import run_many, split_parse  # NOQA: F401
+from .profiler import Profiler, profile  # NOQA: F401
+from .incremental import Session  # NOQA: F401
+from .lexer import Lexer  # NOQA: F401
@@ -0,0 +1,123 @@
+# -*- coding: UTF-8 -*-
+"""
+按字节解析的Parser，用于bytes、bytearray、memoryview及mmap输入
+（见BytesText、Parser.run_mmap）
+
+与gparser.parser中的同名函数对应，成功值为bytes而非str。
+其他组合子（|、+、many、map等）对字节输入同样适用
+"""
+from typing import Callable
+
+from gparser.parser import Parser, label, regex as _regex, _describe
+from gparser.util.bytesText import BytesText
+from gparser.util.result import Result, Success, ParseError, expect
+from gparser.util.state import State
+
+__author__ = 'Gaufoo, zhongzc_arch@outlook.com'
+
+_BYTES = tuple(bytes((i,)) for i in range(256))  # 各字节的成功值，无需重复创建
+
+
+def _show(b: int) -> str:
+    """
+    :return str: 错误信息中显示的字节，可打印的ASCII字符原样显示
+    """
+    return chr(b) if 0x20 <= b < 0x7f else '\\x{:02x}'.format(b)
+
+
+def _byte(x) -> int:
+    if isinstance(x, int):
+        assert 0 <= x < 256
+        return x
+    assert len(x) == 1
+    return x[0]
+
+
+def satisfy(pred: Callable[[int], bool], charset: tuple = None) -> Parser:
+    """
+    若下一个字节满足判断条件(pred)，则解析成功
+
+    :param pred: 下一个字节（0~255的整数）该满足的条件
+    :param charset: pred的静态描述('in', bytes)或('notin', bytes)，可选
+    :return Parser: 成功值为该字节（长度为1的bytes）的Parser
+    """
+
+    exhausted = ParseError("再无输入可解析")
+    unsatisfied = ParseError("不满足条件")
+
+    @Parser
+    def inner(loc: BytesText, pos: int) -> State:
+        b = loc.byte_at(pos)
+        if b < 0:
+            return State(exhausted, loc, pos)
+        if pred(b):
+            return State(Success(Result(_BYTES[b])), loc, pos + 1)
+        return State(unsatisfied, loc, pos)
+
+    return _describe(inner, 'byte_satisfy', pred, charset)
+
+
+def char(x) -> Parser:
+    """
+    解析某一个字节
+
+    :param x: 长度为1的bytes或0~255的整数
+    :return Parser: 解析此字节的Parser
+    """
+    b = _byte(x)
+    return label(satisfy(lambda c: c == b, ('in', _BYTES[b])),
+                 'Excepted: ' + _show(b))
+
+
+def one_of(chrs: bytes) -> Parser:
+    """
+    解析chrs中的其中一个字节
+    """
+    allowed = frozenset(chrs)
+    return label(satisfy(allowed.__contains__, ('in', bytes(chrs))),
+                 'Excepted: one of ' + ','.join(map(_show, chrs)))
+
+
+def none_of(chrs: bytes) -> Parser:
+    """
+    解析chrs以外的任意一个字节
+    """
+    banned = frozenset(chrs)
+    return label(satisfy(lambda c: c not in banned, ('notin', bytes(chrs))),
+                 'Excepted: none of ' + ', '.join(map(_show, chrs)))
+
+
+def string(s: bytes) -> Parser:
+    """
+    解析字节串s，一次比较整个字节串。失败时与逐字节解析相同，
+    报告在第一个不匹配的字节处
+
+    :return Parser: 成功值为s的Parser
+    """
+    s = bytes(s)
+    success = Success(Result(s))
+    errors = [expect('Excepted: ' + _show(b)) for b in s]
+
+    @Parser
+    def inner(loc: BytesText, pos: int) -> State:
+        if loc.starts_with(s, pos):
+            return State(success, loc, pos + len(s))
+        k = 0
+        while loc.byte_at(pos + k) == s[k]:
+            k += 1
+        return State(errors[k], loc, pos + k)
+
+    return _describe(inner, 'byte_string', s)
+
+
+def regex(rex, flags: int = 0) -> Parser:
+    """
+    在当前位置匹配bytes正则表达式，见gparser.parser.regex
+
+    :param rex: bytes正则或已编译的bytes正则
+    :return Parser: 成功值为匹配的bytes（含命名组时为groupdict()）
+    """
+    p = _regex(rex, flags)
+    if not isinstance(p.node[1].pattern, bytes):
+        raise TypeError('需要bytes正则')
+    return p
@@ -0,0 +1,912 @@
+# -*- coding: UTF-8 -*-
+"""
+Parser编译器
+
+将Parser的组合结构(Parser.node)翻译成Python源码并执行，
+生成的函数直接在字符串及整数位置上运行，解析时不再创建中间Parser、
+State等对象。无法静态分析的Parser（如flatmap的结果、直接构造的Parser）
+会原样调用其fn，因此任何语法都可以编译。
+
+生成的函数签名为 f(loc, s, n, p)，成功时返回 (结束位置, 值)，
+失败时返回 (~失败位置, ParseError)。
+"""
+from functools import lru_cache
+
+from gparser.parser import Parser, _NO_OPERATOR, _reduce, _commit, \
+    _longest
+from gparser.optimizer import fuse
+from gparser.util.state import State
+from gparser.util.locatedText import LocatedText
+from gparser.util.result import Result, Success, ParseError, expect
+from gparser.util.memo import MemoTable
+
+__author__ = 'Gaufoo, zhongzc_arch@outlook.com'
+
+BOTTOM = 'bottom'  # 永远不会成功的Parser的值个数
+MAX_INDENT = 40  # 超过该缩进层数时拆分出独立函数
+MAX_LOOPS = 10  # 超过该循环嵌套层数时拆分出独立函数
+
+_LEAVES = {'satisfy', 'eof', 'just', 'fail', 'result', 'regex', 'string',
+           'literals', 'token', 'cut'}
+_PREDICATES = {str.isdigit: 'isdigit', str.isalpha: 'isalpha',
+               str.isspace: 'isspace', str.isalnum: 'isalnum'}
+
+
+def children(parser: Parser) -> tuple:
+    """
+    :return tuple: 该Parser在生成代码中直接引用的子Parser（可重复）
+    """
+    node = parser.node
+    if node is None:
+        return ()
+    kind = node[0]
+    if kind in ('or', 'seq', 'then', 'left'):
+        return node[1], node[2]
+    if kind in ('label', 'name', 'many', 'skip_many', 'maybe', 'memo', 'map',
+                'flatmap', 'rule', 'span', 'profiled'):
+        return node[1],
+    if kind == 'fused':
+        return node[3],
+    if kind == 'repeat1':
+        return node[1], node[2]
+    if kind in ('chain_left', 'chain_right'):
+        return node[1], node[2], node[1]
+    if kind == 'expression':
+        return node[1:5]
+    return ()
+
+
+def _join(x, y):
+    if x == BOTTOM:
+        return y
+    if y == BOTTOM or x == y:
+        return x
+    return None
+
+
+def _add(x, y):
+    if x == BOTTOM or y == BOTTOM:
+        return BOTTOM
+    if x is None or y is None:
+        return None
+    return x + y
+
+
+def _tup(vals) -> str:
+    if isinstance(vals, str):
+        return vals
+    return '(' + ''.join(v + ', ' for v in vals) + ')'
+
+
+def _args(vals) -> str:
+    if isinstance(vals, str):
+        return '*' + vals
+    return ', '.join(vals)
+
+
+def _first(vals) -> str:
+    """
+    与Result.get()一致：取第一个值，没有值时为None
+    """
+    if isinstance(vals, str):
+        return '({0}[0] if {0} else None)'.format(vals)
+    return vals[0] if vals else 'None'
+
+
+class _Compiler:
+    def __init__(self, root: Parser):
+        self.root = root
+        self.consts = {}  # id -> 常量名
+        self.errors = {}  # (错误信息, 是否带期望内容) -> 常量名
+        self.env = {'State': State, 'Success': Success, 'Result': Result,
+                    'ParseError': ParseError, 'memo_run': _memo_run,
+                    'grow_run': _grow_run, 'literal_fail': _literal_fail,
+                    'longest': _longest,
+                    'expression_run': _expression_run, 'commit': _commit}
+        self.units = {}  # id -> 函数名
+        self.pending = []
+        self.lines = []
+        self.counter = 0
+        self.override = None  # label直接修饰叶子时，替换叶子的错误信息
+        self.refs = {}
+        self.arities = {}
+        self.rule_arities = {}
+        self.cuts = False  # 是否可能通过cut，否则不生成相应的检查
+        self.__count_refs()
+        self.__solve_arities()
+
+    # ---------- 分析 ----------
+
+    def __count_refs(self):
+        seen = set()
+        stack = [self.root]
+        self.refs[id(self.root)] = 1
+        while stack:
+            parser = stack.pop()
+            if id(parser) in seen:
+                continue
+            seen.add(id(parser))
+            # 无法分析的Parser中也可能有cut
+            if parser.node is None or parser.node[0] in ('cut', 'flatmap'):
+                self.cuts = True
+            for c in children(parser):
+                self.refs[id(c)] = self.refs.get(id(c), 0) + 1
+                stack.append(c)
+
+    def __solve_arities(self):
+        while True:
+            self.arities = {}
+            before = dict(self.rule_arities)
+            for rule in [r for r in self.__rules()]:
+                self.rule_arities[id(rule)] = self.arity(rule.node[1])
+            if before == self.rule_arities:
+                break
+        self.arities = {}
+
+    def __rules(self):
+        seen = set()
+        stack = [self.root]
+        while stack:
+            parser = stack.pop()
+            if id(parser) in seen:
+                continue
+            seen.add(id(parser))
+            if parser.node is not None and parser.node[0] == 'rule':
+                yield parser
+            stack.extend(children(parser))
+
+    def arity(self, parser: Parser):
+        """
+        :return: 成功时产生的值的个数，None表示只能在运行时确定
+        """
+        key = id(parser)
+        if key in self.arities:
+            return self.arities[key]
+        node = parser.node
+        kind = node[0] if node is not None else None
+        if kind == 'rule':
+            return self.rule_arities.get(key, BOTTOM)
+        if kind in ('satisfy', 'just', 'regex', 'map', 'many',
+                    'chain_left', 'chain_right', 'expression', 'string',
+                    'literals', 'token'):
+            n = 1
+        elif kind in ('eof', 'skip_many', 'cut'):
+            n = 0
+        elif kind in ('fail', 'undef'):
+            n = BOTTOM
+        elif kind == 'result':
+            n = len(tuple(node[1]))
+        elif kind in ('label', 'name', 'maybe', 'memo'):
+            n = self.arity(node[1])
+        elif kind == 'fused':
+            n = len(node[2])
+        elif kind == 'span':
+            n = _add(self.arity(node[1]), 1)
+        elif kind == 'or':
+            n = _join(self.arity(node[1]), self.arity(node[2]))
+        elif kind == 'seq':
+            n = _add(self.arity(node[1]), self.arity(node[2]))
+        elif kind == 'then':
+            n = _add(0, self.arity(node[1]))
+            n = n if n == BOTTOM else self.arity(node[2])
+        elif kind == 'left':
+            n = _add(self.arity(node[1]), 0)
+            n = n if self.arity(node[2]) != BOTTOM else BOTTOM
+        elif kind == 'repeat1':
+            n = 1 if node[3] else 0
+        else:
+            n = None
+        self.arities[key] = n
+        return n
+
+    # ---------- 代码生成 ----------
+
+    def const(self, obj) -> str:
+        key = id(obj)
+        if key not in self.consts:
+            name = 'k{}'.format(len(self.consts))
+            self.consts[key] = name
+            self.env[name] = obj
+        return self.consts[key]
+
+    def tmp(self, prefix='v') -> str:
+        self.counter += 1
+        return '{}{}'.format(prefix, self.counter)
+
+    def w(self, ind: int, line: str):
+        self.lines.append('    ' * ind + line)
+
+    def error(self, msg: str, expected: bool = False) -> str:
+        """
+        :param expected: 是否为带期望内容的错误（见expect），如label
+        :return str: 与解释执行时相同的ParseError常量
+        """
+        key = (msg, expected)
+        if key not in self.errors:
+            self.errors[key] = self.const(
+                expect(msg) if expected else ParseError(msg))
+        return self.errors[key]
+
+    def fail(self, ind: int, msg: str, expected: bool = False):
+        self.w(ind, 'ok = False')
+        if self.override is not None:
+            msg, expected = self.override, True
+        self.w(ind, 'msg = ' + self.error(msg, expected))
+
+    def unit(self, parser: Parser) -> str:
+        key = id(parser)
+        if key not in self.units:
+            self.units[key] = 'u{}'.format(len(self.units))
+            self.pending.append(parser)
+        return self.units[key]
+
+    def build(self):
+        entry = self.unit(self.root)
+        source = []
+        while self.pending:
+            self.lines = []
+            self.gen_unit(self.pending.pop())
+            source.extend(self.lines)
+        source = '\n'.join(source) + '\n'
+        exec(compile(source, '<gparser>', 'exec'), self.env)
+        return self.env[entry], self.arity(self.root) == 1, source
+
+    def ret(self, ind: int, vals, n):
+        if n == 1:
+            value = vals if isinstance(vals, str) else vals[0]
+        elif n == BOTTOM:
+            value = '()'
+        else:
+            value = _tup(vals)
+        self.w(ind, 'if ok:')
+        self.w(ind + 1, 'return p, ' + value)
+        self.w(ind, 'return ~p, msg')
+
+    def gen_unit(self, parser: Parser):
+        name = self.units[id(parser)]
+        n = self.arity(parser)
+        kind = parser.node[0] if parser.node is not None else None
+        if kind in ('rule', 'memo'):
+            body = name + '_b'
+            self.w(0, 'def {}(loc, s, n, p):'.format(body))
+            self.ret(1, self.gen(parser.node[1], 1, 0), n)
+            key, single = self.const(parser), n == 1
+            self.w(0, 'def {}(loc, s, n, p):'.format(name))
+            if kind == 'rule' and parser.left_recursive:
+                self.w(1, 'return grow_run({}, {}, {}, loc, s, n, p)'.format(
+                    key, body, single))
+            elif kind == 'rule':
+                self.w(1, 'memo = loc.memo')
+                self.w(1, 'if memo is not None and memo.packrat:')
+                self.w(2, 'return memo_run({}, {}, {}, loc, s, n, p)'.format(
+                    key, body, single))
+                self.w(1, 'return {}(loc, s, n, p)'.format(body))
+            else:
+                self.w(1, 'if loc.memo is None:')
+                self.w(2, 'return {}(loc, s, n, p)'.format(body))
+                self.w(1, 'return memo_run({}, {}, {}, loc, s, n, p)'.format(
+                    key, body, single))
+        else:
+            self.w(0, 'def {}(loc, s, n, p):'.format(name))
+            self.ret(1, self.gen_inline(parser, 1, 0), n)
+
+    def gen(self, parser: Parser, ind: int, loops: int):
+        """
+        生成parser的代码，执行后 ok 表示是否成功，p 为结束（或失败）位置，
+        失败时 msg 为ParseError
+
+        :return: 成功值，变量名列表（个数确定）或元组变量名（个数不定）
+        """
+        node = parser.node
+        kind = node[0] if node is not None else None
+        if kind in ('rule', 'memo') or ind > MAX_INDENT or \
+                loops > MAX_LOOPS or \
+                (self.refs.get(id(parser), 0) > 1 and kind not in _LEAVES):
+            return self.gen_call(parser, ind)
+        return self.gen_inline(parser, ind, loops)
+
+    def gen_inline(self, parser: Parser, ind: int, loops: int):
+        node = parser.node
+        kind = node[0] if node is not None else None
+        method = getattr(self, 'gen_' + kind, None) if kind else None
+        if method is None or (kind == 'left' and
+                              self.arity(node[1]) != 1):
+            return self.gen_opaque(parser, ind)
+        return method(parser, ind, loops, *node[1:])
+
+    def gen_call(self, parser: Parser, ind: int):
+        name = self.unit(parser)
+        n = self.arity(parser)
+        v = self.tmp()
+        self.w(ind, 'p, {} = {}(loc, s, n, p)'.format(v, name))
+        self.returned(ind, v)
+        if n == 1:
+            return [v]
+        return self.unpack(ind, v, n)
+
+    def returned(self, ind: int, v: str):
+        """
+        由生成函数的返回值 (p, v) 设置 ok、p 及 msg
+        """
+        self.w(ind, 'if p >= 0:')
+        self.w(ind + 1, 'ok = True')
+        self.w(ind, 'else:')
+        self.w(ind + 1, 'ok = False')
+        self.w(ind + 1, 'p = ~p')
+        self.w(ind + 1, 'msg = ' + v)
+
+    def mark(self, ind: int) -> str:
+        """
+        记录已通过的cut数，供ended()判断失败是否发生在通过cut之后
+
+        :return str: 记录的变量名，语法中没有cut时为None
+        """
+        if not self.cuts:
+            return None
+        c = self.tmp('c')
+        self.w(ind, '{} = loc.cuts'.format(c))
+        return c
+
+    def ended(self, c: str) -> str:
+        """
+        :return str: 失败后能否正常结束（即之间没有通过cut）的表达式
+        """
+        return 'True' if c is None else 'loc.cuts == ' + c
+
+    def unpack(self, ind: int, t: str, n):
+        """
+        将元组变量t按值的个数n展开
+        """
+        if n is None:
+            return t
+        if n == BOTTOM or n == 0:
+            return []
+        vals = [self.tmp() for _ in range(n)]
+        self.w(ind, 'if ok:')
+        self.w(ind + 1, '{}, = {}'.format(', '.join(vals), t))
+        return vals
+
+    def gen_opaque(self, parser: Parser, ind: int):
+        t = self.tmp('t')
+        self.w(ind, 'st = {}.fn(loc, p)'.format(self.const(parser)))
+        self.w(ind, 'p = st.pos')
+        self.w(ind, 'if st.is_successful():')
+        self.w(ind + 1, 'ok = True')
+        self.w(ind + 1, '{} = tuple(st.result.value)'.format(t))
+        self.w(ind, 'else:')
+        self.w(ind + 1, 'ok = False')
+        self.w(ind + 1, 'msg = st.result')
+        return self.unpack(ind, t, self.arity(parser))
+
+    def gen_satisfy(self, parser, ind, loops, pred, charset):
+        v = self.tmp()
+        if charset is not None and charset[0] in ('in', 'notin'):
+            chrs = charset[1]
+            if len(chrs) == 1:
+                op = '==' if charset[0] == 'in' else '!='
+                test = '{} {} {!r}'.format(v, op, chrs)
+            else:
+                op = 'in' if charset[0] == 'in' else 'not in'
+                test = '{} {} {}'.format(v, op, self.const(frozenset(chrs)))
+        elif pred in _PREDICATES:
+            test = '{}.{}()'.format(v, _PREDICATES[pred])
+        else:
+            test = '{}({})'.format(self.const(pred), v)
+        self.w(ind, 'if p < n:')
+        self.w(ind + 1, '{} = s[p]'.format(v))
+        self.w(ind + 1, 'if {}:'.format(test))
+        self.w(ind + 2, 'p += 1')
+        self.w(ind + 2, 'ok = True')
+        self.w(ind + 1, 'else:')
+        self.fail(ind + 2, '不满足条件')
+        self.w(ind, 'else:')
+        self.fail(ind + 1, '再无输入可解析')
+        return [v]
+
+    def gen_eof(self, parser, ind, loops):
+        self.w(ind, 'if p == n:')
+        self.w(ind + 1, 'ok = True')
+        self.w(ind, 'else:')
+        self.fail(ind + 1, 'Excepted: <EOF>', True)
+        return []
+
+    def gen_label(self, parser, ind, loops, inner, msg):
+        if inner.node is not None and inner.node[0] in _LEAVES:
+            self.override = msg
+            try:
+                return self.gen_inline(inner, ind, loops)
+            finally:
+                self.override = None
+        vals = self.gen(inner, ind, loops)
+        self.w(ind, 'if not ok:')
+        self.w(ind + 1, 'msg = ' + self.error(msg, True))
+        return vals
+
+    def gen_name(self, parser, ind, loops, inner, rule_name):
+        return self.gen(inner, ind, loops)
+
+    def gen_cut(self, parser, ind, loops):
+        self.w(ind, 'commit(loc, p)')
+        self.w(ind, 'ok = True')
+        return []
+
+    def gen_just(self, parser, ind, loops, v):
+        self.w(ind, 'ok = True')
+        return [self.const(v)]
+
+    def gen_result(self, parser, ind, loops, r):
+        self.w(ind, 'ok = True')
+        return [self.const(v) for v in r]
+
+    def gen_fail(self, parser, ind, loops, msg, back_step):
+        if back_step:
+            self.w(ind, 'if p < {}:'.format(back_step))
+            self.w(ind + 1, "raise RuntimeError('Back too much')")
+            self.w(ind, 'p -= {}'.format(back_step))
+        self.fail(ind, msg)
+        return []
+
+    def gen_regex(self, parser, ind, loops, pattern):
+        v = self.tmp()
+        self.w(ind, 'm = {}.match(s, p)'.format(self.const(pattern)))
+        self.w(ind, 'if m is None:')
+        self.fail(ind + 1, '不满足正则条件')
+        self.w(ind, 'else:')
+        self.w(ind + 1, 'p = m.end()')
+        self.w(ind + 1, '{} = m.{}()'.format(
+            v, 'groupdict' if pattern.groupindex else 'group'))
+        self.w(ind + 1, 'ok = True')
+        return [v]
+
+    def gen_string(self, parser, ind, loops, lit):
+        k = self.const(lit)
+        self.w(ind, 'if s.startswith({}, p):'.format(k))
+        self.w(ind + 1, 'p += {}'.format(len(lit)))
+        self.w(ind + 1, 'ok = True')
+        self.w(ind, 'else:')
+        self.w(ind + 1, 'ok = False')
+        self.w(ind + 1, 'p, msg = literal_fail(s, n, p, {})'.format(k))
+        if self.override is not None:
+            self.w(ind + 1, 'msg = ' + self.error(self.override, True))
+        return [k]
+
+    def gen_literals(self, parser, ind, loops, trie, error):
+        v = self.tmp()
+        self.w(ind, 'q, {} = longest({}, loc.char_at, p)'.format(
+            v, self.const(trie)))
+        self.w(ind, 'if q >= 0:')
+        self.w(ind + 1, 'p = q')
+        self.w(ind + 1, 'ok = True')
+        self.w(ind, 'else:')
+        self.w(ind + 1, 'ok = False')
+        if self.override is not None:
+            self.w(ind + 1, 'msg = ' + self.error(self.override, True))
+        else:
+            self.w(ind + 1, 'msg = ' + self.const(error))
+        return [v]
+
+    def gen_token(self, parser, ind, loops, kind, literal, error):
+        # 词法单元输入时s为类别编号数组（见TokenText）
+        v = self.tmp()
+        test = 'p < n and s[p] == {}'.format(kind)
+        if literal is not None:
+            test += ' and loc.text_is(p, {})'.format(self.const(literal))
+        self.w(ind, 'if {}:'.format(test))
+        if literal is None:
+            self.w(ind + 1, '{} = loc.token_text(p)'.format(v))
+        else:
+            self.w(ind + 1, '{} = {}'.format(v, self.const(literal)))
+        self.w(ind + 1, 'p += 1')
+        self.w(ind + 1, 'ok = True')
+        self.w(ind, 'else:')
+        self.w(ind + 1, 'ok = False')
+        if self.override is not None:
+            self.w(ind + 1, 'msg = ' + self.error(self.override, True))
+        else:
+            self.w(ind + 1, 'msg = ' + self.const(error))
+        return [v]
+
+    def gen_fused(self, parser, ind, loops, pattern, values, original):
+        vals = [self.tmp() for _ in values]
+        self.w(ind, 'm = {}.match(s, p)'.format(self.const(pattern)))
+        self.w(ind, 'if m is not None:')
+        self.w(ind + 1, 'p = m.end()')
+        for v, (kind, x) in zip(vals, values):
+            if kind == 'group':
+                self.w(ind + 1, '{} = m.group({})'.format(v, x))
+            elif kind == 'list':
+                self.w(ind + 1, '{} = list(m.group({}))'.format(v, x))
+            else:
+                self.w(ind + 1, '{} = {}'.format(v, self.const(x)))
+        self.w(ind + 1, 'ok = True')
+        self.w(ind, 'else:')
+        # 正则不匹配时运行原子树，以得到完全相同的错误信息及位置
+        fallback = self.gen(original, ind + 1, loops)
+        if vals and self.arity(original) == len(vals):
+            self.w(ind + 1, 'if ok:')
+            self.assign(ind + 2, vals, fallback)
+        return vals
+
+    def assign(self, ind: int, target, vals):
+        if isinstance(target, str):
+            self.w(ind, '{} = {}'.format(target, _tup(vals)))
+        elif target:
+            if isinstance(vals, str):
+                self.w(ind, '{}, = {}'.format(', '.join(target), vals))
+            else:
+                self.w(ind, '{} = {}'.format(', '.join(target),
+                                             ', '.join(vals)))
+
+    def gen_or(self, parser, ind, loops, a, b):
+        n = self.arity(parser)
+        if n is None:
+            target = self.tmp('t')
+        elif n == BOTTOM:
+            target = []
+        else:
+            target = [self.tmp() for _ in range(n)]
+        c = self.mark(ind)
+        vals = self.gen(a, ind, loops)
+        if target and self.arity(a) != BOTTOM:
+            self.w(ind, 'if ok:')
+            self.assign(ind + 1, target, vals)
+        self.w(ind, 'if not ok{}:'.format(
+            '' if c is None else ' and ' + self.ended(c)))
+        pa, ea = self.tmp('p'), self.tmp('e')
+        self.w(ind + 1, '{}, {} = p, msg'.format(pa, ea))
+        vals = self.gen(b, ind + 1, loops)
+        if target and self.arity(b) != BOTTOM:
+            self.w(ind + 1, 'if ok:')
+            self.assign(ind + 2, target, vals)
+        # 与解释执行的 | 相同：保留较远的错误，位置相同时合并期望
+        self.w(ind + 1, 'if not ok:')
+        self.w(ind + 2, 'msg = {}.merge({}, msg, p)'.format(ea, pa))
+        return target
+
+    def gen_seq(self, parser, ind, loops, a, b):
+        va = self.gen(a, ind, loops)
+        self.w(ind, 'if ok:')
+        vb = self.gen(b, ind + 1, loops)
+        if self.arity(parser) is not None:
+            if isinstance(va, str) or isinstance(vb, str):
+                return []
+            return va + vb
+        t = self.tmp('t')
+        self.w(ind + 1, 'if ok:')
+        self.w(ind + 2, '{} = {} + {}'.format(t, _tup(va), _tup(vb)))
+        return t
+
+    def gen_map(self, parser, ind, loops, inner, func):
+        vals = self.gen(inner, ind, loops)
+        v = self.tmp()
+        self.w(ind, 'if ok:')
+        self.w(ind + 1, '{} = {}({})'.format(
+            v, self.const(func), _args(vals)))
+        return [v]
+
+    def gen_flatmap(self, parser, ind, loops, inner, func):
+        vals = self.gen(inner, ind, loops)
+        t = self.tmp('t')
+        self.w(ind, 'if ok:')
+        self.w(ind + 1, 'st = {}({}).fn(loc, p)'.format(
+            self.const(func), _args(vals)))
+        self.w(ind + 1, 'p = st.pos')
+        self.w(ind + 1, 'if st.is_successful():')
+        self.w(ind + 2, '{} = tuple(st.result.value)'.format(t))
+        self.w(ind + 1, 'else:')
+        self.w(ind + 2, 'ok = False')
+        self.w(ind + 2, 'msg = st.result')
+        return t
+
+    def gen_then(self, parser, ind, loops, a, b):
+        self.gen(a, ind, loops)
+        self.w(ind, 'if ok:')
+        return self.gen(b, ind + 1, loops)
+
+    def gen_left(self, parser, ind, loops, a, b):
+        vals = self.gen(a, ind, loops)
+        self.w(ind, 'if ok:')
+        self.gen(b, ind + 1, loops)
+        return vals
+
+    def gen_span(self, parser, ind, loops, inner):
+        start, span = self.tmp('s'), self.tmp()
+        self.w(ind, '{} = p'.format(start))
+        vals = self.gen(inner, ind, loops)
+        self.w(ind, 'if ok:')
+        self.w(ind + 1, '{} = ({}, p)'.format(span, start))
+        if not isinstance(vals, str):
+            return vals + [span]
+        t = self.tmp('t')
+        self.w(ind + 1, '{} = {} + ({},)'.format(t, vals, span))
+        return t
+
+    def loop(self, ind: int, loops: int, parser: Parser, xs):
+        """
+        生成不断运行parser直到失败的循环，成功值追加到列表xs中
+        """
+        start = self.tmp('s')
+        self.w(ind, 'while True:')
+        self.w(ind + 1, '{} = p'.format(start))
+        c = self.mark(ind + 1)
+        vals = self.gen(parser, ind + 1, loops + 1)
+        self.w(ind + 1, 'if not ok:')
+        self.w(ind + 2, 'break')
+        self.w(ind + 1, 'if p == {}:'.format(start))
+        self.w(ind + 2, "raise RuntimeError("
+                        "'重复的Parser未消耗任何字符，将无限循环')")
+        if xs is not None:
+            self.w(ind + 1, '{}.append({})'.format(xs, _first(vals)))
+        self.w(ind, 'ok = ' + self.ended(c))
+
+    def gen_many(self, parser, ind, loops, inner):
+        xs = self.tmp()
+        self.w(ind, '{} = []'.format(xs))
+        self.loop(ind, loops, inner, xs)
+        return [xs]
+
+    def gen_skip_many(self, parser, ind, loops, inner):
+        self.loop(ind, loops, inner, None)
+        return []
+
+    def gen_repeat1(self, parser, ind, loops, first, rest, keep):
+        vals = self.gen(first, ind, loops)
+        self.w(ind, 'if ok:')
+        if keep:
+            xs = self.tmp()
+            self.w(ind + 1, '{} = [{}]'.format(xs, _first(vals)))
+            self.loop(ind + 1, loops, rest, xs)
+            return [xs]
+        self.loop(ind + 1, loops, rest, None)
+        return []
+
+    def gen_maybe(self, parser, ind, loops, inner):
+        start = self.tmp('s')
+        self.w(ind, '{} = p'.format(start))
+        c = self.mark(ind)
+        vals = self.gen(inner, ind, loops)
+        self.w(ind, 'if not ok{}:'.format(
+            '' if c is None else ' and ' + self.ended(c)))
+        self.w(ind + 1, 'msg = msg.at(p)')
+        self.w(ind + 1, 'p = {}'.format(start))
+        return vals
+
+    def gen_chain_left(self, parser, ind, loops, node, op):
+        acc, fn = self.tmp(), self.tmp()
+        vals = self.gen(node, ind, loops)
+        self.w(ind, 'if ok:')
+        self.w(ind + 1, '{} = {}'.format(acc, _first(vals)))
+        self.w(ind + 1, 'while True:')
+        c = self.mark(ind + 2)
+        vals = self.gen(op, ind + 2, loops + 1)
+        self.w(ind + 2, 'if not ok:')
+        self.w(ind + 3, 'break')
+        self.w(ind + 2, '{} = {}'.format(fn, _first(vals)))
+        vals = self.gen(node, ind + 2, loops + 1)
+        self.w(ind + 2, 'if not ok:')
+        self.w(ind + 3, 'break')
+        self.w(ind + 2, '{0} = {1}({0}, {2})'.format(acc, fn, _first(vals)))
+        self.w(ind + 1, 'ok = ' + self.ended(c))
+        return [acc]
+
+    def gen_chain_right(self, parser, ind, loops, node, op):
+        xs, fns, fn, acc = self.tmp(), self.tmp(), self.tmp(), self.tmp()
+        vals = self.gen(node, ind, loops)
+        self.w(ind, 'if ok:')
+        self.w(ind + 1, '{}, {} = [{}], []'.format(xs, fns, _first(vals)))
+        self.w(ind + 1, 'while True:')
+        c = self.mark(ind + 2)
+        vals = self.gen(op, ind + 2, loops + 1)
+        self.w(ind + 2, 'if not ok:')
+        self.w(ind + 3, 'break')
+        self.w(ind + 2, '{} = {}'.format(fn, _first(vals)))
+        vals = self.gen(node, ind + 2, loops + 1)
+        self.w(ind + 2, 'if not ok:')
+        self.w(ind + 3, 'break')
+        self.w(ind + 2, '{}.append({})'.format(fns, fn))
+        self.w(ind + 2, '{}.append({})'.format(xs, _first(vals)))
+        self.w(ind + 1, 'ok = ' + self.ended(c))
+        self.w(ind + 1, 'if ok:')
+        self.w(ind + 2, '{} = {}.pop()'.format(acc, xs))
+        self.w(ind + 2, 'while {}:'.format(fns))
+        self.w(ind + 3, '{0} = {1}.pop()({2}.pop(), {0})'.format(
+            acc, fns, xs))
+        return [acc]
+
+    def gen_expression(self, parser, ind, loops, operand, *ops):
+        units = ['None' if op is _NO_OPERATOR else self.unit(op)
+                 for op in ops]
+        v = self.tmp()
+        self.w(ind, 'p, {} = expression_run(loc, s, n, p, {}, {}, {})'.format(
+            v, self.unit(operand), self.arity(operand) == 1,
+            ', '.join(units)))
+        self.returned(ind, v)
+        return [v]
+
+
+def _expression_run(loc: LocatedText, s: str, n: int, p: int, operand,
+                    single: bool, prefix, infix, postfix) -> tuple:
+    """
+    与parser._expression相同的运算符优先级解析，各部分均为生成的函数，
+    没有该类运算符时为None
+    """
+    values, ops = [], []
+    cuts = loc.cuts
+    while True:
+        mark = len(ops)
+        if prefix is not None:
+            while True:
+                c = loc.cuts
+                q, v = prefix(loc, s, n, p)
+                if q < 0:
+                    if loc.cuts != c:
+                        return q, v
+                    p = ~q
+                    break
+                p = q
+                ops.append((v[0], True, v[2]))
+        q, v = operand(loc, s, n, p)
+        if q < 0:
+            if not values or loc.cuts != cuts:
+                return q, v
+            p = ~q
+            del ops[mark - 1:]
+            break
+        p = q
+        values.append(v if single else (v[0] if v else None))
+        if postfix is not None:
+            while True:
+                c = loc.cuts
+                q, v = postfix(loc, s, n, p)
+                if q < 0:
+                    if loc.cuts != c:
+                        return q, v
+                    p = ~q
+                    break
+                p = q
+                _reduce(values, ops, v[0])
+                values[-1] = v[2](values[-1])
+        if infix is None:
+            break
+        cuts = loc.cuts
+        q, v = infix(loc, s, n, p)
+        if q < 0:
+            if loc.cuts != cuts:
+                return q, v
+            p = ~q
+            break
+        p = q
+        _reduce(values, ops, v[0], v[1])
+        ops.append((v[0], False, v[2]))
+    _reduce(values, ops, 0)
+    return p, values[0]
+
+
+def _literal_fail(s: str, n: int, p: int, lit: str) -> tuple:
+    """
+    :return tuple: 字面量匹配失败的位置及错误信息，与逐字符解析时相同
+    """
+    k = 0
+    while p + k < n and s[p + k] == lit[k]:
+        k += 1
+    return p + k, _expect_char(lit[k])
+
+
+@lru_cache(maxsize=None)
+def _expect_char(c: str) -> ParseError:
+    return expect('Excepted: ' + c)
+
+
+def _to_entry(p: int, v, single: bool) -> tuple:
+    """
+    生成函数的返回值 -> 记忆化表条目 (Success | ParseError, 结束位置)，
+    与解释执行时的条目格式相同
+    """
+    if p >= 0:
+        return Success(Result(v) if single else Result(*v)), p
+    return v, ~p
+
+
+def _from_entry(entry: tuple, single: bool) -> tuple:
+    result, end = entry
+    if isinstance(result, Success):
+        vals = tuple(result.value)
+        return end, (vals[0] if single else vals)
+    return ~end, result
+
+
+def _memo_run(key, body, single: bool, loc: LocatedText, s: str, n: int,
+              p: int) -> tuple:
+    table = loc.memo
+    entry = table.get(key, p)
+    if entry is not None:
+        return _from_entry(entry, single)
+    q, v = body(loc, s, n, p)
+    table.put(key, p, _to_entry(q, v, single))
+    return q, v
+
+
+def _grow_run(key, body, single: bool, loc: LocatedText, s: str, n: int,
+              p: int) -> tuple:
+    """
+    与parser._grow_run相同的种子增长算法
+    """
+    if loc.memo is None:
+        loc.memo = MemoTable()
+    table = loc.memo
+    entry = table.get(key, p)
+    if entry is None:
+        entry = table.seeds.get((key, p))
+    if entry is not None:
+        return _from_entry(entry, single)
+
+    seed = (key, p)
+    table.seeds[seed] = (ParseError('左递归'), p)
+    best = None
+    while True:
+        table.discard_at(p)
+        cuts = loc.cuts
+        q, v = body(loc, s, n, p)
+        if best is None or (q < 0 and loc.cuts != cuts):
+            best = (q, v)
+            if q < 0:
+                break
+        elif q < 0 or q <= best[0]:
+            break
+        else:
+            best = (q, v)
+        table.seeds[seed] = _to_entry(best[0], best[1], single)
+    del table.seeds[seed]
+    table.put(key, p, _to_entry(best[0], best[1], single))
+    return best
+
+
+def _is_tuple_valued(parser: Parser) -> bool:
+    """
+    解释执行时，用+连接的结果以元组而非Result保存在Success中
+    """
+    seen = set()
+    while parser.node is not None and id(parser) not in seen:
+        seen.add(id(parser))
+        kind = parser.node[0]
+        if kind == 'seq':
+            return True
+        if kind in ('label', 'name', 'maybe', 'memo', 'rule'):
+            parser = parser.node[1]
+        elif kind == 'fused':
+            parser = parser.node[3]
+        elif kind == 'then':
+            parser = parser.node[2]
+        else:
+            break
+    return False
+
+
+def compile_parser(parser: Parser) -> Parser:
+    """
+    编译Parser，见Parser.compile
+
+    :param parser: 待编译的Parser
+    :return Parser: 语义相同的已编译Parser，生成的源码保存在source属性中
+    """
+    entry, single, source = _Compiler(fuse(parser, lists_only=True)).build()
+    raw = _is_tuple_valued(parser)
+
+    def fn(loc: LocatedText, pos: int) -> State:
+        if loc.streaming or loc.binary or loc.tracking:
+            # 生成的代码直接访问整个字符串，流式、字节输入及增量解析时解释执行
+            return parser.fn(loc, pos)
+        s = loc.source
+        p, v = entry(loc, s, len(s), pos)
+        if p >= 0:
+            if raw:
+                return State(Success(v), loc, p)
+            return State(Success(Result(v) if single else Result(*v)),
+                         loc, p)
+        return State(v, loc, ~p)
+
+    compiled = Parser(fn)
+    compiled.node = parser.node
+    compiled.left_recursive = parser.left_recursive
+    compiled.source = source
+    return compiled
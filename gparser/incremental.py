@@ -0,0 +1,392 @@
+# -*- coding: UTF-8 -*-
+"""
+增量解析
+
+Session保留上次解析中各规则（由undef()/assign()或memo()定义）的记忆化结果，
+并记录每个结果读取过的输入范围。编辑时只有读取范围与编辑区域重叠的结果失效，
+编辑之后的结果随之平移，再次解析时未受影响的规则直接复用上次的结果，
+不必重新解析它们读取的输入。
+
+重新解析仍从头运行语法，只是跳过可复用的规则：many等重复不记忆化其余部分，
+因此顶层的many(record)对每条记录都要查询一次记忆化表，开销与记录数成正比；
+编辑处离上次编辑越远，移动条目的开销也越大（见_SessionMemo）。
+每次编辑还要重新拼接整个输入
+"""
+from functools import lru_cache
+
+from gparser.parser import Parser, eof
+from gparser.compiler import children
+from gparser.optimizer import _sre
+from gparser.util.locatedText import LocatedText
+from gparser.util.result import ParseError
+from gparser.util.state import State
+
+__author__ = 'Gaufoo, zhongzc_arch@outlook.com'
+
+MAX_EDITS = 128  # 编辑记录超过该数目时，整理一次所有条目
+
+
+class Session:
+    """
+    Session(parser: Parser, text: str, strict: bool = False)
+
+    用法：
+        session = parser.session(text)
+        state = session.edit(start, end, new_text)
+
+    解析总是解释执行（已编译的Parser也一样），所有规则都会被记忆化。
+    每次编辑的开销见模块说明：复用的规则不再解析，但包含编辑处的重复
+    仍逐项查询记忆化表。
+    成功值原样复用，因此语法中有with_span()时，只复用位置不变的结果；
+    直接构造的Parser若读取了传入的位置以外的信息，需自行保证结果可以复用
+
+    :param strict: 是否要求解析到输入结束，同run_strict
+    """
+
+    def __init__(self, parser: Parser, text: str, strict: bool = False):
+        self.parser = parser << eof() if strict else parser
+        self.text = text
+        self.__memo = _SessionMemo(len(text), _has_spans(parser))
+        self.state = self.__parse()
+
+    def edit(self, start: int, end: int, text: str) -> State:
+        """
+        将[start, end)替换为text并重新解析
+
+        :return State: 新的解析结果，同时保存在state属性中
+        """
+        if not 0 <= start <= end <= len(self.text):
+            raise ValueError('编辑范围越界：[{}, {})'.format(start, end))
+        self.text = self.text[:start] + text + self.text[end:]
+        self.__memo.edit(start, end, len(text))
+        self.state = self.__parse()
+        return self.state
+
+    def __parse(self) -> State:
+        loc = _TrackedText(self.text)
+        loc.memo = self.__memo
+        self.__memo.start(loc)
+        return self.parser.fn(loc, 0)
+
+
+def _has_spans(parser: Parser) -> bool:
+    seen = set()
+    stack = [parser]
+    while stack:
+        p = stack.pop()
+        if id(p) in seen:
+            continue
+        seen.add(id(p))
+        if p.node is not None and p.node[0] == 'span':
+            return True
+        stack.extend(children(p))
+    return False
+
+
+class _TrackedText(LocatedText):
+    """
+    记录读取过的范围[low, high)的输入，范围由_SessionMemo按规则分段
+    """
+    tracking = True
+    low = high = 0
+
+    def __init__(self, inp: str, loc: int = 0, origin: tuple = (1, 1)):
+        super().__init__(inp, loc, origin)
+        self.__str = inp
+        self.__line = (0, -1)  # 上次查找的 (位置, 其后第一个换行符的位置)
+
+    def __read(self, low: int, high: int):
+        if high > self.high:
+            self.high = high
+        if low < self.low:
+            self.low = low
+
+    def char_at(self, pos: int) -> str:
+        if pos >= self.high:
+            self.high = pos + 1
+        elif pos < self.low:
+            self.low = pos
+        s = self.__str
+        if pos < len(s):
+            return s[pos]
+        return ''
+
+    def starts_with(self, s: str, pos: int) -> bool:
+        self.__read(pos, pos + max(len(s), 1))
+        return self.__str.startswith(s, pos)
+
+    def is_end(self, pos: int) -> bool:
+        self.__read(pos, pos + 1)
+        return pos >= len(self.__str)
+
+    def match(self, pattern, pos: int):
+        s = self.__str
+        behind, line = _reach(pattern)
+        if line:
+            start, nl = self.__line
+            if not start <= pos <= nl:
+                nl = s.find('\n', pos)
+                if nl < 0:
+                    nl = len(s)
+                self.__line = (pos, nl)
+            high = nl + 1
+        else:
+            high = len(s) + 1
+        self.__read(0 if behind is None else pos - behind, high)
+        return pattern.match(s, pos)
+
+
+@lru_cache(maxsize=None)
+def _reach(pattern) -> tuple:
+    """
+    估计正则匹配时读取的范围
+
+    :return tuple: (behind, line)：behind为可能读取的pos之前的字符数，
+                   None表示不确定；line表示读取是否止于pos之后的第一个换行符，
+                   即正则不可能匹配换行符且不检查输入是否结束
+    """
+    try:
+        items = _sre.parse(pattern.pattern, pattern.flags)
+    except Exception:
+        return None, False
+    return _items_reach(items, pattern.flags)
+
+
+def _items_reach(items, flags: int) -> tuple:
+    behind, line = 0, True
+    for op, av in items:
+        if op is _sre.LITERAL:
+            line = line and av != ord('\n')
+        elif op is _sre.NOT_LITERAL:
+            line = line and av == ord('\n')
+        elif op is _sre.ANY:
+            line = line and not flags & _sre.SRE_FLAG_DOTALL
+        elif op is _sre.IN:
+            line = line and not _class_newline(av)
+        elif op is _sre.AT:
+            if av is _sre.AT_END_STRING or (
+                    av is _sre.AT_END and not flags & _sre.SRE_FLAG_MULTILINE):
+                line = False
+            elif av in (_sre.AT_BOUNDARY, _sre.AT_NON_BOUNDARY) or (
+                    av is _sre.AT_BEGINNING and
+                    flags & _sre.SRE_FLAG_MULTILINE):
+                behind = None if behind is None else max(behind, 1)
+        elif op in (_sre.ASSERT, _sre.ASSERT_NOT):
+            direction, sub = av
+            b, ln = _items_reach(sub, flags)
+            if direction < 0:
+                b = None
+            behind = None if None in (behind, b) else max(behind, b)
+            line = line and ln
+        elif op in (_sre.MAX_REPEAT, _sre.MIN_REPEAT,
+                    getattr(_sre, 'POSSESSIVE_REPEAT', None)):
+            b, ln = _items_reach(av[2], flags)
+            behind = None if None in (behind, b) else max(behind, b)
+            line = line and ln
+        elif op is _sre.SUBPATTERN:
+            b, ln = _items_reach(av[-1], (flags | av[1]) & ~av[2])
+            behind = None if None in (behind, b) else max(behind, b)
+            line = line and ln
+        elif op is _sre.BRANCH or op is getattr(_sre, 'ATOMIC_GROUP', None):
+            for sub in (av[1] if op is _sre.BRANCH else [av]):
+                b, ln = _items_reach(sub, flags)
+                behind = None if None in (behind, b) else max(behind, b)
+                line = line and ln
+        elif op is not _sre.GROUPREF:
+            # 条件分组等：不作分析
+            return None, False
+    return behind, line
+
+
+_NEWLINE_CATEGORIES = {_sre.CATEGORY_SPACE, _sre.CATEGORY_NOT_DIGIT,
+                       _sre.CATEGORY_NOT_WORD, _sre.CATEGORY_LINEBREAK}
+
+
+def _class_newline(items) -> bool:
+    """
+    :return bool: 字符类是否包含换行符
+    """
+    found, negate = False, False
+    for op, av in items:
+        if op is _sre.NEGATE:
+            negate = True
+        elif op is _sre.LITERAL:
+            found = found or av == ord('\n')
+        elif op is _sre.RANGE:
+            found = found or av[0] <= ord('\n') <= av[1]
+        elif op is _sre.CATEGORY:
+            found = found or av in _NEWLINE_CATEGORIES
+        else:
+            return True
+    return found != negate
+
+
+class _SessionMemo:
+    """
+    会话的记忆化表，接口与MemoTable相同，条目在多次解析间保留。
+
+    位置小于gap（上次编辑处）的条目以绝对位置为键保存在front中，其余以
+    相对输入末尾的位置为键保存在back中，因此编辑时只需移动两次编辑之间的
+    条目。读取范围跨过编辑处的条目在下次查询时，根据之后的编辑记录判断失效
+    """
+    packrat = True
+
+    def __init__(self, length: int, fixed: bool):
+        self.seeds = {}
+        self.text = None  # type: _TrackedText
+        self.__fixed = fixed  # 成功值中含有位置，位置改变的条目不能复用
+        self.__front = {}  # 位置 -> {key: 条目}
+        self.__back = {}  # 位置 - length -> {key: 条目}
+        self.__gap = 0
+        self.__length = length
+        # 各次编辑 (start, end, 长度变化)，__edits[i]为第__base + i次编辑
+        self.__edits = []
+        self.__base = 0
+        self.__frames = []  # 正在解析的规则开始前的 (low, high, cuts)
+
+    def __len__(self):
+        return sum(len(entries) for table in (self.__front, self.__back)
+                   for entries in table.values())
+
+    def start(self, text: _TrackedText):
+        """
+        开始一次新的解析
+        """
+        self.text = text
+        self.seeds.clear()
+        self.__frames.clear()
+
+    def __entries(self, offset: int, create: bool = False):
+        if offset < self.__gap:
+            table, key = self.__front, offset
+        else:
+            table, key = self.__back, offset - self.__length
+        entries = table.get(key)
+        if entries is None and create:
+            entries = table[key] = {}
+        return entries
+
+    def get(self, key, offset: int):
+        entries = self.__entries(offset)
+        entry = None if entries is None else entries.get(key)
+        if entry is not None:
+            entry = self.__validate(entry, offset)
+            if entry is None:
+                del entries[key]
+            else:
+                entries[key] = entry
+        if entry is None:
+            if (key, offset) not in self.seeds:
+                # 左递归规则增长时返回种子而不写入条目，不记录范围
+                text = self.text
+                self.__frames.append((text.low, text.high, text.cuts))
+                text.low = text.high = offset
+            return None
+        result, length, low, high, cut = entry[:5]
+        text = self.text
+        if offset + high > text.high:
+            text.high = offset + high
+        if offset + low < text.low:
+            text.low = offset + low
+        if cut:
+            text.cuts += 1  # 与重新解析时一样通过cut
+        return result, offset + length
+
+    def put(self, key, offset: int, entry) -> None:
+        if not self.__frames:
+            return  # 不知道读取范围，不保存
+        result, end = entry
+        text = self.text
+        low, high = text.low, max(text.high, end)
+        saved_low, saved_high, cuts = self.__frames.pop()
+        text.low = min(saved_low, low)
+        text.high = max(saved_high, high)
+        self.__entries(offset, True)[key] = (
+            result, end - offset, low - offset, high - offset,
+            text.cuts != cuts,
+            self.__base + len(self.__edits), offset)
+
+    def discard_at(self, offset: int) -> None:
+        entries = self.__entries(offset)
+        if entries is not None:
+            entries.clear()
+
+    def clear(self) -> None:
+        self.__front.clear()
+        self.__back.clear()
+        self.__edits.clear()
+
+    def release(self, offset: int) -> None:
+        """
+        会话中的条目供之后的解析复用，通过cut时也不丢弃
+        """
+
+    def edit(self, start: int, end: int, size: int):
+        """
+        [start, end)被替换为长度为size的内容
+        """
+        self.__move_gap(start)
+        back = self.__back
+        length = self.__length
+        for offset in range(start, end):
+            back.pop(offset - length, None)
+        self.__edits.append((start, end, size - (end - start)))
+        self.__length = length - (end - start) + size
+        if len(self.__edits) >= MAX_EDITS:
+            self.__compact()
+
+    def __move_gap(self, gap: int):
+        front, back = self.__front, self.__back
+        length = self.__length
+        if gap < self.__gap:
+            for offset in range(gap, self.__gap):
+                entries = front.pop(offset, None)
+                if entries is not None:
+                    back[offset - length] = entries
+        else:
+            for offset in range(self.__gap, gap):
+                entries = back.pop(offset - length, None)
+                if entries is not None:
+                    front[offset] = entries
+        self.__gap = gap
+
+    def __validate(self, entry: tuple, offset: int):
+        """
+        :return tuple | None: 按之后的编辑平移后的条目，失效时返回None
+        """
+        result, length, low, high, cut, version, origin = entry
+        now = self.__base + len(self.__edits)
+        if version == now:
+            return entry
+        pos = origin
+        for start, end, delta in self.__edits[version - self.__base:]:
+            if pos + high <= start:
+                continue
+            if pos + low >= end:
+                pos += delta
+                continue
+            return None
+        if pos != offset or (self.__fixed and pos != origin):
+            return None
+        if isinstance(result, ParseError):
+            result = result.moved(pos - origin)
+        return result, length, low, high, cut, now, pos
+
+    def __compact(self):
+        """
+        按编辑记录更新所有条目，丢弃失效的条目，之后清空编辑记录
+        """
+        length = self.__length
+        for table, base in ((self.__front, 0), (self.__back, length)):
+            for key in list(table):
+                entries = table[key]
+                for k, entry in list(entries.items()):
+                    entry = self.__validate(entry, key + base)
+                    if entry is None:
+                        del entries[k]
+                    else:
+                        entries[k] = entry
+                if not entries:
+                    del table[key]
+        self.__base += len(self.__edits)
+        self.__edits.clear()
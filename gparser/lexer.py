@@ -0,0 +1,132 @@
+# -*- coding: UTF-8 -*-
+"""
+词法分析
+
+Lexer将所有词法规则合并为一个正则，一次扫描把输入切分为词法单元
+（类别编号, 起始偏移, 结束偏移），保存在紧凑的数组中（见TokenText）。
+在词法单元上解析时用kind()、literal()代替char、string等字符级的Parser，
+其他组合子（|、+、many、map、maybe、compile等）照常使用
+"""
+import re
+from array import array
+from typing import Iterable
+
+from gparser.parser import Parser, _describe
+from gparser.util.locatedText import LocatedText
+from gparser.util.result import Result, Success, expect
+from gparser.util.state import State
+from gparser.util.tokenText import TokenText
+
+__author__ = 'Gaufoo, zhongzc_arch@outlook.com'
+
+INVALID = '<invalid>'  # 无法识别的字符所在单元的类别名
+
+
+class Lexer:
+    """
+    Lexer(rules: Iterable[tuple], skip: str = r'\\s+')
+
+    用法：
+        lexer = Lexer([('num', r'\\d+'), ('name', r'[a-z_]\\w*'),
+                       ('op', r'[-+*/()=]')])
+        expr = lexer.kind('num').map(int) + (lexer.literal('+') >> ...)
+        state = expr.run(lexer.tokenize(text))
+
+    :param rules: (类别名, 正则) 的序列，同一位置按顺序取第一个匹配的规则，
+                  因此关键字等应排在标识符之前（或用literal匹配标识符的文本）。
+                  规则不能匹配空串，也不能使用编号的反向引用
+    :param skip: 匹配的文本被丢弃的正则（如空白、注释），None表示不丢弃
+    """
+
+    def __init__(self, rules: Iterable[tuple], skip: str = r'\s+'):
+        rules = list(rules)
+        if skip is not None:
+            rules.append((None, skip))
+        names = []
+        parts = []
+        for i, (name, rex) in enumerate(rules):
+            if re.compile(rex).fullmatch('') is not None:
+                raise ValueError('词法规则不能匹配空串：{!r}'.format(rex))
+            parts.append('(?P<_k{}>{})'.format(i, rex))
+            names.append(name)
+        self.pattern = re.compile('|'.join(parts))
+        # 组号 -> 类别编号，丢弃的规则为-1
+        self.__groups = [None] * (self.pattern.groups + 1)
+        for i, name in enumerate(names):
+            group = self.pattern.groupindex['_k{}'.format(i)]
+            self.__groups[group] = -1 if name is None else i
+        if skip is not None:
+            names.pop()
+        self.names = tuple(names) + (INVALID,)
+        self.__ids = {name: i for i, name in enumerate(names)}
+
+    def tokenize(self, text: str) -> TokenText:
+        """
+        将text切分为词法单元。遇到无法识别的字符时，以该字符作为类别为
+        INVALID的单元并停止，解析会在该处失败
+
+        :return TokenText: 可直接传给Parser.run等的输入
+        """
+        kinds, starts, ends = array('H'), array('q'), array('q')
+        match = self.pattern.match
+        groups = self.__groups
+        pos, n = 0, len(text)
+        while pos < n:
+            m = match(text, pos)
+            if m is None or m.end() == pos:
+                kinds.append(len(self.names) - 1)
+                starts.append(pos)
+                ends.append(pos + 1)
+                break
+            kind = groups[m.lastindex]
+            if kind >= 0:
+                kinds.append(kind)
+                starts.append(pos)
+                ends.append(m.end())
+            pos = m.end()
+        return TokenText(LocatedText(text), kinds, starts, ends, self.names)
+
+    def kind(self, name: str) -> Parser:
+        """
+        解析一个类别为name的词法单元
+
+        :return Parser: 成功值为该单元文本的Parser
+        """
+        kind = self.__id(name)
+        error = expect('Excepted: ' + name)
+
+        @Parser
+        def inner(loc: TokenText, pos: int) -> State:
+            if loc.kind_at(pos) == kind:
+                return State(Success(Result(loc.token_text(pos))), loc,
+                             pos + 1)
+            return State(error, loc, pos)
+
+        return _describe(inner, 'token', kind, None, error)
+
+    def literal(self, s: str) -> Parser:
+        """
+        解析一个文本为s的词法单元，s须恰好被切分为一个单元，
+        如literal('if')匹配文本为if的标识符
+
+        :return Parser: 成功值为s的Parser
+        """
+        m = self.pattern.match(s)
+        if m is None or m.end() != len(s) or self.__groups[m.lastindex] < 0:
+            raise ValueError('{!r}不是一个词法单元'.format(s))
+        kind = self.__groups[m.lastindex]
+        success = Success(Result(s))
+        error = expect('Excepted: ' + s)
+
+        @Parser
+        def inner(loc: TokenText, pos: int) -> State:
+            if loc.kind_at(pos) == kind and loc.text_is(pos, s):
+                return State(success, loc, pos + 1)
+            return State(error, loc, pos)
+
+        return _describe(inner, 'token', kind, s, error)
+
+    def __id(self, name: str) -> int:
+        if name not in self.__ids:
+            raise ValueError('没有名为{!r}的词法规则'.format(name))
+        return self.__ids[name]
@@ -0,0 +1,510 @@
+# -*- coding: UTF-8 -*-
+"""
+字符级组合子融合，以及选择分支的首字符分析
+
+将由字符类（char、one_of、none_of、digit、space等）、字面量(string)、
+字符类的重复(many、many1、skip_many、spaces等)、just以及它们的顺序连接
+(+、>>、<<)组成的子树替换为一个预编译的正则表达式，一次匹配代替逐字符解析。
+
+融合后的Parser成功时与原子树结果相同；匹配失败时会在同一位置运行原子树，
+因此错误信息及位置也完全相同。重复使用占有量词（Python 3.11以下用
+先行断言加反向引用模拟），不会像正则那样回溯。
+
+first_chars计算Parser可能的首字符，供|在解析时跳过不可能成功的分支。
+"""
+import re
+import sys
+from array import array
+from functools import lru_cache
+
+try:
+    from re import _parser as _sre
+except ImportError:  # Python 3.11以下
+    import sre_parse as _sre
+
+from gparser.parser import Parser, _describe, _repeat1, undef, label, name, \
+    many, skip_many, maybe, memo, chain_left, chain_right, located, \
+    _expression
+from gparser.util.state import State
+from gparser.util.locatedText import LocatedText
+from gparser.util.result import Result, Success
+
+__author__ = 'Gaufoo, zhongzc_arch@outlook.com'
+
+_POSSESSIVE = sys.version_info >= (3, 11)
+_PREDICATES = (str.isdigit, str.isalpha, str.isalnum, str.isdecimal,
+               str.isnumeric)
+
+
+# 与str上的判断方法等价的正则字符类：sre的\s、\d、\w按str.isspace、
+# str.isdecimal及str.isalnum（另加'_'）判断
+_CLASSES = {str.isspace: r'\s', str.isdecimal: r'\d', str.isalnum: r'[^\W_]'}
+
+
+@lru_cache(maxsize=None)
+def _candidates(cls: str) -> str:
+    """
+    :return str: 所有匹配正则字符类cls的字符，在C中扫描全部码位
+    """
+    codes = array('I', range(sys.maxunicode + 1)).tobytes()
+    every = codes.decode('utf-32-' + sys.byteorder[0] + 'e', 'surrogatepass')
+    return ''.join(re.findall(cls, every))
+
+
+def _satisfying(pred) -> str:
+    """
+    :return str: 满足判断方法的所有字符。isdigit等都蕴含isalnum，
+                 只需检查isalnum为真的字符
+    """
+    if pred in _CLASSES:
+        return _candidates(_CLASSES[pred])
+    return ''.join(filter(pred, _candidates(_CLASSES[str.isalnum])))
+
+
+@lru_cache(maxsize=None)
+def _predicate_class(pred) -> str:
+    """
+    :return str: 与str上的判断方法完全等价的正则字符类
+    """
+    if pred in _CLASSES:
+        return _CLASSES[pred]
+    ranges = []
+    for i in map(ord, _satisfying(pred)):
+        if ranges and ranges[-1][1] == i - 1:
+            ranges[-1][1] = i
+        else:
+            ranges.append([i, i])
+    return '[' + ''.join(
+        _escape(chr(a)) + ('-' + _escape(chr(b)) if b > a else '')
+        for a, b in ranges) + ']'
+
+
+def _escape(c: str) -> str:
+    return '\\U{:08x}'.format(ord(c))
+
+
+def _char_class(parser: Parser):
+    """
+    :return str | None: 单字符Parser对应的正则字符类
+    """
+    node = parser.node
+    while node is not None and node[0] in ('label', 'name'):
+        node = node[1].node
+    if node is None or node[0] != 'satisfy':
+        return None
+    pred, charset = node[1], node[2]
+    if charset is not None:
+        kind, chrs = charset
+        body = ''.join(_escape(c) for c in chrs)
+        if kind == 'in':
+            return '[' + body + ']' if chrs else '(?!)'
+        return '[^' + body + ']' if chrs else r'[\s\S]'
+    if pred is str.isspace or pred in _PREDICATES:
+        return _predicate_class(pred)
+    return None
+
+
+class _Pattern:
+    """
+    拼接中的正则，values为与Result中各值对应的生成方式：
+    ('group', i) 第i组的字符串，('list', i) 第i组的字符列表，('const', v) 常量
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.groups = 0
+
+    def group(self, body: str) -> int:
+        self.groups += 1
+        self.parts.append('(' + body + ')')
+        return self.groups
+
+    def repeat(self, cls: str, keep: bool, first: str = '') -> list:
+        """
+        追加不回溯的 first cls*
+
+        :return list: keep时为该重复对应的字符列表
+        """
+        if _POSSESSIVE:
+            body = first + cls + '*+'
+            if keep:
+                return [('list', self.group(body))]
+            self.parts.append(body)
+            return []
+        i = self.group(first + cls + '*')
+        self.parts[-1] = '(?=' + self.parts[-1] + ')\\' + str(i)
+        return [('list', i)] if keep else []
+
+
+def _emit(parser: Parser, pat: _Pattern, keep: bool):
+    """
+    将可融合的子树追加到pat中
+
+    :return list | None: 值的生成方式；子树不可融合时返回None
+    """
+    node = parser.node
+    if node is None:
+        return None
+    kind = node[0]
+    cls = _char_class(parser)
+    if cls is not None:
+        if keep:
+            return [('group', pat.group(cls))]
+        pat.parts.append(cls)
+        return []
+    if kind in ('label', 'name'):
+        return _emit(node[1], pat, keep)
+    if kind == 'string':
+        pat.parts.append(re.escape(node[1]))
+        return [('const', node[1])] if keep else []
+    if kind == 'just':
+        return [('const', node[1])] if keep else []
+    if kind == 'result':
+        return [('const', v) for v in node[1]] if keep else []
+    if kind == 'eof':
+        pat.parts.append(r'\Z')
+        return []
+    if kind in ('many', 'skip_many'):
+        cls = _char_class(node[1])
+        if cls is None:
+            return None
+        return pat.repeat(cls, keep and kind == 'many')
+    if kind == 'repeat1':
+        first, rest = _char_class(node[1]), _char_class(node[2])
+        if first is None or rest is None:
+            return None
+        return pat.repeat(rest, keep and node[3], first)
+    if kind in ('seq', 'then', 'left'):
+        a = _emit(node[1], pat, keep and kind != 'then')
+        if a is None:
+            return None
+        b = _emit(node[2], pat, keep and kind != 'left')
+        if b is None or (kind == 'left' and keep and len(a) != 1):
+            return None
+        return a + b
+    return None
+
+
+def _is_tuple_valued(parser: Parser) -> bool:
+    kind = parser.node[0]
+    if kind in ('label', 'name'):
+        return _is_tuple_valued(parser.node[1])
+    if kind == 'then':
+        return _is_tuple_valued(parser.node[2])
+    return kind == 'seq'
+
+
+def _worth_fusing(parser: Parser) -> bool:
+    """
+    单个字符类用正则匹配并不会更快
+    """
+    kind = parser.node[0]
+    if kind in ('label', 'name'):
+        return _worth_fusing(parser.node[1])
+    return _char_class(parser) is None and \
+        kind not in ('just', 'result', 'eof')
+
+
+def fused(parser: Parser, keep: bool = True, lists_only: bool = False):
+    """
+    :param keep: 为False时不生成成功值（用于>>左侧等值会被丢弃的位置）
+    :param lists_only: 只融合会生成字符列表的子树
+    :return Parser | None: parser可融合时返回对应的正则Parser，否则返回None
+    """
+    if parser.node is None or not _worth_fusing(parser):
+        return None
+    pat = _Pattern()
+    values = _emit(parser, pat, keep)
+    if values is None or (
+            lists_only and all(kind != 'list' for kind, _ in values)):
+        return None
+    pattern = re.compile(''.join(pat.parts))
+    raw = _is_tuple_valued(parser)
+
+    def build(m):
+        vs = []
+        for kind, v in values:
+            if kind == 'group':
+                vs.append(m.group(v))
+            elif kind == 'list':
+                vs.append(list(m.group(v)))
+            else:
+                vs.append(v)
+        return tuple(vs) if raw else Result(*vs)
+
+    @Parser
+    def inner(loc: LocatedText, pos: int) -> State:
+        if loc.binary:
+            # 正则为str模式，字节输入时解释执行，同compile_parser
+            return parser.fn(loc, pos)
+        m = loc.match(pattern, pos)
+        if m is None:
+            return parser.fn(loc, pos)
+        return State(Success(build(m)), loc, pos + m.end() - m.start())
+
+    return _describe(inner, 'fused', pattern, tuple(values), parser)
+
+
+_REBUILD = {
+    'or': lambda a, b: a | b,
+    'seq': lambda a, b: a + b,
+    'then': lambda a, b: a >> b,
+    'left': lambda a, b: a << b,
+    'map': lambda a, f: a.map(f),
+    'flatmap': lambda a, f: a.flatmap(f),
+    'label': label,
+    'name': name,
+    'many': many,
+    'skip_many': skip_many,
+    'maybe': maybe,
+    'memo': memo,
+    'repeat1': _repeat1,
+    'chain_left': chain_left,
+    'chain_right': chain_right,
+    'expression': _expression,
+    'span': located,
+}
+
+_CHILDREN = {'or': 2, 'seq': 2, 'then': 2, 'left': 2, 'map': 1, 'flatmap': 1,
+             'label': 1, 'name': 1, 'many': 1, 'skip_many': 1, 'maybe': 1,
+             'memo': 1, 'repeat1': 2, 'chain_left': 2, 'chain_right': 2,
+             'span': 1, 'expression': 4}
+
+# 各子Parser的值是否会被使用
+_KEEPS = {'then': lambda keep: (False, keep),
+          'left': lambda keep: (keep, False),
+          'skip_many': lambda keep: (False,),
+          'or': lambda keep: (keep, keep),
+          'seq': lambda keep: (keep, keep),
+          'label': lambda keep: (keep,),
+          'name': lambda keep: (keep,),
+          'maybe': lambda keep: (keep,),
+          'memo': lambda keep: (keep,)}
+
+
+def fuse(parser: Parser, lists_only: bool = False) -> Parser:
+    """
+    返回将所有可融合子树替换为正则匹配后的Parser，原Parser不受影响
+
+    :param lists_only: 只融合会生成字符列表的子树。编译后的代码本身已内联
+                       匹配单个字符和字面量，对它们调用正则反而更慢，
+                       逐字符构造列表的重复才值得替换
+    """
+    done = {}
+
+    def visit(p: Parser, keep: bool) -> Parser:
+        key = (id(p), keep)
+        if key in done:
+            return done[key]
+        node = p.node
+        if node is None:
+            return p
+        kind = node[0]
+        if kind == 'rule':
+            rule = done[(id(p), True)] = done[(id(p), False)] = \
+                undef(p.left_recursive)
+            rule.assign(visit(node[1], True))
+            return rule
+        new = fused(p, keep, lists_only)
+        if new is None and kind in _REBUILD:
+            n = _CHILDREN[kind]
+            keeps = _KEEPS[kind](keep) if kind in _KEEPS else (True,) * n
+            args = [visit(c, k) for c, k in zip(node[1:1 + n], keeps)]
+            if all(a is c for a, c in zip(args, node[1:1 + n])):
+                new = p
+            else:
+                new = _REBUILD[kind](*args, *node[1 + n:])
+        done[key] = new if new is not None else p
+        return done[key]
+
+    return visit(parser, True)
+
+
+_MAX_FIRST = 4096  # 首字符集合的最大大小，更大的视为无法确定
+
+
+@lru_cache(maxsize=None)
+def _predicate_chars(pred):
+    """
+    :return frozenset | None: 满足str上的判断方法的所有字符，过多时为None
+    """
+    chars = frozenset(_satisfying(pred))
+    return chars if len(chars) <= _MAX_FIRST else None
+
+
+_CATEGORIES = {_sre.CATEGORY_SPACE: str.isspace,
+               _sre.CATEGORY_DIGIT: str.isdecimal}
+_REPEATS = tuple(op for op in (
+    _sre.MAX_REPEAT, _sre.MIN_REPEAT, getattr(_sre, 'POSSESSIVE_REPEAT', None))
+    if op is not None)
+
+
+def _class_first(items):
+    chars = set()
+    for op, av in items:
+        if op is _sre.LITERAL:
+            chars.add(chr(av))
+        elif op is _sre.RANGE:
+            if av[1] - av[0] >= _MAX_FIRST:
+                return None
+            chars.update(map(chr, range(av[0], av[1] + 1)))
+        elif op is _sre.CATEGORY and av in _CATEGORIES:
+            cat = _predicate_chars(_CATEGORIES[av])
+            if cat is None:
+                return None
+            chars |= cat
+        else:
+            return None
+    return frozenset(chars), False
+
+
+def _regex_first(items):
+    """
+    :param items: sre_parse解析出的正则序列
+    """
+    chars = frozenset()
+    for op, av in items:
+        if op is _sre.LITERAL:
+            first = frozenset(chr(av)), False
+        elif op is _sre.IN:
+            first = _class_first(av)
+        elif op in _REPEATS:
+            first = _regex_first(av[2])
+            if first is not None and av[0] == 0:
+                first = first[0], True
+        elif op is _sre.SUBPATTERN:
+            first = _regex_first(av[-1]) if not av[1] & re.IGNORECASE \
+                else None
+        elif op is getattr(_sre, 'ATOMIC_GROUP', None):
+            first = _regex_first(av)
+        elif op is _sre.BRANCH:
+            firsts = [_regex_first(b) for b in av[1]]
+            first = None if None in firsts else (
+                frozenset().union(*(f[0] for f in firsts)),
+                any(f[1] for f in firsts))
+        elif op in (_sre.AT, _sre.ASSERT, _sre.ASSERT_NOT):
+            first = frozenset(), True  # 不消耗字符
+        else:
+            return None
+        if first is None:
+            return None
+        chars |= first[0]
+        if not first[1]:
+            return chars, False
+    return chars, True
+
+
+def _pattern_first(pattern):
+    if pattern.flags & re.IGNORECASE:
+        return None
+    source = pattern.pattern
+    if not isinstance(source, bytes):
+        return _regex_first(_sre.parse(source, pattern.flags))
+    # 字节输入的char_at为对应的latin-1字符，与解码后的正则一致
+    first = _regex_first(_sre.parse(source.decode('latin-1'), pattern.flags))
+    if first is None:
+        return None
+    return frozenset(c for c in first[0] if c <= '\xff'), first[1]
+
+
+def contains_cut(parser: Parser) -> bool:
+    """
+    :return bool: parser可达的子结构中是否有cut（或无法静态分析的Parser）。
+                  这样的分支即使在当前位置失败，也可能已通过cut，
+                  |不能根据首字符跳过它
+    """
+    from gparser.compiler import children
+    seen = set()
+    stack = [parser]
+    while stack:
+        parser = stack.pop()
+        if id(parser) in seen:
+            continue
+        seen.add(id(parser))
+        if parser.node is None or parser.node[0] in ('cut', 'flatmap'):
+            return True
+        stack.extend(children(parser))
+    return False
+
+
+def first_chars(parser: Parser, seen: dict = None):
+    """
+    静态分析Parser可能的首字符
+
+    :param seen: 已分析的Parser，id -> 结果，分析中的规则为None（递归时无法确定）
+    :return (frozenset, bool) | None: (chars, nullable)，表示下一个字符不在
+            chars中（或输入已结束）时，parser必在当前位置失败，nullable时
+            也可能不消耗字符地成功；无法静态确定时返回None
+    """
+    if seen is None:
+        seen = {}
+    key = id(parser)
+    if key in seen:
+        return seen[key]
+    seen[key] = None
+    seen[key] = first = _first_chars(parser, seen)
+    return first
+
+
+def _first_chars(parser: Parser, seen: dict):
+    node = parser.node
+    if node is None:
+        return None
+    kind = node[0]
+    if kind == 'satisfy':
+        if node[2] is not None:
+            return (frozenset(node[2][1]), False) \
+                if node[2][0] == 'in' else None
+        if node[1] is str.isspace or node[1] in _PREDICATES:
+            chars = _predicate_chars(node[1])
+            return None if chars is None else (chars, False)
+        return None
+    if kind == 'string':
+        return frozenset(node[1][0]), False
+    if kind == 'literals':
+        return frozenset(c for c in node[1] if c is not None), None in node[1]
+    if kind == 'token':
+        # 词法单元输入的char_at为类别编号对应的字符
+        return frozenset(chr(node[1])), False
+    if kind == 'byte_satisfy':
+        charset = node[2]
+        if charset is None or charset[0] != 'in':
+            return None
+        return frozenset(map(chr, charset[1])), False
+    if kind == 'byte_string':
+        if not node[1]:
+            return frozenset(), True
+        return frozenset(chr(node[1][0])), False
+    if kind == 'regex':
+        return _pattern_first(node[1])
+    if kind in ('just', 'result', 'eof'):
+        return frozenset(), True
+    if kind == 'fail':
+        return None if node[2] else (frozenset(), False)
+    if kind == 'fused':
+        return first_chars(node[3], seen)
+    if kind in ('label', 'name', 'maybe', 'memo', 'rule', 'span', 'map',
+                'profiled'):
+        return first_chars(node[1], seen)
+    if kind in ('flatmap', 'repeat1', 'chain_left', 'chain_right'):
+        first = first_chars(node[1], seen)
+        return None if first is None or first[1] else first
+    if kind == 'expression':
+        # 任意个前缀运算符之后是operand
+        prefix = first_chars(node[2], seen)
+        operand = first_chars(node[1], seen)
+        if prefix is None or prefix[1] or operand is None:
+            return None
+        return prefix[0] | operand[0], operand[1]
+    if kind in ('many', 'skip_many'):
+        first = first_chars(node[1], seen)
+        return None if first is None else (first[0], True)
+    if kind in ('or', 'seq', 'then', 'left'):
+        a = first_chars(node[1], seen)
+        if a is None or (kind != 'or' and not a[1]):
+            return a
+        b = first_chars(node[2], seen)
+        if b is None:
+            return None
+        return a[0] | b[0], (a[1] or b[1]) if kind == 'or' else b[1]
+    return None
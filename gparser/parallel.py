@@ -0,0 +1,197 @@
+# -*- coding: UTF-8 -*-
+"""
+多进程解析：run_many批量解析相互独立的输入，split_parse将单个大输入
+按记录边界切分后并行解析
+
+由map、flatmap中的lambda及undef()/assign()组成的语法无法被pickle，
+因此传给工作进程的是语法的工厂：一个可被pickle的模块级函数，
+每个工作进程启动时调用一次，任何启动方式（fork、spawn等）都适用。
+直接传入Parser时，以fork方式启动工作进程，由子进程继承已构建好的语法，
+系统不支持fork时抛出ValueError。
+语法在进程池创建时交给各自的工作进程，多个调用可以同时进行。
+"""
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import repeat
+from typing import Callable, Iterable, Union
+
+from gparser.parser import Parser, _attach_memo, _records, _source
+from gparser.util.locatedText import LocatedText
+from gparser.util.result import Result, Success, ParseError
+from gparser.util.state import State
+
+__author__ = 'Gaufoo, zhongzc_arch@outlook.com'
+
+_worker_parser = None  # 工作进程中由_init_worker设置的Parser
+
+
+def _init_worker(parser: Union[Parser, Callable[[], Parser]]):
+    global _worker_parser
+    _worker_parser = parser if isinstance(parser, Parser) else parser()
+
+
+def _local(parser: Union[Parser, Callable[[], Parser]]) -> Parser:
+    """
+    :return Parser: 在当前进程中使用的Parser
+    """
+    return parser if isinstance(parser, Parser) else parser()
+
+
+@contextmanager
+def _pool(parser: Union[Parser, Callable[[], Parser]], workers: int):
+    """
+    :return: 工作进程已设置好parser的进程池，workers为1时为None
+    :raise ValueError: 传入Parser但系统不支持fork
+    """
+    if workers == 1:
+        yield None
+        return
+    context = None
+    if isinstance(parser, Parser):
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise ValueError('系统不支持fork，无法将Parser传给工作进程，'
+                             '请传入返回Parser的模块级函数')
+        context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(workers, mp_context=context,
+                             initializer=_init_worker,
+                             initargs=(parser,)) as pool:
+        yield pool
+
+
+def _run_one(inp: str, kwargs: dict, parser: Parser = None) -> tuple:
+    """
+    解析一个输入，parser为None时使用工作进程的Parser
+
+    :return tuple: (Success | ParseError, 结束位置)
+    """
+    if parser is None:
+        parser = _worker_parser
+    try:
+        state = parser.run(inp, **kwargs)
+    except Exception as e:
+        return ParseError('{}: {}'.format(type(e).__name__, e)), 0
+    return state.result, state.pos
+
+
+def run_many(parser: Union[Parser, Callable[[], Parser]],
+             inputs: Iterable[str], workers: int = None,
+             chunksize: int = 1, **kwargs) -> list:
+    """
+    用多个进程分别解析inputs中的每个字符串
+
+    :param parser: Parser，或返回Parser的模块级函数（可被pickle）；
+                   直接传入Parser需要系统支持fork，否则抛出ValueError
+    :param inputs: 相互独立的待解析字符串（或bytes，见Parser.run）
+    :param workers: 进程数，默认为CPU数，为1时在当前进程中依次解析
+    :param chunksize: 每次发送给一个进程的输入个数
+    :param kwargs: 传给Parser.run的参数，如packrat
+    :return list: 与inputs一一对应的State；解析中抛出的异常
+                  转换为该项的ParseError
+    """
+    inputs = list(inputs)
+    with _pool(parser, workers) as pool:
+        if pool is None:
+            local = _local(parser)
+            results = [_run_one(inp, kwargs, local) for inp in inputs]
+        else:
+            results = list(pool.map(_run_one, inputs, repeat(kwargs),
+                                    chunksize=chunksize))
+    return [State(result, _source(inp), pos)
+            for inp, (result, pos) in zip(inputs, results)]
+
+
+def _boundary_after(text: str, boundary, start: int) -> int:
+    """
+    :return int: start之后（含）第一个边界的结束位置，没有时返回len(text)
+    """
+    if isinstance(boundary, str):
+        i = text.find(boundary, start)
+        return len(text) if i == -1 else i + len(boundary)
+    if isinstance(boundary, Parser) and boundary.node is not None and \
+            boundary.node[0] == 'regex':
+        boundary = boundary.node[1]
+    if isinstance(boundary, re.Pattern):
+        m = boundary.search(text, start)
+        return len(text) if m is None or m.end() == m.start() else m.end()
+    loc = LocatedText(text)
+    for pos in range(start, len(text)):
+        state = boundary.fn(loc, pos)
+        if state.is_successful() and state.pos > pos:
+            return state.pos
+    return len(text)
+
+
+def _parse_part(part: str, origin: tuple, packrat: bool,
+                parser: Parser = None) -> tuple:
+    """
+    依次解析part中的所有记录，parser为None时使用工作进程的Parser
+
+    :return tuple: (各记录的值, None | (ParseError, part中的出错位置))
+    """
+    if parser is None:
+        parser = _worker_parser
+    loc = _attach_memo(LocatedText(part, 0, origin), packrat, None)
+    values = []
+    try:
+        for state in _records(parser, loc):
+            if not state.is_successful():
+                return values, (state.result, state.pos)
+            values.append(state.result.value.get())
+    except Exception as e:
+        return values, (ParseError('{}: {}'.format(type(e).__name__, e)), 0)
+    return values, None
+
+
+def split_parse(parser: Union[Parser, Callable[[], Parser]], text: str,
+                boundary='\n', workers: int = None, parts: int = None,
+                packrat: bool = False) -> State:
+    """
+    将text在记录边界处切分为若干段，由多个进程分别像Parser.iter_parse
+    一样依次解析各段中的记录，再按顺序合并
+
+    每段都从某个边界之后开始，因此边界不能出现在记录内部（例如每行一条
+    JSON时以换行为边界）。记录的值中由located()得到的位置是相对于所在段的
+
+    :param parser: 解析单条记录的Parser，或返回它的模块级函数，见run_many
+    :param boundary: 记录边界：字符串、正则、或Parser（如char('\n')）
+    :param workers: 进程数，默认为CPU数，为1时在当前进程中依次解析
+    :param parts: 切分的段数，默认为进程数的4倍
+    :param packrat: 是否记忆化所有由assign定义的规则
+    :return State: 成功时结果为所有记录的值组成的列表；否则为最早出错的
+                   记录的错误，其位置及行列均为在text中的位置
+    """
+    if parts is None:
+        parts = 4 * (workers or multiprocessing.cpu_count())
+    starts = [0]
+    for i in range(1, parts):
+        target = max(len(text) * i // parts, starts[-1])
+        if target >= len(text):
+            break
+        end = _boundary_after(text, boundary, target)
+        if end < len(text) and end > starts[-1]:
+            starts.append(end)
+    ends = starts[1:] + [len(text)]
+
+    origins, row, prev = [], 1, 0
+    for start in starts:
+        row += text.count('\n', prev, start)
+        origins.append((row, start - text.rfind('\n', 0, start)))
+        prev = start
+    pieces = [text[a:b] for a, b in zip(starts, ends)]
+    with _pool(parser, workers) as pool:
+        if pool is None:
+            local = _local(parser)
+            results = [_parse_part(piece, origin, packrat, local)
+                       for piece, origin in zip(pieces, origins)]
+        else:
+            results = pool.map(_parse_part, pieces, origins, repeat(packrat))
+        values = []
+        for start, (part_values, error) in zip(starts, results):
+            values.extend(part_values)
+            if error is not None:
+                result, pos = error
+                return State(result.moved(start), LocatedText(text),
+                             start + pos)
+    return State(Success(Result(values)), LocatedText(text), len(text))
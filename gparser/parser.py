@@ -4,49 +4,214 @@ __see__ = 'http://www.cs.nott.ac.uk/~pszgmh/monparsing.pdf'
 
 from gparser.util.state import State
 from gparser.util.locatedText import LocatedText
-from gparser.util.result import Result, Success, ParseError
-from typing import Callable
-from functools import reduce
+from gparser.util.result import Result, Success, ParseError, EMPTY, UNIT, \
+    expect
+from gparser.util.memo import MemoTable
+from gparser.util.stream import StreamText
+from gparser.util.bytesText import BytesText, BUFFERS
+from typing import Callable, Iterable
+import mmap
 import re
-import copy
+
+
+_assigns = 0  # assign的次数，|据此判断跳转表是否过期
 
 
 class Parser:
     """
-    Parser(fn: LocatedText -> State)
+    Parser(fn: (LocatedText, int) -> State)
 
-    解析器，运行时接受一个LocatedText，返回解析后的状态
+    解析器，运行时接受待解析的LocatedText及当前位置，返回解析后的状态。
+    LocatedText在整个解析中共享且不会被修改，位置总是以整数传递，
+    因此回溯无需复制，同一个Parser也可以同时被多个线程使用
     """
 
-    def __init__(self, fn: Callable[[LocatedText], State]):
+    left_recursive = False  # 由undef(left_recursive=True)声明
+    node = None  # 组合结构 (kind, *args)，None表示无法静态分析
+    frozen = False  # 由freeze()设置，之后不能再assign
+    rule_name = None  # 由name()设置，Profiler按此分别统计
+
+    def __init__(self, fn: Callable[[LocatedText, int], State]):
         self.fn = fn
 
     def assign(self, parser):
-        self.fn = parser.fn
+        """
+        为undef()声明的规则赋值，packrat模式下该规则会被记忆化，
+        声明为left_recursive的规则则总是以种子增长的方式解析
+        """
+        global _assigns
+        if self.frozen:
+            raise RuntimeError('该Parser已冻结，不能再assign')
+        _assigns += 1
+        fn = parser.fn
+
+        if self.left_recursive:
+            def rule(loc: LocatedText, pos: int) -> State:
+                return _grow_run(self, fn, loc, pos)
+        else:
+            def rule(loc: LocatedText, pos: int) -> State:
+                if loc.memo is not None and loc.memo.packrat:
+                    return _memo_run(self, fn, loc, pos)
+                return fn(loc, pos)
+
+        self.fn = rule
+        self.node = ('rule', parser)
+
+    def freeze(self):
+        """
+        冻结该Parser可达的所有规则，之后对它们assign会抛出RuntimeError。
+        冻结后的语法不会再被修改，可以不加锁地在多个线程中同时使用
+
+        :return Parser: self
+        """
+        from gparser.compiler import children
+        seen = {}
+        stack = [self]
+        while stack:
+            parser = stack.pop()
+            if id(parser) in seen:
+                continue
+            if parser.node is not None and parser.node[0] == 'undef':
+                raise RuntimeError('存在尚未assign的规则，无法冻结')
+            seen[id(parser)] = parser
+            stack.extend(children(parser))
+        for parser in seen.values():
+            parser.frozen = True
+        return self
+
+    def run(self, inp: str, packrat: bool = False,
+            memo: MemoTable = None) -> State:
+        """
+        :param inp: 待解析字符串，或bytes、bytearray、memoryview、mmap
+                    （按字节解析，见gparser.binary），或Lexer.tokenize
+                    切分的词法单元（见gparser.lexer）
+        :param packrat: 是否记忆化所有由assign定义的规则
+        :param memo: 自定义的记忆化表，可限制容量及窗口大小
+        """
+        loc = _attach_memo(_source(inp), packrat, memo)
+        return self.fn(loc, 0)
+
+    def run_mmap(self, path: str, **kwargs) -> State:
+        """
+        将文件映射到内存并按字节解析（见gparser.binary），文件内容不会被
+        复制，由操作系统按需读入。返回的State引用该映射
+
+        :param kwargs: 传给run的参数，如packrat
+        """
+        with open(path, 'rb') as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # 空文件无法映射
+                data = b''
+        return self.run(data, **kwargs)
+
+    def run_stream(self, chunks: Iterable[str], lookahead: int = 4096,
+                   packrat: bool = False, memo: MemoTable = None) -> State:
+        """
+        解析流式输入，数据按需读入，已不再需要的部分会被丢弃，
+        见StreamText。返回状态的pos为绝对位置，text只包含仍保留的数据
+
+        :param chunks: 依次产生输入片段的可迭代对象
+        :param lookahead: 正则匹配时至少预读的字符数
+        """
+        if memo is None:
+            memo = MemoTable(window=lookahead)
+        loc = _attach_memo(StreamText(chunks, lookahead), packrat, memo)
+        return self.fn(loc, 0)
+
+    def run_file(self, path: str, encoding: str = 'utf-8',
+                 chunk_size: int = 1 << 16, **kwargs) -> State:
+        """
+        以流式输入解析文件，见run_stream
+        """
+        with open(path, encoding=encoding) as f:
+            return self.run_stream(iter(lambda: f.read(chunk_size), ''),
+                                   **kwargs)
 
-    def run(self, inp: str) -> State:
-        return self.fn(LocatedText(inp))
+    def iter_parse(self, inp, lookahead: int = 4096, packrat: bool = False,
+                   memo: MemoTable = None):
+        """
+        从头开始反复运行该Parser直到输入结束，每解析完一项立即产生其值，
+        流式输入时已解析的数据随之丢弃，记忆化表也在每项之后清空
 
-    def run_strict(self, inp: str) -> State:
-        return (self << eof()).run(inp)
+        :param inp: 待解析字符串、bytes等（见run），
+                    或依次产生输入片段的可迭代对象（如文件）
+        :param lookahead: 流式输入时正则匹配至少预读的字符数
+        :raise RuntimeError: 某一项解析失败，信息中包含出错位置
+        """
+        if isinstance(inp, (str,) + BUFFERS):
+            loc = _source(inp)
+        else:
+            loc = StreamText(inp, lookahead)
+        loc = _attach_memo(loc, packrat, memo)
+        for state in _records(self, loc):
+            if not state.is_successful():
+                raise RuntimeError(str(state))
+            yield state.result.value.get()
+
+    def session(self, text: str, strict: bool = False):
+        """
+        开始增量解析，之后每次编辑只重新解析受影响的规则，
+        见gparser.incremental.Session
+
+        :param strict: 是否要求解析到输入结束，同run_strict
+        """
+        from gparser.incremental import Session
+        return Session(self, text, strict)
+
+    def run_strict(self, inp: str, **kwargs) -> State:
+        return (self << eof()).run(inp, **kwargs)
 
     def __call__(self, *args, **kwargs):
         return self.run(*args, **kwargs)
 
+    def optimize(self):
+        """
+        将字符类、字面量及其重复、连接组成的子树融合为预编译的正则表达式
+
+        :return Parser: 语义相同的优化后的Parser
+        """
+        from gparser.optimizer import fuse
+        return fuse(self)
+
+    def compile(self):
+        """
+        将组合子结构编译为生成的Python代码，解析时不再创建中间Parser，
+        编译前会将生成字符列表的重复融合为正则匹配
+
+        :return Parser: 语义相同的已编译Parser
+        """
+        from gparser.compiler import compile_parser
+        return compile_parser(self)
+
     def __or__(self, other):
         """
-        消耗or
+        消耗or：other从self失败的位置开始解析，两者都失败时保留较远的错误，
+        位置相同则合并两者的期望内容；self通过cut后失败时不再尝试other。
+        首次解析时根据各分支可能的首字符建立跳转表，见_dispatch
         """
 
-        @Parser
-        def inner(loc: LocatedText) -> State:
-            state = self.fn(loc)
-            if state.is_successful():
+        def choice(loc: LocatedText, pos: int) -> State:
+            cuts = loc.cuts
+            state = self.fn(loc, pos)
+            if state.is_successful() or loc.cuts != cuts:
                 return state
-            else:
-                return other.fn(state.text)
+            return _either(loc, state, other.fn(loc, state.pos))
 
-        return inner
+        dispatch = None
+        built = -1  # 建立跳转表时的_assigns
+
+        @Parser
+        def inner(loc: LocatedText, pos: int) -> State:
+            nonlocal dispatch, built
+            if built != _assigns:
+                # 解析时各规则均已assign，此时才能分析首字符；
+                # 之后再有assign时，分支可能已经改变，重新建立
+                built = _assigns
+                dispatch = _dispatch(inner, choice)
+            return dispatch(loc, pos)
+
+        return _describe(inner, 'or', self, other)
 
     def flatmap(self, func):
         """
@@ -56,30 +221,71 @@ class Parser:
         """
 
         @Parser
-        def inner(loc: LocatedText) -> State:
-            state = self.fn(loc)
+        def inner(loc: LocatedText, pos: int) -> State:
+            state = self.fn(loc, pos)
             if state.is_successful():
-                return func(*state.result.value).fn(state.text)
+                return func(*state.result.value).fn(loc, state.pos)
             else:
                 return state
 
-        return inner
+        return _describe(inner, 'flatmap', self, func)
 
     def __add__(self, other):
-        return self.flatmap(lambda *x: other.flatmap(
-            lambda *y: _trick_just(x + y)))
+        """
+        依次解析，成功值为两者的值连接成的元组
+        """
+
+        @Parser
+        def inner(loc: LocatedText, pos: int) -> State:
+            a = self.fn(loc, pos)
+            if not a.is_successful():
+                return a
+            b = other.fn(loc, a.pos)
+            if not b.is_successful():
+                return b
+            return State(Success(_values(a) + _values(b)), loc, b.pos)
+
+        return _describe(inner, 'seq', self, other)
 
     def map(self, func):
-        return self.flatmap(lambda *v: just(func(*v)))
+        @Parser
+        def inner(loc: LocatedText, pos: int) -> State:
+            state = self.fn(loc, pos)
+            if not state.is_successful():
+                return state
+            return State(Success(Result(func(*state.result.value))), loc,
+                         state.pos)
+
+        return _describe(inner, 'map', self, func)
 
     def then(self, parser):
-        return self.flatmap(lambda *_: parser)
+        @Parser
+        def inner(loc: LocatedText, pos: int) -> State:
+            state = self.fn(loc, pos)
+            if not state.is_successful():
+                return state
+            return parser.fn(loc, state.pos)
+
+        return _describe(inner, 'then', self, parser)
 
     def __rshift__(self, parser):
         return self.then(parser)
 
     def __lshift__(self, parser):
-        return self.flatmap(lambda x: parser.flatmap(lambda *_: just(x)))
+        @Parser
+        def inner(loc: LocatedText, pos: int) -> State:
+            a = self.fn(loc, pos)
+            if not a.is_successful():
+                return a
+            value = a.result.value
+            x, = value
+            b = parser.fn(loc, a.pos)
+            if not b.is_successful():
+                return b
+            result = a.result if type(value) is Result else Success(Result(x))
+            return State(result, loc, b.pos)
+
+        return _describe(inner, 'left', self, parser)
 
     def __invert__(self):
         return skip(self)
@@ -90,22 +296,183 @@ class Parser:
     def sep_by(self, sep):
         return sep_by(self, sep)
 
+    def name(self, rule_name: str):
+        return name(self, rule_name)
+
     def tk(self):
         return token(self)
 
     def or_not(self):
-        return maybe(self) | _trick_just(Result())
+        return maybe(self) | _trick_just(EMPTY)
 
     def maybe(self):
         return maybe(self)
 
+    def memo(self):
+        return memo(self)
+
+    def with_span(self):
+        return located(self)
+
+
+def undef(left_recursive: bool = False) -> Parser:
+    """
+    声明一个稍后用assign赋值的规则，用于递归定义
+
+    :param left_recursive: 该规则是否允许（直接或间接）左递归，
+                           间接左递归时，环上至少一个规则需要声明
+    :return Parser: 尚未实现的Parser
+    """
 
-def undef() -> Parser:
     @Parser
-    def inner(_: LocatedText):
+    def inner(_: LocatedText, __: int):
         raise NotImplementedError('该Parser并未实现，请调用assign进行赋值')
 
-    return inner
+    inner.left_recursive = left_recursive
+    return _describe(inner, 'undef')
+
+
+def _source(inp) -> LocatedText:
+    """
+    :return LocatedText: 字符串输入为LocatedText，字节输入为BytesText，
+                         已是LocatedText（如Lexer.tokenize的结果）时为其副本
+    """
+    if isinstance(inp, LocatedText):
+        return inp.at(inp.offset)  # 每次运行使用各自的记忆化表
+    if isinstance(inp, BUFFERS):
+        return BytesText(inp)
+    return LocatedText(inp)
+
+
+def _attach_memo(loc, packrat: bool, memo: MemoTable):
+    if memo is None:
+        memo = MemoTable()
+    memo.packrat = memo.packrat or packrat
+    loc.memo = memo
+    return loc
+
+
+def _records(parser: Parser, loc: LocatedText):
+    """
+    从头开始反复运行parser直到输入结束，依次产生各项的状态，
+    某一项失败时产生其状态后结束
+    """
+    pos = 0
+    while not loc.is_end(pos):
+        state = parser.fn(loc, pos)
+        if state.is_successful() and state.pos == pos:
+            raise RuntimeError('重复的Parser未消耗任何字符，将无限循环')
+        yield state
+        if not state.is_successful():
+            return
+        pos = state.pos
+        loc.memo.clear()
+
+
+def _alternatives(parser: Parser, alts: list):
+    """
+    将由|连接的各个分支依次加入alts
+
+    :return: 选择的结构，分支为其在alts中的下标，a | b 为 (a, b)
+    """
+    if parser.node is not None and parser.node[0] == 'or':
+        return (_alternatives(parser.node[1], alts),
+                _alternatives(parser.node[2], alts))
+    alts.append(parser)
+    return len(alts) - 1
+
+
+def _either(loc: LocatedText, state: State, alt: State) -> State:
+    """
+    :param state: 前一分支的失败状态
+    :param alt: 之后的分支在state.pos处的结果
+    :return State: 选择的结果，两者都失败时错误按ParseError.merge合并
+    """
+    if alt.is_successful():
+        return alt
+    error = state.result.merge(state.pos, alt.result, alt.pos)
+    if error is alt.result:
+        return alt
+    return State(error, loc, alt.pos)
+
+
+_SKIPPED = ParseError()  # 在其后消耗了字符的分支失败时，被跳过分支的错误
+
+
+def _dispatch(parser: Parser, choice):
+    """
+    为由|连接的选择建立首字符跳转表：只依次尝试下一个字符可能成功的分支，
+    被跳过的分支必在当前位置失败，因此成功时结果与逐个尝试相同。
+    都失败时按选择的结构合并已有的结果，每个分支至多运行一次：
+    尝试过的分支不再运行；被跳过的分支只在没有分支消耗字符时运行，
+    以得到相同的错误，否则其错误必被消耗了字符的分支的较远错误取代，
+    因此不会回到已被消耗的位置（流式输入中该处的数据可能已被丢弃）
+
+    :param choice: 逐个尝试各分支的实现
+    :return: 新的fn，无法跳过任何分支时即为choice
+    """
+    from gparser.optimizer import first_chars, contains_cut
+    alts = []
+    tree = _alternatives(parser, alts)
+    seen = {}
+    firsts = [None if contains_cut(alt) else first_chars(alt, seen)
+              for alt in alts]
+    if all(first is None or first[1] for first in firsts):
+        return choice
+    # 首字符无法确定或可能不消耗字符地成功的分支总要尝试
+    always = tuple(i for i, first in enumerate(firsts)
+                   if first is None or first[1])
+    chars = frozenset().union(*(first[0] for first in firsts if first))
+    table = {c: tuple(i for i, first in enumerate(firsts)
+                      if first is None or first[1] or c in first[0])
+             for c in chars}
+
+    def dispatch(loc: LocatedText, pos: int) -> State:
+        cuts = loc.cuts
+        tried = {}
+        consumed = -1  # 消耗了字符后失败的分支，-1表示没有
+        for i in table.get(loc.char_at(pos), always):
+            state = alts[i].fn(loc, pos)
+            if state.is_successful() or loc.cuts != cuts:
+                return state
+            tried[i] = state
+            if state.pos != pos:
+                consumed = i
+                break
+
+        def settle(node, at: int) -> State:
+            if type(node) is int:
+                if at == pos:
+                    if node in tried:
+                        return tried[node]
+                    if node < consumed:
+                        return State(_SKIPPED, loc, pos)
+                return alts[node].fn(loc, at)
+            c = loc.cuts
+            state = settle(node[0], at)
+            if state.is_successful() or loc.cuts != c:
+                return state
+            return _either(loc, state, settle(node[1], state.pos))
+
+        return settle(tree, pos)
+
+    return dispatch
+
+
+def _values(state: State) -> tuple:
+    """
+    :return tuple: 成功值中的各个值
+    """
+    value = state.result.value
+    return value if type(value) is tuple else tuple(value)
+
+
+def _describe(parser: Parser, *node) -> Parser:
+    """
+    记录Parser的组合结构，供compile()等静态分析使用
+    """
+    parser.node = node
+    return parser
 
 
 def run_parser(parser: Parser, inp: str) -> State:
@@ -119,38 +486,43 @@ def run_parser(parser: Parser, inp: str) -> State:
     return parser.run(inp)
 
 
-def satisfy(pred: Callable[[str], bool]) -> Parser:
+def satisfy(pred: Callable[[str], bool], charset: tuple = None) -> Parser:
     """
     若下一个字符满足判断条件(pred)，则解析成功
 
     :param pred: 下一个字符该满足的条件
+    :param charset: pred的静态描述('in', chrs)或('notin', chrs)，可选
     :return Parser: 相应的Parser
     """
 
+    exhausted = ParseError("再无输入可解析")
+    unsatisfied = ParseError("不满足条件")
+
     @Parser
-    def inner(loc: LocatedText) -> State:
-        if loc.isEOF():
-            return State(ParseError("再无输入可解析"), loc)
+    def inner(loc: LocatedText, pos: int) -> State:
+        c = loc.char_at(pos)
+        if c == '':
+            return State(exhausted, loc, pos)
         else:
-            c = loc.remaining()[0]
             if pred(c):
-                loc.advance()
-                return State(Success(Result(c)), loc)
+                return State(Success(Result(c)), loc, pos + 1)
             else:
-                return State(ParseError("不满足条件"), loc)
+                return State(unsatisfied, loc, pos)
 
-    return inner
+    return _describe(inner, 'satisfy', pred, charset)
 
 
 def eof() -> Parser:
+    error = expect("Excepted: <EOF>")
+
     @Parser
-    def inner(loc: LocatedText) -> State:
-        if loc.isEOF():
-            return State(Success(Result()), loc)
+    def inner(loc: LocatedText, pos: int) -> State:
+        if loc.is_end(pos):
+            return State(UNIT, loc, pos)
         else:
-            return State(ParseError("Excepted: <EOF>"), loc)
+            return State(error, loc, pos)
 
-    return inner
+    return _describe(inner, 'eof')
 
 
 def label(parser: Parser, msg: str) -> Parser:
@@ -162,15 +534,37 @@ def label(parser: Parser, msg: str) -> Parser:
     :return Parser: 修饰过的Parser
     """
 
+    error = expect(msg)
+
     @Parser
-    def inner(loc: LocatedText) -> State:
-        state = parser.fn(loc)
+    def inner(loc: LocatedText, pos: int) -> State:
+        state = parser.fn(loc, pos)
         if state.is_successful():
             return state
         else:
-            return State(ParseError(msg), state.text)
+            return State(error, loc, state.pos)
 
-    return inner
+    return _describe(inner, 'label', parser, msg)
+
+
+def name(parser: Parser, rule_name: str) -> Parser:
+    """
+    为Parser命名，供Profiler按规则统计。只记录名字，不改变解析行为，
+    编译后也没有额外开销
+
+    :param parser: 需要命名的Parser，本身不受影响
+    :param rule_name: 规则名
+    :return Parser: 命名后的Parser
+    """
+
+    @Parser
+    def inner(loc: LocatedText, pos: int) -> State:
+        return parser.fn(loc, pos)
+
+    # undef().name(...)之后可直接assign
+    inner.left_recursive = parser.left_recursive
+    inner.rule_name = rule_name
+    return _describe(inner, 'name', parser, rule_name)
 
 
 def just(v) -> Parser:
@@ -180,11 +574,13 @@ def just(v) -> Parser:
     :return Parser: 未改变的Parser状态，但解析成功的值变为v
     """
 
+    success = Success(Result(v))
+
     @Parser
-    def inner(loc: LocatedText) -> State:
-        return State(Success(Result(v)), loc)
+    def inner(loc: LocatedText, pos: int) -> State:
+        return State(success, loc, pos)
 
-    return inner
+    return _describe(inner, 'just', v)
 
 
 def fail(msg: str = "", back_step: int = 0) -> Parser:
@@ -194,20 +590,25 @@ def fail(msg: str = "", back_step: int = 0) -> Parser:
     :param msg: 解析错误信息
     :return: Parser: 未改变的Parser状态，但直接解析错误
     """
+    error = ParseError(msg)
+
     @Parser
-    def inner(loc: LocatedText) -> State:
-        loc.back(back_step)
-        return State(ParseError(msg), loc)
+    def inner(loc: LocatedText, pos: int) -> State:
+        if pos < back_step:
+            raise RuntimeError('Back too much')
+        return State(error, loc, pos - back_step)
 
-    return inner
+    return _describe(inner, 'fail', msg, back_step)
 
 
 def _trick_just(r: Result) -> Parser:
+    success = Success(r)
+
     @Parser
-    def inner(loc: LocatedText) -> State:
-        return State(Success(r), loc)
+    def inner(loc: LocatedText, pos: int) -> State:
+        return State(success, loc, pos)
 
-    return inner
+    return _describe(inner, 'result', r)
 
 
 def char(x: str) -> Parser:
@@ -218,14 +619,92 @@ def char(x: str) -> Parser:
     :return Parser: 解析此字符的Parser
     """
     assert len(x) == 1
-    return label(satisfy(lambda c: c == x), 'Excepted: {}'.format(x))
+    return label(satisfy(lambda c: c == x, ('in', x)),
+                 'Excepted: {}'.format(x))
 
 
 def string(s: str) -> Parser:
+    """
+    解析字符串s，一次比较整个字符串。失败时与逐字符解析相同，
+    报告在第一个不匹配的字符处
+
+    :return Parser: 成功值为s的Parser
+    """
     if s == '':
         return just('')
-    else:
-        return (char(s[0]) + string(s[1:])).map(lambda x, xs: x + xs)
+    success = Success(Result(s))
+    errors = [expect('Excepted: ' + c) for c in s]
+
+    @Parser
+    def inner(loc: LocatedText, pos: int) -> State:
+        if loc.starts_with(s, pos):
+            return State(success, loc, pos + len(s))
+        # 字节输入按char_at逐字符比较
+        k = 0
+        while k < len(s) and loc.char_at(pos + k) == s[k]:
+            k += 1
+        if k == len(s):
+            return State(success, loc, pos + k)
+        return State(errors[k], loc, pos + k)
+
+    return _describe(inner, 'string', s)
+
+
+def _trie(table: dict) -> dict:
+    """
+    :return dict: 字典树，每个结点为 字符 -> 子结点，
+                  以某结点结束的字面量的值保存在键None中
+    """
+    root = {}
+    for lit, value in table.items():
+        node = root
+        for c in lit:
+            node = node.setdefault(c, {})
+        node[None] = value
+    return root
+
+
+def _longest(trie: dict, char_at: Callable[[int], str], pos: int) -> tuple:
+    """
+    :return tuple: 从pos开始最长匹配的 (结束位置, 值)，没有匹配时结束位置为-1
+    """
+    end, value = -1, None
+    node = trie
+    while node is not None:
+        if None in node:
+            end, value = pos, node[None]
+        node = node.get(char_at(pos))
+        pos += 1
+    return end, value
+
+
+def literals(table: dict) -> Parser:
+    """
+    解析table中的字面量之一，有多个可以匹配时取最长的，成功值为对应的值。
+    用字典树逐字符查找，比较次数只与匹配的长度有关，与字面量的个数无关；
+    失败时不消耗字符，期望的内容为所有字面量
+
+    :param table: 字面量 -> 成功值
+    :return Parser: 相应的Parser
+    """
+    trie = _trie(table)
+    error = ParseError(None, tuple(table))
+
+    @Parser
+    def inner(loc: LocatedText, pos: int) -> State:
+        end, value = _longest(trie, loc.char_at, pos)
+        if end < 0:
+            return State(error, loc, pos)
+        return State(Success(Result(value)), loc, end)
+
+    return _describe(inner, 'literals', trie, error)
+
+
+def keywords(words: Iterable[str]) -> Parser:
+    """
+    解析words中最长的匹配，成功值为匹配的字符串，见literals
+    """
+    return literals({w: w for w in words})
 
 
 def space() -> Parser:
@@ -259,18 +738,28 @@ def alpha() -> Parser:
     return label(satisfy(str.isalpha), 'Excepted: alpha')
 
 
-def regex(rex) -> Parser:
+def regex(rex, flags: int = 0) -> Parser:
+    """
+    在当前位置匹配正则表达式，正则在构造时编译一次
+    :param rex: 正则字符串或已编译的正则
+    :param flags: 编译rex时使用的标志，rex已编译时须为0
+    :return Parser: 正则含命名组时结果为groupdict()，否则为匹配的字符串
+    """
+    pattern = re.compile(rex, flags)
+    named = bool(pattern.groupindex)
+    error = ParseError("不满足正则条件")
+
     @Parser
-    def inner(loc: LocatedText) -> State:
-        res = re.match(rex, loc.remaining())
+    def inner(loc: LocatedText, pos: int) -> State:
+        res = loc.match(pattern, pos)
         if res is None:
-            return State(ParseError("不满足正则条件"), loc)
+            return State(error, loc, pos)
         else:
-            e = res.end()
-            loc.advance(e)
-            return State(Success(Result(res.group())), loc)
+            value = res.groupdict() if named else res.group()
+            return State(Success(Result(value)), loc,
+                         pos + res.end() - res.start())
 
-    return inner
+    return _describe(inner, 'regex', pattern)
 
 
 def one_of(chrs: str) -> Parser:
@@ -279,7 +768,7 @@ def one_of(chrs: str) -> Parser:
     :param chrs: 所述的待解析字符串
     :return Parser: 解析所给字符其中之一的Parser
     """
-    return label(satisfy(lambda c: c in chrs),
+    return label(satisfy(lambda c: c in chrs, ('in', chrs)),
                  'Excepted: one of ' + ','.join(chrs))
 
 
@@ -289,30 +778,79 @@ def none_of(chrs: str) -> Parser:
     :param chrs: 所述的待排除字符串
     :return Parser: 解析所给字符以外字符的Parser
     """
-    return label(satisfy(lambda c: c not in chrs),
+    return label(satisfy(lambda c: c not in chrs, ('notin', chrs)),
                  'Excepted: none of ' + ', '.join(chrs))
 
 
+def _repeat(parser: Parser, loc: LocatedText, pos: int,
+            xs: list = None) -> State:
+    """
+    从pos开始循环运行parser直到其失败，成功值依次追加到xs中（xs为None时丢弃）
+
+    :return State: 在parser失败的位置结束的成功状态，成功值为xs（xs为None时
+                   为空）；parser通过cut后失败时为该失败状态
+    """
+    fn = parser.fn
+    while True:
+        cuts = loc.cuts
+        state = fn(loc, pos)
+        if not state.is_successful():
+            if loc.cuts != cuts:
+                return state
+            if xs is None:
+                return State(UNIT, loc, state.pos)
+            return State(Success(Result(xs)), loc, state.pos)
+        if state.pos == pos:
+            raise RuntimeError('重复的Parser未消耗任何字符，将无限循环')
+        pos = state.pos
+        if xs is not None:
+            xs.append(state.result.value.get())
+
+
+def _repeat1(first: Parser, rest: Parser, keep: bool = True) -> Parser:
+    """
+    先运行一次first，再不断运行rest，收集所有成功值
+    """
+
+    @Parser
+    def inner(loc: LocatedText, pos: int) -> State:
+        state = first.fn(loc, pos)
+        if not state.is_successful():
+            return state
+        if keep:
+            return _repeat(rest, loc, state.pos, [state.result.value.get()])
+        else:
+            return _repeat(rest, loc, state.pos)
+
+    return _describe(inner, 'repeat1', first, rest, keep)
+
+
 def many(parser: Parser) -> Parser:
-    return parser.flatmap(lambda x:
-                          many(parser).flatmap(lambda xs:
-                                               just([x] + xs))) | just([])
+    @Parser
+    def inner(loc: LocatedText, pos: int) -> State:
+        return _repeat(parser, loc, pos, [])
+
+    return _describe(inner, 'many', parser)
 
 
 def many1(parser: Parser) -> Parser:
-    return (parser + many(parser)).map(lambda x, xs: [x] + xs)
+    return _repeat1(parser, parser)
 
 
 def skip(parser: Parser) -> Parser:
-    return parser >> _trick_just(Result())
+    return parser >> _trick_just(EMPTY)
 
 
 def skip_many(parser: Parser) -> Parser:
-    return many(parser) >> _trick_just(Result())
+    @Parser
+    def inner(loc: LocatedText, pos: int) -> State:
+        return _repeat(parser, loc, pos)
+
+    return _describe(inner, 'skip_many', parser)
 
 
 def skip_many1(parser: Parser) -> Parser:
-    return many1(parser) >> _trick_just(Result())
+    return _repeat1(parser, parser, keep=False)
 
 
 def maybe(parser: Parser) -> Parser:
@@ -321,15 +859,143 @@ def maybe(parser: Parser) -> Parser:
     """
 
     @Parser
-    def inner(loc: LocatedText) -> State:
-        pre_text = copy.copy(loc)
-        state = parser.fn(loc)
-        if state.is_successful():
+    def inner(loc: LocatedText, pos: int) -> State:
+        cuts = loc.cuts
+        pins = loc.pins
+        if pins is not None:
+            # 流式输入：解析期间保留pos之后的数据
+            pins.append(pos)
+            state = parser.fn(loc, pos)
+            pins.pop()
+        else:
+            state = parser.fn(loc, pos)
+        if state.is_successful() or loc.cuts != cuts:
+            # 通过了cut时不再回溯
             return state
         else:
-            return State(state.result, pre_text)
+            # 回溯到pos，错误仍报告在实际出错的位置
+            return State(state.result.at(state.pos), loc, pos)
+
+    return _describe(inner, 'maybe', parser)
+
+
+def cut() -> Parser:
+    """
+    提交：总是成功且不消耗字符。通过cut之后，所有在它之前开始的maybe不再回溯，
+    |不再尝试其后的分支，many等重复、chain_left、expression及左递归规则也不把
+    之后的失败当作正常结束，失败直接传递到最外层，错误报告在实际出错的位置。
+    此后不会再回到cut之前的位置，记忆化表中之前的条目随之丢弃，
+    流式输入时之前的数据也不再保留
+
+    :return Parser: 不产生值的Parser
+    """
+
+    @Parser
+    def inner(loc: LocatedText, pos: int) -> State:
+        _commit(loc, pos)
+        return State(UNIT, loc, pos)
+
+    return _describe(inner, 'cut')
+
+
+def _commit(loc: LocatedText, pos: int):
+    loc.cuts += 1
+    if loc.memo is not None:
+        loc.memo.release(pos)
+    if loc.streaming:
+        loc.release(pos)
+
+
+def _memo_run(key, fn: Callable[[LocatedText, int], State],
+              loc: LocatedText, start: int) -> State:
+    table = loc.memo
+    entry = table.get(key, start)
+    if entry is not None:
+        result, end = entry
+        return State(result, loc, end)
+    state = fn(loc, start)
+    table.put(key, start, (state.result, state.pos))
+    return state
+
+
+def _grow_run(key, fn: Callable[[LocatedText, int], State],
+              loc: LocatedText, start: int) -> State:
+    """
+    种子增长（Warth et al.）：先以失败作为该位置的种子，
+    反复解析规则体，只要结果变长就更新种子，直到无法再增长
+    """
+    if loc.memo is None:
+        loc.memo = MemoTable()
+    table = loc.memo
+    entry = table.get(key, start)
+    if entry is None:
+        entry = table.seeds.get((key, start))
+    if entry is not None:
+        result, end = entry
+        return State(result, loc, end)
+
+    # 增长期间种子的起点即最早的可回溯位置，流式输入据此保留数据
+    seed = (key, start)
+    table.seeds[seed] = (ParseError('左递归'), start)
+    best = None
+    while True:
+        table.discard_at(start)
+        cuts = loc.cuts
+        state = fn(loc, start)
+        end = state.pos
+        if best is None or (loc.cuts != cuts and
+                            not state.is_successful()):
+            # 首次解析，或通过cut后失败：结果即为该次解析的结果
+            best = (state.result, end)
+            if not state.is_successful():
+                break
+        elif not state.is_successful() or end <= best[1]:
+            break
+        else:
+            best = (state.result, end)
+        table.seeds[seed] = best
+    del table.seeds[seed]
+    table.put(key, start, best)
+    result, end = best
+    return State(result, loc, end)
+
+
+def memo(parser: Parser) -> Parser:
+    """
+    记忆化：同一次解析中，该Parser在同一位置只会真正运行一次
+
+    :param parser: 需要记忆化的Parser
+    :return Parser: 记忆化后的Parser
+    """
 
-    return inner
+    @Parser
+    def inner(loc: LocatedText, pos: int) -> State:
+        if loc.memo is None:
+            return parser.fn(loc, pos)
+        return _memo_run(inner, parser.fn, loc, pos)
+
+    return _describe(inner, 'memo', parser)
+
+
+def located(parser: Parser) -> Parser:
+    """
+    在成功值之后追加 (起始偏移, 结束偏移)，不计算行列，
+    需要时用 LocatedText.position 查询
+
+    :param parser: 需要记录位置的Parser
+    :return Parser: 成功值为 Result(*原成功值, (start, end)) 的Parser
+    """
+
+    @Parser
+    def inner(loc: LocatedText, pos: int) -> State:
+        state = parser.fn(loc, pos)
+        if state.is_successful():
+            span = (pos, state.pos)
+            return State(Success(Result(*state.result.value, span)),
+                         loc, state.pos)
+        return state
+
+    return _describe(inner, 'span', parser)
 
 
 def between(lf: Parser, cont: Parser, rt: Parser) -> Parser:
@@ -338,7 +1004,7 @@ def between(lf: Parser, cont: Parser, rt: Parser) -> Parser:
 
 
 def sep_by1(cont: Parser, sep: Parser) -> Parser:
-    return (cont + many(sep >> cont)).map(lambda x, xs: [x] + xs)
+    return _repeat1(cont, sep >> cont)
 
 
 def sep_by(cont: Parser, sep: Parser) -> Parser:
@@ -351,15 +1017,164 @@ def token(parser: Parser) -> Parser:
 
 
 def chain_left(node: Parser, op: Parser) -> Parser:
-    aux = (op + node).map(lambda fn, n: lambda x: fn(x, n))
-    return (node + many(aux)).map(lambda fst, nps:
-                                  reduce((lambda x, cmb: cmb(x)), [fst] + nps))
+    @Parser
+    def inner(loc: LocatedText, pos: int) -> State:
+        state = node.fn(loc, pos)
+        if not state.is_successful():
+            return state
+        acc = state.result.value.get()
+        while True:
+            cuts = loc.cuts
+            state = op.fn(loc, state.pos)
+            if not state.is_successful():
+                break
+            fn = state.result.value.get()
+            state = node.fn(loc, state.pos)
+            if not state.is_successful():
+                break
+            acc = fn(acc, state.result.value.get())
+        if loc.cuts != cuts:
+            return state
+        return State(Success(Result(acc)), loc, state.pos)
+
+    return _describe(inner, 'chain_left', node, op)
 
 
 def chain_right(node: Parser, op: Parser) -> Parser:
-    return node.flatmap(lambda l:
-                        (op + chain_right(node, op)).map(lambda fn, r:
-                                                         fn(l, r)) | just(l))
+    @Parser
+    def inner(loc: LocatedText, pos: int) -> State:
+        state = node.fn(loc, pos)
+        if not state.is_successful():
+            return state
+        xs, fns = [state.result.value.get()], []
+        while True:
+            cuts = loc.cuts
+            state = op.fn(loc, state.pos)
+            if not state.is_successful():
+                break
+            fn = state.result.value.get()
+            state = node.fn(loc, state.pos)
+            if not state.is_successful():
+                break
+            fns.append(fn)
+            xs.append(state.result.value.get())
+        if loc.cuts != cuts:
+            return state
+        acc = xs.pop()
+        while fns:
+            acc = fns.pop()(xs.pop(), acc)
+        return State(Success(Result(acc)), loc, state.pos)
+
+    return _describe(inner, 'chain_right', node, op)
+
+
+_NO_OPERATOR = fail('没有该类运算符')
+_FIXITIES = ('prefix', 'postfix', 'left', 'right')
+
+
+def expression(operand: Parser, table: Iterable[tuple]) -> Parser:
+    """
+    运算符优先级解析：按table中各级运算符的优先级及结合性组合operand，
+    用显式的栈代替递归，表达式再长也不会栈溢出。
+    与chain_left相同，运算符之后的operand失败时，在失败处结束并忽略该运算符
+
+    :param operand: 运算对象，如数字、括号表达式
+    :param table: 由高到低各级运算符 (fixity, op)，fixity为 'prefix'、
+                  'postfix'、'left'（左结合中缀）或 'right'（右结合中缀）；
+                  op的成功值为函数，前缀、后缀为一元函数，中缀为二元函数。
+                  同一级的多个运算符用|组合
+    :return Parser: 成功值为整个表达式的值
+    """
+    table = list(table)
+    ops = {fixity: _NO_OPERATOR for fixity in _FIXITIES}
+    for i, (fixity, op) in enumerate(table):
+        if fixity not in _FIXITIES:
+            raise ValueError('未知的运算符类型：{}'.format(fixity))
+        # 绑定力：越靠前越大
+        tagged = op.map(lambda fn, bp=len(table) - i, right=fixity == 'right':
+                        (bp, right, fn))
+        prev = ops[fixity]
+        ops[fixity] = tagged if prev is _NO_OPERATOR else prev | tagged
+    infix = ops['left'] if ops['right'] is _NO_OPERATOR else \
+        ops['right'] if ops['left'] is _NO_OPERATOR else \
+        ops['left'] | ops['right']
+    return _expression(operand, ops['prefix'], infix, ops['postfix'])
+
+
+def _reduce(values: list, ops: list, bp: int, right: bool = False):
+    """
+    运算栈中绑定力大于bp（right为False时包括等于）的运算符出栈并求值
+    """
+    while ops and (ops[-1][0] > bp or (ops[-1][0] == bp and not right)):
+        _, unary, fn = ops.pop()
+        if unary:
+            values[-1] = fn(values[-1])
+        else:
+            x = values.pop()
+            values[-1] = fn(values[-1], x)
+
+
+def _expression(operand: Parser, prefix: Parser, infix: Parser,
+                postfix: Parser) -> Parser:
+    """
+    :param prefix, infix, postfix: 成功值为 (绑定力, 是否右结合, 函数) 的
+                                   Parser，没有该类运算符时为_NO_OPERATOR
+    """
+
+    @Parser
+    def inner(loc: LocatedText, pos: int) -> State:
+        values = []
+        ops = []  # (绑定力, 是否一元, 函数)
+        cuts = loc.cuts  # 上一个中缀运算符之前通过的cut数
+        while True:
+            mark = len(ops)
+            if prefix is not _NO_OPERATOR:
+                while True:
+                    c = loc.cuts
+                    state = prefix.fn(loc, pos)
+                    pos = state.pos
+                    if not state.is_successful():
+                        if loc.cuts != c:
+                            return state
+                        break
+                    bp, _, fn = state.result.value.get()
+                    ops.append((bp, True, fn))
+            state = operand.fn(loc, pos)
+            pos = state.pos
+            if not state.is_successful():
+                if not values or loc.cuts != cuts:
+                    return state
+                del ops[mark - 1:]  # 最后的中缀运算符及其后的前缀运算符
+                break
+            values.append(state.result.value.get())
+            if postfix is not _NO_OPERATOR:
+                while True:
+                    c = loc.cuts
+                    state = postfix.fn(loc, pos)
+                    pos = state.pos
+                    if not state.is_successful():
+                        if loc.cuts != c:
+                            return state
+                        break
+                    bp, _, fn = state.result.value.get()
+                    _reduce(values, ops, bp)
+                    values[-1] = fn(values[-1])
+            if infix is _NO_OPERATOR:
+                break
+            cuts = loc.cuts
+            state = infix.fn(loc, pos)
+            pos = state.pos
+            if not state.is_successful():
+                if loc.cuts != cuts:
+                    return state
+                break
+            bp, right, fn = state.result.value.get()
+            _reduce(values, ops, bp, right)
+            ops.append((bp, False, fn))
+        _reduce(values, ops, 0)
+        return State(Success(Result(values[0])), loc, pos)
+
+    return _describe(inner, 'expression', operand, prefix, infix, postfix)
 
 
 def number() -> Parser:
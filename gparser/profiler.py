@@ -0,0 +1,185 @@
+# -*- coding: UTF-8 -*-
+"""
+按规则统计解析的开销
+
+Profiler.instrument复制语法，只在由name()命名或label()修饰的Parser外
+包一层计数、计时的Parser；原语法不受影响，因此不使用Profiler时没有任何开销。
+统计结果可以用report()查看，或用flamegraph()导出为flamegraph.pl、
+speedscope等工具可读的折叠栈格式
+"""
+import time
+
+from gparser.parser import Parser, undef, _describe
+from gparser.optimizer import _REBUILD, _CHILDREN
+from gparser.util.locatedText import LocatedText
+from gparser.util.state import State
+
+__author__ = 'Gaufoo, zhongzc_arch@outlook.com'
+
+
+class RuleStats:
+    """
+    一个规则的统计：time包含其中其他规则的时间，self_time不包含；
+    consumed为成功时消耗的字符数；backtracks为读入了字符后才失败的次数，
+    这些字符需要由外层的maybe等回溯后重新解析
+    """
+    __slots__ = ('calls', 'successes', 'failures', 'time', 'self_time',
+                 'consumed', 'backtracks')
+
+    def __init__(self):
+        self.calls = self.successes = self.failures = 0
+        self.time = self.self_time = 0.0
+        self.consumed = self.backtracks = 0
+
+    def __repr__(self):
+        return 'RuleStats({})'.format(', '.join(
+            '{}={!r}'.format(k, getattr(self, k)) for k in self.__slots__))
+
+
+def _rule_name(parser: Parser):
+    if parser.rule_name is not None:
+        return parser.rule_name
+    if parser.node is not None and parser.node[0] == 'label':
+        msg = parser.node[2]
+        prefix = 'Excepted: '
+        return msg[len(prefix):] if msg.startswith(prefix) else msg
+    return None
+
+
+class Profiler:
+    """
+    Profiler()
+
+    用法：
+        profiler = Profiler()
+        state = profiler.instrument(parser).run(text)
+        print(profiler.report())
+
+    统计在多次解析间累积，clear()清空。同一时间只应在一个线程中使用
+    """
+
+    def __init__(self):
+        self.stats = {}  # 规则名 -> RuleStats
+        self.stacks = {}  # 规则名组成的调用栈 -> 自身耗时（秒）
+        self.__frames = []  # 正在运行的规则：[调用栈, 其中其他规则的耗时]
+
+    def clear(self):
+        self.stats.clear()
+        self.stacks.clear()
+
+    def instrument(self, parser: Parser) -> Parser:
+        """
+        :return Parser: 语义相同、会向该Profiler报告的语法副本
+        """
+        done = {}
+
+        def visit(p: Parser) -> Parser:
+            key = id(p)
+            if key in done:
+                return done[key]
+            node = p.node
+            rule_name = _rule_name(p)
+            kind = None if node is None else node[0]
+            if kind == 'rule':
+                # 先登记，规则体中对自身的引用也指向副本
+                rule = undef(p.left_recursive)
+                new = done[key] = rule if rule_name is None else \
+                    self.__wrap(rule, rule_name)
+                rule.assign(visit(node[1]))
+                return new
+            new = p
+            if kind in _REBUILD:
+                n = _CHILDREN[kind]
+                args = [visit(c) for c in node[1:1 + n]]
+                if any(a is not c for a, c in zip(args, node[1:1 + n])):
+                    new = _REBUILD[kind](*args, *node[1 + n:])
+            if rule_name is not None:
+                new = self.__wrap(new, rule_name)
+            done[key] = new
+            return new
+
+        return visit(parser)
+
+    def __wrap(self, parser: Parser, rule_name: str) -> Parser:
+        stats = self.stats.get(rule_name)
+        if stats is None:
+            stats = self.stats[rule_name] = RuleStats()
+        frames = self.__frames
+        stacks = self.stacks
+        clock = time.perf_counter
+
+        @Parser
+        def inner(loc: LocatedText, pos: int) -> State:
+            stack = frames[-1][0] + (rule_name,) if frames else (rule_name,)
+            frame = [stack, 0.0]
+            frames.append(frame)
+            start = clock()
+            try:
+                state = parser.fn(loc, pos)
+            finally:
+                elapsed = clock() - start
+                frames.pop()
+                if frames:
+                    frames[-1][1] += elapsed
+                own = elapsed - frame[1]
+                stacks[stack] = stacks.get(stack, 0.0) + own
+                stats.calls += 1
+                stats.time += elapsed
+                stats.self_time += own
+            if state.is_successful():
+                stats.successes += 1
+                stats.consumed += state.pos - pos
+            else:
+                stats.failures += 1
+                offset = state.result.offset
+                if state.pos > pos or (offset is not None and offset > pos):
+                    stats.backtracks += 1
+            return state
+
+        inner.rule_name = rule_name
+        return _describe(inner, 'profiled', parser)
+
+    def report(self, sort: str = 'time', limit: int = None) -> str:
+        """
+        :param sort: 排序依据，RuleStats的属性名，降序
+        :param limit: 只列出前limit个规则
+        :return str: 每个规则一行的统计表
+        """
+        rows = sorted(self.stats.items(),
+                      key=lambda item: getattr(item[1], sort), reverse=True)
+        lines = ['{:<24} {:>9} {:>9} {:>9} {:>10} {:>10} {:>9} {:>9}'.format(
+            'rule', 'calls', 'success', 'fail', 'time(ms)', 'self(ms)',
+            'consumed', 'backtrack')]
+        for rule_name, s in rows[:limit]:
+            lines.append(
+                '{:<24} {:>9} {:>9} {:>9} {:>10.2f} {:>10.2f} {:>9} {:>9}'
+                .format(rule_name[:24], s.calls, s.successes, s.failures,
+                        s.time * 1000, s.self_time * 1000, s.consumed,
+                        s.backtracks))
+        return '\n'.join(lines)
+
+    def flamegraph(self, path: str = None) -> list:
+        """
+        导出折叠栈格式：每行为以;分隔的规则名及该调用栈的自身耗时（微秒）
+
+        :param path: 写入的文件，为None时只返回各行
+        :return list: 各行
+        """
+        lines = ['{} {}'.format(';'.join(stack), round(t * 1e6))
+                 for stack, t in sorted(self.stacks.items())]
+        if path is not None:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+        return lines
+
+
+def profile(parser: Parser, inp: str, **kwargs) -> tuple:
+    """
+    运行一次带统计的解析
+
+    :param kwargs: 传给Parser.run的参数，如packrat
+    :return tuple: (State, Profiler)
+    """
+    profiler = Profiler()
+    state = profiler.instrument(parser).run(inp, **kwargs)
+    return state, profiler
@@ -0,0 +1,56 @@
+# -*- coding: UTF-8 -*-
+import mmap
+import re
+
+from gparser.util.locatedText import LocatedText
+
+__author__ = 'Gaufoo, zhongzc_arch@outlook.com'
+
+BUFFERS = (bytes, bytearray, memoryview, mmap.mmap)  # BytesText接受的输入
+
+
+class BytesText(LocatedText):
+    """
+    BytesText(inp: bytes | bytearray | memoryview | mmap, loc: int = 0,
+              origin: tuple = (1, 1))
+
+    以字节为单位的输入，直接在inp上解析而不复制，mmap映射的文件由操作系统
+    按需读入。位置及列数均以字节计，错误信息中的行按UTF-8解码显示。
+    char_at返回该字节对应的latin-1字符，供|的首字符跳转等使用；
+    按字节解析的Parser见gparser.binary
+    """
+    binary = True
+    _NEWLINE = re.compile(b'\n')
+
+    def __init__(self, inp, loc: int = 0, origin: tuple = (1, 1)):
+        if isinstance(inp, memoryview):
+            inp = inp.cast('B')
+        super().__init__(inp, loc, origin)
+
+    def byte_at(self, pos: int) -> int:
+        """
+        :return int: pos处的字节，越界时返回-1
+        """
+        data = self.source
+        if pos < len(data):
+            return data[pos]
+        return -1
+
+    def char_at(self, pos: int) -> str:
+        b = self.byte_at(pos)
+        return chr(b) if b >= 0 else ''
+
+    def starts_with(self, s: bytes, pos: int) -> bool:
+        # memoryview、mmap没有startswith，比较时只复制len(s)个字节
+        return self.source[pos: pos + len(s)] == s
+
+    def remaining(self) -> bytes:
+        return bytes(self.source[self.offset:])
+
+    def current_line(self) -> str:
+        start, end = self._line_bounds()
+        line = bytes(self.source[start: end]).decode('utf-8', 'replace')
+        return line[:-1] if line.endswith('\r') else line
+
+    def __repr__(self):
+        return str({'loc': self.offset, 'bytes': len(self.source)})
@@ -1,41 +1,98 @@
 # -*- coding: UTF-8 -*-
+import re
+from bisect import bisect_right
+
 __author__ = 'Gaufoo, zhongzc_arch@outlook.com'
 
 
 class LocatedText:
     """
     包含待解析字符串，以及字符串解析到的位置
+
+    LocatedText不可变：解析时整个输入共用一个LocatedText，位置以整数传递，
+    at()返回同一输入上其他位置的视图
+
+    :param origin: inp首字符在完整输入中的 (行数, 列数)，
+                   inp只是完整输入的一部分时用于报告正确的行列
     """
     __str = ...  # type: str
     __loc = ...  # type: int
+    memo = None  # type: MemoTable
+    streaming = False  # 是否为流式输入，见StreamText
+    binary = False  # 是否为字节输入，见BytesText
+    pins = None  # 流式输入中仍可能回溯到的位置
+    cuts = 0  # 解析中已通过的cut数，见parser.cut
+    tracking = False  # 是否记录读取范围，见incremental.Session
+    _NEWLINE = re.compile('\n')
 
-    def __init__(self, inp: str, loc: int = 0):
+    def __init__(self, inp: str, loc: int = 0, origin: tuple = (1, 1)):
         if loc > len(inp):
             raise RuntimeError('Invalid argument')
         self.__str = inp
         self.__loc = loc
+        self.__origin = origin
+        self.__lines = []  # 各行起始偏移，首次查询行列时才建立，副本间共享
 
-    def __copy__(self):
-        return LocatedText(self.__str, self.__loc)
+    def at(self, offset: int):
+        """
+        :return LocatedText: 同一输入上offset处的视图，共享记忆化表及行索引
+        """
+        if not 0 <= offset <= len(self.__str):
+            raise RuntimeError('Invalid offset')
+        text = type(self)(self.__str, offset, self.__origin)
+        text.memo = self.memo
+        text.__lines = self.__lines
+        return text
 
-    def remaining(self) -> str:
+    @property
+    def source(self) -> str:
         """
-        :return str: 剩余未解析的字符串
+        :return str: 完整的待解析字符串（不复制）
         """
-        return self.__str[self.__loc:]
+        return self.__str
 
-    def advance(self, n=1) -> None:
+    @property
+    def offset(self) -> int:
         """
-        :return None: 成功解析一个字符后，负责前进一位
+        :return int: 当前解析到的位置（从 0 开始的字符偏移）
         """
-        if self.isEOF():
-            raise RuntimeError('Parsing has completed')
-        self.__loc += n
+        return self.__loc
 
-    def back(self, n=1) -> None:
-        if self.__loc - n < 0:
-            raise RuntimeError('Back too much')
-        self.__loc -= n
+    def char_at(self, pos: int) -> str:
+        """
+        :return str: pos处的字符，越界时返回空串
+        """
+        s = self.__str
+        if pos < len(s):
+            return s[pos]
+        return ''
+
+    def starts_with(self, s: str, pos: int) -> bool:
+        """
+        :return bool: pos开始的文本是否以s开头
+        """
+        return self.__str.startswith(s, pos)
+
+    def match(self, pattern, pos: int):
+        """
+        :param pattern: 已编译的正则
+        :return Match | None: 锚定在pos处的匹配，匹配的长度为end() - start()
+        """
+        return pattern.match(self.__str, pos)
+
+    def is_end(self, pos: int) -> bool:
+        """
+        :return bool: pos是否已到达输入末尾
+        """
+        return pos >= len(self.__str)
+
+    def remaining(self) -> str:
+        """
+        :return str: 剩余未解析的字符串
+
+        会复制剩余部分，仅用于错误信息及测试，解析时请使用 char_at 等按位置访问的接口
+        """
+        return self.__str[self.__loc:]
 
     def isEOF(self) -> bool:
         """
@@ -43,21 +100,49 @@ class LocatedText:
         """
         return self.__loc == len(self.__str)
 
+    def _line_starts(self) -> list:
+        lines = self.__lines
+        if not lines:
+            # 整体赋值，其他线程不会看到只建立了一半的索引
+            lines[:] = [0] + [m.end()
+                              for m in self._NEWLINE.finditer(self.__str)]
+        return lines
+
+    def _line_bounds(self) -> tuple:
+        """
+        :return tuple: 当前位置所在行的 (起始偏移, 结束偏移)，不含换行符
+        """
+        lines = self._line_starts()
+        row = bisect_right(lines, self.__loc)
+        end = lines[row] - 1 if row < len(lines) else len(self.__str)
+        return lines[row - 1], end
+
+    def position(self, offset: int = None) -> tuple:
+        """
+        :param offset: 待查询的偏移，默认为当前位置
+        :return tuple: 该偏移处的 (行数, 列数)，均以 1 开始计数
+        """
+        if offset is None:
+            offset = self.__loc
+        lines = self._line_starts()
+        row = bisect_right(lines, offset)
+        col = offset - lines[row - 1] + 1
+        origin_row, origin_col = self.__origin
+        if row == 1:
+            col += origin_col - 1
+        return row + origin_row - 1, col
+
     def row(self) -> int:
         """
         :return int: 返回目前解析到的行数，以 1 开始计数
         """
-        return self.__str[0: self.__loc].count('\n') + 1
+        return self.position()[0]
 
     def col(self) -> int:
         """
         :return int: 返回目前解析到的列数，以 1 开始计数
         """
-        loc = self.__str[0: self.__loc].rfind('\n')
-        if (loc == -1):
-            return self.__loc + 1
-        else:
-            return self.__loc - loc
+        return self.position()[1]
 
     def current_line(self) -> str:
         """
@@ -65,7 +150,9 @@ class LocatedText:
         例：
             '123\n456\n789'，若解析到'5'，则返回'456'
         """
-        return self.__str.splitlines()[self.row() - 1]
+        start, end = self._line_bounds()
+        line = self.__str[start: end]
+        return line[:-1] if line.endswith('\r') else line
 
     def column_caret(self) -> str:
         """
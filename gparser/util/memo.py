@@ -0,0 +1,108 @@
+# -*- coding: UTF-8 -*-
+from collections import OrderedDict
+from heapq import heappush, heappop
+
+__author__ = 'Gaufoo, zhongzc_arch@outlook.com'
+
+
+class MemoTable:
+    """
+    MemoTable(capacity: int = None, window: int = None, packrat: bool = False)
+
+    packrat记忆化表，缓存一次解析中 (parser, offset) -> (结果, 结束位置)
+
+    :param capacity: 最多缓存的条目数，超出时淘汰最早写入的位置，None表示不限
+    :param window: 只保留距已解析到的最远位置window个字符以内的条目，
+                   None表示不限
+    :param packrat: 是否记忆化所有由undef()/assign()定义的规则
+    """
+
+    def __init__(self, capacity: int = None, window: int = None,
+                 packrat: bool = False):
+        self.capacity = capacity
+        self.window = window
+        self.packrat = packrat
+        self.__table = {}  # offset -> {parser: entry}
+        self.__order = OrderedDict()  # 按写入顺序排列的offset（值不用）
+        self.__starts = []  # offset组成的最小堆，可能含已丢弃的offset
+        self.__size = 0
+        self.__furthest = 0
+        self.__floor = 0  # 最远的cut位置，之前的位置不再记录
+        # 左递归规则正在增长的种子 (parser, offset) -> entry，不受容量限制
+        self.seeds = {}
+
+    def __len__(self):
+        return self.__size
+
+    def get(self, key, offset: int):
+        """
+        :return: 命中时返回缓存的条目，否则返回None
+        """
+        entries = self.__table.get(offset)
+        if entries is None:
+            return None
+        return entries.get(key)
+
+    def put(self, key, offset: int, entry) -> None:
+        if offset > self.__furthest:
+            self.__furthest = offset
+        low = self.__low()
+        if offset < low:
+            return
+        entries = self.__table.get(offset)
+        if entries is None:
+            self.__push(offset)
+            entries = self.__table[offset] = {}
+            self.__order[offset] = None
+        if key not in entries:
+            self.__size += 1
+        entries[key] = entry
+        self.__evict(low)
+
+    def clear(self) -> None:
+        """
+        丢弃所有条目（不包括正在增长的种子）
+        """
+        self.__table.clear()
+        self.__order.clear()
+        self.__starts.clear()
+        self.__size = 0
+        self.__floor = 0
+
+    def release(self, offset: int) -> None:
+        """
+        通过cut：丢弃offset之前的所有条目，之后也不再记录这些位置
+        """
+        if offset <= self.__floor:
+            return
+        self.__floor = offset
+        starts = self.__starts
+        while starts and starts[0] < offset:
+            self.discard_at(heappop(starts))
+
+    def discard_at(self, offset: int) -> None:
+        """
+        丢弃offset处的所有条目
+        """
+        entries = self.__table.pop(offset, None)
+        if entries is not None:
+            self.__size -= len(entries)
+            del self.__order[offset]
+
+    def __push(self, offset: int) -> None:
+        starts = self.__starts
+        if len(starts) > 2 * len(self.__table) + 16:
+            # 丢弃的offset只在release时才会弹出，过多时重建
+            starts[:] = sorted(self.__table)
+        heappush(starts, offset)
+
+    def __low(self) -> int:
+        if self.window is None:
+            return self.__floor
+        return max(self.__floor, self.__furthest - self.window)
+
+    def __evict(self, low: int) -> None:
+        order = self.__order
+        while order and (next(iter(order)) < low or (
+                self.capacity is not None and self.__size > self.capacity)):
+            self.__size -= len(self.__table.pop(order.popitem(False)[0]))
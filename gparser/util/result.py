@@ -3,14 +3,22 @@ __author__ = 'Gaufoo, zhongzc_arch@outlook.com'
 
 
 class Result:
+    __slots__ = ('__lst',)
+
     def __init__(self, *l):
         self.__lst = l
 
     def __iter__(self):
-        for i in self.__lst:
-            yield i
+        return iter(self.__lst)
+
+    def __len__(self):
+        return len(self.__lst)
 
     def __add__(self, other):
+        if not other.__lst:
+            return self
+        if not self.__lst:
+            return other
         return Result(*(self.__lst + other.__lst))
 
     def __repr__(self):
@@ -20,13 +28,13 @@ class Result:
         return self.__lst == other.__lst
 
     def get(self):
-        for i in self:
-            return i
-
-        return None
+        lst = self.__lst
+        return lst[0] if lst else None
 
 
 class Success:
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
@@ -41,11 +49,81 @@ class Success:
 
 
 class ParseError:
-    def __init__(self, msg):
-        self.msg = msg
+    """
+    ParseError(msg: str = None, expected: tuple = (), offset: int = None)
+
+    解析错误。expected为期望的内容（如 'a'、'digit'），msg为None时
+    在需要时由expected生成；offset为出错的位置，None表示即所在State的位置。
+    同一个ParseError可以被多次失败共享，因此失败时无需创建新对象
+    """
+    __slots__ = ('__msg', 'expected', 'offset')
+
+    def __init__(self, msg: str = None, expected: tuple = (),
+                 offset: int = None):
+        self.__msg = msg
+        self.expected = expected
+        self.offset = offset
+
+    @property
+    def msg(self) -> str:
+        if self.__msg is None:
+            return 'Excepted: ' + ' or '.join(self.expected)
+        return self.__msg
+
+    def at(self, offset: int):
+        """
+        :return ParseError: 出错位置固定为offset（已固定时为其本身）
+        """
+        if self.offset is not None:
+            return self
+        return ParseError(self.__msg, self.expected, offset)
+
+    def moved(self, delta: int):
+        """
+        :return ParseError: 出错位置移动delta后的错误（未固定时为其本身）
+        """
+        if self.offset is None or delta == 0:
+            return self
+        return ParseError(self.__msg, self.expected, self.offset + delta)
+
+    def merge(self, pos: int, other, other_pos: int):
+        """
+        other在self之后解析且同样失败：保留较远的错误，位置相同且两者
+        都有期望内容时合并期望
+
+        :param pos: self所在State的位置
+        :param other_pos: other所在State的位置
+        :return ParseError: 合并后的错误，用于other_pos处的State
+        """
+        mine = pos if self.offset is None else self.offset
+        theirs = other_pos if other.offset is None else other.offset
+        if mine > theirs:
+            return self.at(mine)
+        if mine < theirs or not self.expected or not other.expected:
+            return other
+        expected = self.expected + tuple(
+            e for e in other.expected if e not in self.expected)
+        return ParseError(None, expected,
+                          None if mine == other_pos else mine)
 
     def __repr__(self):
         return 'ParseError(msg={})'.format(self.msg)
 
     def get(self):
         raise RuntimeError('ParseError: {}'.format(self.msg))
+
+
+def expect(msg: str) -> ParseError:
+    """
+    :param msg: 形如 'Excepted: a' 的信息，期望的内容为 'a'；
+                其他信息整体作为期望的内容
+    :return ParseError: label等使用的错误
+    """
+    prefix = 'Excepted: '
+    name = msg[len(prefix):] if msg.startswith(prefix) else msg
+    return ParseError(msg, (name,))
+
+
+# 不可变，可在各处共享的常用实例
+EMPTY = Result()
+UNIT = Success(EMPTY)
@@ -7,14 +7,29 @@ __author__ = 'Gaufoo, zhongzc_arch@outlook.com'
 
 class State:
     """
-    # State(result: T, text: LocatedText)
+    # State(result: T, text: LocatedText, pos: int = None)
 
-    解析后返回的状态，result的类型是(Success | ParseError)
+    解析后返回的状态，result的类型是(Success | ParseError)，
+    pos为解析结束（失败时为出错）的位置，默认为text所在的位置
     """
+    __slots__ = ('result', 'pos', '__text', '__view')
 
-    def __init__(self, result, text: LocatedText):
+    def __init__(self, result, text: LocatedText, pos: int = None):
         self.result = result
-        self.text = text
+        self.pos = text.offset if pos is None else pos
+        self.__text = text
+        self.__view = None
+
+    @property
+    def text(self) -> LocatedText:
+        """
+        :return LocatedText: pos处的文本，只在需要时创建
+        """
+        if self.__view is None:
+            text = self.__text
+            self.__view = text if text.offset == self.pos else \
+                text.at(self.pos)
+        return self.__view
 
     def is_successful(self):
         return isinstance(self.result, Success)
@@ -29,9 +44,10 @@ class State:
         if self.is_successful():
             return 'Parsing succeed'
         else:
+            offset = self.result.offset
             return '{}\n{}'.format(
                 self.result.msg,
-                self.text
+                self.text if offset is None else self.__text.at(offset)
             )
 
     def __iter__(self):
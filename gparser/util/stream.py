@@ -0,0 +1,172 @@
+# -*- coding: UTF-8 -*-
+from functools import lru_cache
+from typing import Iterable
+
+from gparser.util.locatedText import LocatedText
+
+__author__ = 'Gaufoo, zhongzc_arch@outlook.com'
+
+
+class StreamText:
+    """
+    StreamText(chunks: Iterable[str], lookahead: int = 4096)
+
+    流式输入：按需从chunks中读入数据，与LocatedText一样以绝对位置访问。
+    每次读入新数据时，丢弃已不可能再访问的旧数据，即早于所有仍可能回溯到的
+    位置（maybe、左递归规则的起点）且早于当前位置lookahead个字符以上的部分，
+    因此内存只与单次回溯的跨度及lookahead有关，而与输入总长无关。
+    通过cut后，maybe不会再回溯到cut之前，因此只保留正在增长的左递归规则的起点
+
+    :param chunks: 依次产生输入片段的可迭代对象，如文件或socket的读取结果
+    :param lookahead: 正则匹配时至少预读的字符数，
+                      也是当前位置之前保留的字符数（供fail(back_step)使用）
+    """
+    streaming = True
+    binary = False
+    max_token = 1 << 20  # 单次正则匹配最多预读的字符数，见match
+    offset = None  # 流本身不对应某个位置，State.text总会调用at()
+    memo = None  # type: MemoTable
+    cuts = 0  # 解析中已通过的cut数，见parser.cut
+
+    def __init__(self, chunks: Iterable[str], lookahead: int = 4096):
+        self.lookahead = lookahead
+        self.pins = []  # maybe开始的位置，非递减
+        self.__chunks = iter(chunks)
+        self.__buf = ''
+        self.__base = 0  # __buf[0]的绝对位置
+        self.__origin = (1, 1)  # __buf[0]的行列
+        self.__done = False
+        self.__floor = 0  # 最远的cut位置
+
+    def __len__(self):
+        """
+        :return int: 缓冲区中保留的字符数
+        """
+        return len(self.__buf)
+
+    @property
+    def base(self) -> int:
+        """
+        :return int: 缓冲区中最早的字符的绝对位置，之前的数据均已丢弃
+        """
+        return self.__base
+
+    def release(self, offset: int) -> None:
+        """
+        通过cut：之后不再回溯到offset之前，下次读入时可丢弃这部分数据
+        """
+        if offset > self.__floor:
+            self.__floor = offset
+
+    def __fill(self, pos: int) -> bool:
+        """
+        读入下一个片段，并丢弃pos处的操作不再需要的数据
+
+        :return bool: 是否读入了新数据
+        """
+        if self.__done:
+            return False
+        for chunk in self.__chunks:
+            if chunk:
+                break
+        else:
+            self.__done = True
+            return False
+        keep = pos - self.lookahead
+        if self.pins:
+            keep = min(keep, max(self.pins[0], self.__floor))
+        if self.memo is not None:
+            for _, start in self.memo.seeds:
+                keep = min(keep, start)
+        drop = keep - self.__base
+        if drop > 0:
+            self.__discard(drop)
+        self.__buf += chunk
+        return True
+
+    def __discard(self, n: int) -> None:
+        dropped = self.__buf[:n]
+        lines = dropped.count('\n')
+        row, col = self.__origin
+        if lines:
+            self.__origin = (row + lines, n - dropped.rfind('\n'))
+        else:
+            self.__origin = (row, col + n)
+        self.__buf = self.__buf[n:]
+        self.__base += n
+
+    def __index(self, pos: int, n: int = 1) -> int:
+        """
+        :return int: pos在缓冲区中的下标，尽量保证其后至少有n个字符
+        """
+        i = pos - self.__base
+        if i < 0:
+            raise RuntimeError('该位置的数据已被丢弃')
+        while i + n > len(self.__buf) and self.__fill(pos):
+            i = pos - self.__base
+        return i
+
+    def char_at(self, pos: int) -> str:
+        i = self.__index(pos)
+        buf = self.__buf
+        if i < len(buf):
+            return buf[i]
+        return ''
+
+    def starts_with(self, s: str, pos: int) -> bool:
+        i = self.__index(pos, len(s))
+        return self.__buf.startswith(s, i)
+
+    def match(self, pattern, pos: int):
+        """
+        在预读lookahead个字符后匹配。若匹配延伸到缓冲区末尾，或匹配失败而
+        pos处的字符可能开始一个匹配（失败可能是因为数据未读完），
+        则继续读入并重试，直到pos之后已读入max_token个字符
+
+        :raise RuntimeError: 匹配超过max_token个字符时
+        """
+        i = self.__index(pos, self.lookahead)
+        m = pattern.match(self.__buf, i)
+        while m is None or m.end() == len(self.__buf):
+            if m is None and not _may_start(pattern, self.char_at(pos)):
+                break
+            if len(self.__buf) - (pos - self.__base) >= self.max_token:
+                if m is not None:
+                    raise RuntimeError('正则匹配超过了max_token个字符')
+                break
+            if not self.__fill(pos):
+                break
+            m = pattern.match(self.__buf, pos - self.__base)
+        return m
+
+    def is_end(self, pos: int) -> bool:
+        return self.__index(pos) >= len(self.__buf)
+
+    def at(self, offset: int) -> LocatedText:
+        """
+        :return LocatedText: 缓冲区中仍保留的数据在offset处的视图，
+                             其行列为完整输入中的行列
+        """
+        i = offset - self.__base
+        if not 0 <= i <= len(self.__buf):
+            raise RuntimeError('该位置的数据已被丢弃')
+        text = LocatedText(self.__buf, i, self.__origin)
+        text.memo = self.memo
+        return text
+
+    def __repr__(self):
+        return str({'base': self.__base, 'buffered': len(self.__buf)})
+
+
+@lru_cache(maxsize=None)
+def _first(pattern):
+    from gparser.optimizer import _pattern_first
+    return _pattern_first(pattern)
+
+
+def _may_start(pattern, c: str) -> bool:
+    """
+    :return bool: 以c开头的输入是否可能匹配pattern
+    """
+    first = _first(pattern)
+    return first is None or first[1] or c in first[0]
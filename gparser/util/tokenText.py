@@ -0,0 +1,86 @@
+# -*- coding: UTF-8 -*-
+from array import array
+
+from gparser.util.locatedText import LocatedText
+
+__author__ = 'Gaufoo, zhongzc_arch@outlook.com'
+
+
+class TokenText(LocatedText):
+    """
+    TokenText(text: LocatedText, kinds: array, starts: array, ends: array,
+              names: tuple, loc: int = 0)
+
+    词法分析后的输入（见Lexer.tokenize），位置以词法单元为单位。
+    第i个单元的类别编号、起止偏移分别为kinds[i]、starts[i]、ends[i]，
+    回溯时只需比较整数，不会重新扫描文本。
+    char_at返回类别编号对应的字符，供|的首字符跳转等使用；
+    行列及错误信息按单元在原文中的起始位置报告
+    """
+
+    def __init__(self, text: LocatedText, kinds: array, starts: array,
+                 ends: array, names: tuple, loc: int = 0):
+        super().__init__(kinds, loc)
+        self.text = text
+        self.kinds = kinds
+        self.starts = starts
+        self.ends = ends
+        self.names = names
+
+    def at(self, offset: int):
+        if not 0 <= offset <= len(self.kinds):
+            raise RuntimeError('Invalid offset')
+        view = TokenText(self.text, self.kinds, self.starts, self.ends,
+                         self.names, offset)
+        view.memo = self.memo
+        return view
+
+    def kind_at(self, pos: int) -> int:
+        """
+        :return int: pos处单元的类别编号，越界时返回-1
+        """
+        kinds = self.kinds
+        if pos < len(kinds):
+            return kinds[pos]
+        return -1
+
+    def char_at(self, pos: int) -> str:
+        k = self.kind_at(pos)
+        return chr(k) if k >= 0 else ''
+
+    def token_text(self, pos: int) -> str:
+        """
+        :return str: pos处单元的文本
+        """
+        return self.text.source[self.starts[pos]: self.ends[pos]]
+
+    def text_is(self, pos: int, s: str) -> bool:
+        """
+        :return bool: pos处单元的文本是否为s，不产生切片
+        """
+        start = self.starts[pos]
+        return self.ends[pos] - start == len(s) and \
+            self.text.source.startswith(s, start)
+
+    def char_offset(self, pos: int = None) -> int:
+        """
+        :return int: pos（默认为当前位置）处单元在原文中的起始偏移，
+                     末尾为原文长度
+        """
+        if pos is None:
+            pos = self.offset
+        if pos < len(self.kinds):
+            return self.starts[pos]
+        return len(self.text.source)
+
+    def remaining(self) -> str:
+        return self.text.source[self.char_offset():]
+
+    def position(self, offset: int = None) -> tuple:
+        return self.text.position(self.char_offset(offset))
+
+    def current_line(self) -> str:
+        return self.text.at(self.char_offset()).current_line()
+
+    def __repr__(self):
+        return str({'loc': self.offset, 'tokens': len(self.kinds)})
@@ -0,0 +1,77 @@
+import mmap
+
+import pytest
+
+from gparser import binary as b
+from gparser.parser import many, many1, sep_by, eof, char, string, \
+    ParseError
+from gparser.optimizer import first_chars
+from gparser.util.bytesText import BytesText
+from .utils import run_both
+
+
+def header():
+    key = many1(b.none_of(b':\r\n')).map(b''.join)
+    value = b.regex(rb'[^\r\n]*')
+    line = (key << b.string(b': ')) + (value << b.string(b'\r\n'))
+    return many(line.map(lambda k, v: (k, v))) << b.string(b'\r\n') << eof()
+
+
+DATA = b'Host: example.com\r\nAccept: */*\r\n\r\n'
+EXPECTED = [(b'Host', b'example.com'), (b'Accept', b'*/*')]
+
+
+def test_sources(tmp_path):
+    p = header()
+    path = tmp_path / 'req.bin'
+    path.write_bytes(DATA)
+    with open(str(path), 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    for data in (DATA, bytearray(DATA), memoryview(DATA), mapped):
+        state = p.run(data)
+        assert state.result.get() == EXPECTED and state.pos == len(DATA)
+        assert p.compile().run(data).result.get() == EXPECTED
+    assert p.run_mmap(str(path)).result.get() == EXPECTED
+    (tmp_path / 'empty').write_bytes(b'')
+    assert isinstance(p.run_mmap(str(tmp_path / 'empty')).result, ParseError)
+
+
+def test_parsers():
+    assert b.char(b'a').run(b'ab').result.get() == b'a'
+    assert b.char(0x0a).run(b'\n').result.get() == b'\n'
+    assert b.one_of(b'xy').run(b'y').result.get() == b'y'
+    assert b.satisfy(lambda c: c > 0x7f).run(b'\xff').result.get() == b'\xff'
+    state = b.string(b'GET ').run(b'GEX')
+    assert state.result.msg == 'Excepted: T' and state.pos == 2
+    state = b.string(b'GET').run(b'GE')
+    assert state.result.msg == 'Excepted: T' and state.pos == 2
+    assert b.char(0).run(b'\x01').result.msg == 'Excepted: \\x00'
+    p = sep_by(b.regex(rb'\d+').map(int), b.char(b','))
+    assert p.run(memoryview(b'1,22,333')).result.get() == [1, 22, 333]
+    with pytest.raises(TypeError):
+        b.regex(r'\d+')
+    # 字符级的Parser按latin-1字符解析字节输入
+    for p in (many(char('a')), string('aa'), string('ab')):
+        expected = p.run('aab')
+        for state in run_both(p, b'aab'):
+            assert str(state.result) == str(expected.result)
+            assert state.pos == expected.pos
+
+
+def test_errors_and_positions():
+    text = BytesText(b'ab\r\n\xe4\xb8\xadx', 6)
+    assert text.position() == (2, 3) and text.current_line() == '中x'
+    assert text.char_at(0) == 'a' and text.char_at(7) == 'x'
+    assert text.char_at(8) == '' and text.byte_at(6) == 0xad
+    assert text.at(1).remaining() == b'b\r\n\xe4\xb8\xadx'
+    state = header().run(b'Host: x\n')
+    assert state.result.msg == 'Excepted: \\x0d' and state.pos == 7
+    assert str(state).splitlines()[1:] == ['(1,8)', 'Host: x', '       ^']
+
+
+def test_iter_and_dispatch():
+    record = b.string(b'ok\n') | b.string(b'err\n') | b.regex(rb'\d+\n')
+    assert first_chars(b.string(b'ok')) == (frozenset('o'), False)
+    assert first_chars(record)[0] == frozenset('oe0123456789')
+    values = list(record.iter_parse(b'ok\n12\nerr\n'))
+    assert values == [b'ok\n', b'12\n', b'err\n']
@@ -0,0 +1,69 @@
+from gparser.parser import Parser, char, digit, string, regex, undef, \
+    sep_by, between, chain_left, chain_right, number, just, maybe, spaces, \
+    fail, eof, ParseError, Success, MemoTable
+from .test_left_recursion import sub_grammar
+from .test_memo import nested_grammar
+
+
+def same(parser, inp, **kwargs):
+    expected = parser.run(inp, **kwargs)
+    actual = parser.compile().run(inp, **kwargs)
+    assert type(actual.result) is type(expected.result)
+    if isinstance(expected.result, Success):
+        assert tuple(actual.result.value) == tuple(expected.result.value)
+    else:
+        assert actual.result.msg == expected.result.msg
+    assert actual.text.offset == expected.text.offset
+    return actual
+
+
+def json_like():
+    value = undef()
+    item = value.tk()
+    array = between(char('['), sep_by(item, char(',')), char(']'))
+    word = regex(r'[a-z]+')
+    value.assign(array | number() | word | (string('"') >> fail('引号')))
+    return value
+
+
+def test_compile_json_like():
+    p = json_like()
+    for inp in ['[1, [2, abc], [], [[-3]]]', '[1, [2', '[1 2]', '"',
+                '[' * 50 + ']' * 50]:
+        same(p, inp)
+        same(p << eof(), inp)
+
+
+def test_compile_opaque():
+    raw = Parser(lambda loc, pos: digit().fn(loc, pos))
+    pow_ = chain_right(number(), char('^') >> just(lambda x, y: x ** y))
+    p = (raw + digit().flatmap(lambda d: just(int(d) * 2))) | just(0)
+    same(p, '12x')
+    same(p, 'x')
+    assert same(pow_, '2^3^2').result.value.get() == 512
+
+
+def test_compile_rules():
+    same(sub_grammar(), '10-2-3-x')
+    same(sub_grammar(), '10-2-3', packrat=True, memo=MemoTable(window=2))
+    inp = '(' * 6 + '1' + ')' * 6
+    counter = [0]
+    same(nested_grammar(counter), inp, packrat=True)
+    same(nested_grammar(counter, memoize=True), '(((1+2)-3)+4)')
+
+
+def test_compile_values():
+    p = (digit() + maybe(char('a') + char('b')) + spaces()).map(
+        lambda *xs: xs) | (char('x') + char('y'))
+    same(p, '1ab ')
+    same(p, '1ac ')
+    same(p, 'xy')
+    p = chain_left(digit().map(int), char('+') >> just(lambda x, y: x + y))
+    same(p, '1+2+3+')
+
+
+def test_compile_deep():
+    s = 'abcdefghij' * 30
+    assert same(string(s), s + '!').result.value.get() == s
+    assert isinstance(string(s).compile().run('abc').result, ParseError)
+    assert 'def u' in string('ab').compile().source
@@ -0,0 +1,107 @@
+from gparser.parser import char, digit, alpha, string, many, many1, maybe, \
+    eof, undef, cut, chain_left, expression, fail, MemoTable, ParseError, \
+    StreamText
+from .test_stream import chunked
+from .utils import run_both
+
+
+def statements(committed=True):
+    # stmt = 'let ' name '=' number ';' | name '(' number ')' ';'
+    name = many1(alpha()).map(''.join)
+    number = many1(digit()).map(lambda ds: int(''.join(ds)))
+    keyword = string('let ') >> cut() if committed else string('let ')
+    let = maybe(keyword >> name + (char('=') >> number))
+    call = name + (char('(') >> number << char(')'))
+    stmt = undef()
+    stmt.assign((let.map(lambda n, v: ('let', n, v)) |
+                 call.map(lambda f, a: ('call', f, a))) << char(';'))
+    return stmt
+
+
+def program(committed=True):
+    return many(statements(committed)) << eof()
+
+
+def test_cut_error_position():
+    text = 'let x=1;f(2);let y=;'
+    state = program(committed=False).run(text)
+    assert state.result.msg == 'Excepted: <EOF>' and state.pos == 16
+    for state in run_both(program(), text):
+        assert state.result.msg == 'Excepted: digit' and state.pos == 19
+    for state in run_both(program(), 'let x=1;f(2);'):
+        assert state.result.get() == [('let', 'x', 1), ('call', 'f', 2)]
+    # 在cut之前失败时照常回溯
+    for state in run_both(program(), 'lex(3);'):
+        assert state.result.get() == [('call', 'lex', 3)]
+
+
+def test_cut_stops_recovery():
+    a = char('a')
+    committed = maybe(a >> cut() >> char('b'))
+    for parser, text, pos in [
+            (committed | char('a'), 'ac', 1),
+            (committed.or_not() >> a, 'ac', 1),
+            (many(committed) << eof(), 'ababac', 5),
+            (chain_left(digit().map(int),
+                        (char('+') << cut()).map(lambda _: int.__add__)),
+             '1+2+x', 4),
+            (expression(digit().map(int),
+                        [('left', (char('*') << cut()).map(
+                            lambda _: int.__mul__))]), '2*3*', 4)]:
+        for state in run_both(parser, text):
+            assert isinstance(state.result, ParseError)
+            assert state.pos == pos
+    # 可能不消耗字符就通过cut的分支不能按首字符跳过
+    parser = (many(char(' ')) >> cut() >> char('x')) | char('y')
+    for state in run_both(parser, 'y'):
+        assert state.result.msg == 'Excepted: x' and state.pos == 0
+    # 之前通过的cut不影响之后的选择
+    parser = maybe(a >> char('x') << cut()) | string('ab')
+    for state in run_both(many(parser) << eof(), 'axaxab'):
+        assert state.result.get() == ['x', 'x', 'ab']
+
+
+def left_recursive():
+    # E = E '-' ^ N | N
+    e = undef(left_recursive=True)
+    num = many1(digit()).map(lambda ds: int(''.join(ds)))
+    e.assign(maybe(e + (char('-') >> cut() >> num)).map(lambda a, b: a - b) |
+             num)
+    return e
+
+
+def test_cut_left_recursion():
+    for state in run_both(left_recursive(), '10-2-3'):
+        assert state.result.get() == 5 and state.pos == 6
+    for state in run_both(left_recursive(), '10-2-x'):
+        assert state.result.msg == 'Excepted: digit' and state.pos == 5
+    state = left_recursive().run_stream(chunked('10-2-3-4', 1), lookahead=1)
+    assert state.result.get() == 1 and state.pos == 8
+
+
+def test_cut_releases_memo():
+    text = ''.join('let v{0}=1;f{0}(2);'.format('x' * (i % 7))
+                   for i in range(200))
+    for committed, bounded in ((False, False), (True, True)):
+        memo = MemoTable()
+        state = program(committed).run(text, packrat=True, memo=memo)
+        assert len(state.result.get()) == 400
+        assert (len(memo) < 10) == bounded
+
+
+def test_cut_bounds_stream():
+    text = ''.join('let v=1;f({});'.format(i) for i in range(500))
+    for committed in (False, True):
+        sizes = []
+
+        def chunks():
+            for chunk in chunked(text, 16):
+                sizes.append(len(stream))
+                yield chunk
+
+        # 整个程序都可能被回溯，没有cut时所有数据都要保留
+        parser = maybe(program(committed)) | fail('不是程序')
+        stream = StreamText(chunks(), lookahead=8)
+        state = parser.fn(stream, 0)
+        assert len(state.result.get()) == 1000
+        assert (max(sizes) < 64) == committed
@@ -4,9 +4,14 @@
 __author__ = 'Gaufoo, zhongzc_arch@outlook.com'
 
 from gparser.parser import digit, char, number, string, alpha, space, spaces, \
-    just, ParseError, satisfy, label, one_of, regex, many, many1, skip, \
-    skip_many, sep_by, sep_by1, none_of, maybe, between
-from .utils import check_fail_msg, check_succ_cont, check_type
+    just, ParseError, Success, satisfy, label, one_of, regex, many, many1, \
+    skip, skip_many, sep_by, sep_by1, none_of, maybe, between, skip_many1, \
+    chain_left, chain_right, expression, located, eof, Result, literals, \
+    keywords, undef
+from gparser.util.result import EMPTY, UNIT
+from .utils import check_fail_msg, check_succ_cont, check_type, run_both
+import pytest
+import re
 
 
 def test_map():
@@ -71,6 +76,27 @@ def test_char():
 def test_string():
     check_succ_cont((string('abcde'), 'abcdef'), ('abcde'), 'f')
     check_type((string('abcde'), 'abcdf'), ParseError, 'f')
+    # 与逐字符解析相同，报告在第一个不匹配的字符处
+    check_fail_msg((string('abcde'), 'abcdf'), 'Excepted: e', 'f')
+    check_fail_msg((string('abc'), 'ab'), 'Excepted: c', '')
+    check_succ_cont((string('x' * 5000), 'x' * 5001), ('x' * 5000), 'x')
+
+
+def test_literals():
+    ops = ['=', '==', '===', '!=', '<', '<=', '<<', '<<=']
+    p = keywords(ops)
+    for inp, value, rest in (('<<=1', '<<=', '1'), ('<<1', '<<', '1'),
+                             ('===', '===', ''), ('!=!', '!=', '!')):
+        check_succ_cont((p, inp), (value), rest)
+    # 只有前缀匹配时不消耗字符，期望的内容为所有字面量
+    check_fail_msg((p, '!x'), 'Excepted: ' + ' or '.join(ops), '!x')
+    check_fail_msg((p, ''), 'Excepted: ' + ' or '.join(ops), '')
+    check_succ_cont((p | char('!'), '!x'), ('!'), 'x')
+    check_fail_msg((label(p, 'operator'), '!x'), 'operator', '!x')
+    names = {'k{}'.format(i): i for i in range(500)}
+    p = many(literals(names) << spaces())
+    check_succ_cont((p, 'k1 k499 k50 k5x'), ([1, 499, 50, 5]), 'x')
+    check_succ_cont((literals({'': 0, 'a': 1}), 'b'), (0), 'b')
 
 
 def test_label():
@@ -107,6 +133,11 @@ def test_regex():
     p = regex(r'[A-Za-z_][A-Za-z0-9_]*')
     check_succ_cont((p, '_iower3 = 2'), '_iower3', ' = 2')
     check_type((p, '42'), ParseError, '42')
+    p = regex(re.compile(r'(?P<key>\w+)=(?P<val>\d*)'))
+    check_succ_cont((p, 'a=12;'), {'key': 'a', 'val': '12'}, ';')
+    check_succ_cont((regex('ab', re.I), 'ABc'), 'AB', 'c')
+    with pytest.raises(ValueError):
+        regex(re.compile('ab'), re.I)
 
 
 def test_one_of():
@@ -168,3 +199,167 @@ def test_sep_by():
                      '123 456 678'), [123, 456, 678], '')
     check_succ_cont((sep_by(number(), spaces()),
                      'abc ded aad'), [], 'abc ded aad')
+
+
+def test_skip_many1():
+    check_succ_cont((skip_many1(digit()) >>
+                     string('abc'), '9876abcd'), ('abc'), 'd')
+    check_type((skip_many1(digit()), 'abcd'), ParseError, 'abcd')
+
+
+def test_chain_left():
+    p = chain_left(number(), char('-') >> just(lambda x, y: x - y))
+    check_succ_cont((p, '10-2-3'), 5, '')
+    check_succ_cont((p, '10-2-x'), 8, 'x')
+
+
+def test_long_repetition():
+    n = 20000
+    check_succ_cont((many(char('a')), 'a' * n + 'b'), ['a'] * n, 'b')
+    check_type((skip_many(char('a')), 'a' * n), Success, '')
+    check_succ_cont((sep_by(number(), char(',')),
+                     ','.join(['1'] * n)), [1] * n, '')
+    p = chain_left(number(), char('-') >> just(lambda x, y: x - y))
+    check_succ_cont((p, '-'.join(['1'] * n)), 2 - n, '')
+
+
+def test_located():
+    p = many(space()) >> located(many1(digit()).map(''.join)) + \
+        (char('\n') >> digit()).with_span()
+    for state in run_both(p, ' 12\n3'):
+        assert tuple(state.result.value) == ('12', (1, 3), '3', (3, 5))
+        assert state.text.position(3) == (1, 4)
+    for state in run_both(located(char('x')), 'y'):
+        assert isinstance(state.result, ParseError)
+
+
+def test_reentrant():
+    inner = many1(digit()).map(''.join)
+    # 在解析的回调中再次运行同一个Parser，两次解析互不影响
+    p = (inner << char(';')).map(lambda s: inner.run(s[::-1]).result.get())
+    state = (p + inner).map(lambda a, b: a + b).run('123;45')
+    assert state.result.get() == '32145' and state.pos == 6
+    state = maybe(string('ab')).run('ac')
+    assert state.pos == 0 and state.text.remaining() == 'ac'
+
+
+def test_shared_results():
+    assert eof().run('').result is UNIT
+    assert skip_many(digit()).run('12').result is UNIT
+    assert (digit() << eof()).run('1').result.get() == '1'
+    state = (digit() + digit()).run('12')
+    assert state.result.value == ('1', '2')
+    assert not hasattr(state, '__dict__')
+    assert not hasattr(state.result, '__dict__')
+    assert Result('a') + EMPTY == Result('a')
+
+
+def test_merged_errors():
+    p = char('a') | char('b') | label(digit(), 'digit')
+    for state in run_both(p, 'c'):
+        assert state.result.msg == 'Excepted: a or b or digit'
+        assert state.pos == 0
+    # 失败后在出错处尝试另一分支，两者期望合并
+    p = (char('a') >> char('b')) | char('c')
+    for state in run_both(p, 'ax'):
+        assert state.result.msg == 'Excepted: b or c' and state.pos == 1
+    # maybe回溯位置，但错误仍指向真正出错处，且较远的错误优先
+    p = maybe(char('a') >> char('b')) | char('c')
+    for state in run_both(p, 'ax'):
+        assert state.result.msg == 'Excepted: b' and state.pos == 0
+        assert str(state) == 'Excepted: b\n(1,2)\nax\n ^'
+    assert (char('a') | char('b')).run('c').result.expected == ('a', 'b')
+
+
+def test_dispatch():
+    p = (string('true') >> just(True) | string('false') >> just(False) |
+         regex(r'-?[0-9]+').map(int) | many(char(' ')) >> char('x'))
+    for inp, value, pos in (('true', True, 4), ('false', False, 5),
+                            ('-12', -12, 3), ('  x', 'x', 3)):
+        state = p.run(inp)
+        assert state.result.get() == value and state.pos == pos
+    # 失败时与逐个尝试相同：消耗了字符的分支失败后，后续分支在出错处继续
+    state = p.run('tx')
+    assert state.result.get() == 'x' and state.pos == 2
+    assert (char('a') >> char('b') | char('x')).run('ax').result.get() == 'x'
+    state = (char('a') | char('b') | char('c')).run('d')
+    assert state.result.msg == 'Excepted: a or b or c' and state.pos == 0
+    state = (char('a') | char('b') | char('c')).run('')
+    assert state.result.msg == 'Excepted: a or b or c' and state.pos == 0
+
+
+def test_dispatch_reassign():
+    # 解析后再assign，跳转表随之重建
+    rule = undef()
+    rule.assign(char('a'))
+    p = rule | char('b')
+    assert p.run('b').result.get() == 'b'
+    rule.assign(char('b') >> char('X'))
+    state = p.run('b')
+    assert state.result.msg == 'Excepted: X or b' and state.pos == 1
+    rule.assign(char('c'))
+    assert p.run('c').result.get() == 'c'
+
+
+def test_dispatch_nested_failure():
+    # 分支都失败时不重新运行已尝试的分支，否则每层嵌套使工作量加倍
+    calls = [0]
+
+    def atom(c):
+        calls[0] += 1
+        return c == 'a'
+
+    value = undef()
+    value.assign(char('[') >> many(value) << char(']') |
+                 satisfy(atom, ('in', 'a')) | char('b'))
+    state = value.run('[' * 40 + 'x')
+    assert state.result.msg == 'Excepted: b' and state.pos == 40
+    assert calls[0] == 41
+
+
+def op(f):
+    return just(f)
+
+
+def test_chain_right():
+    num = many1(digit()).map(lambda ds: int(''.join(ds)))
+    p = chain_right(num, char('^') >> op(lambda a, b: a ** b))
+    for state in run_both(p, '2^3^2^x'):
+        assert state.result.get() == 512 and state.pos == 6
+    p = chain_right(num, char('-') >> op(lambda a, b: a - b))
+    # 长链不递归
+    state = p.run('-'.join(['1'] * 20000))
+    assert state.result.get() == 0 and state.pos == 39999
+
+
+def test_expression():
+    num = many1(digit()).map(lambda ds: int(''.join(ds)))
+    p = expression(num, [
+        ('prefix', char('-') >> op(lambda x: -x)),
+        ('postfix', char('!') >> op(lambda x: x * 10)),
+        ('right', char('^') >> op(lambda a, b: a ** b)),
+        ('left', char('*') >> op(lambda a, b: a * b) |
+         char('/') >> op(lambda a, b: a // b)),
+        ('left', char('-') >> op(lambda a, b: a - b)),
+    ])
+    for inp, value, pos in (('2^3^2', 512, 5), ('-2^2', 4, 4),
+                            ('2*3-4-5', -3, 7), ('8/2/2', 2, 5),
+                            ('3!*2', 60, 4), ('5-3*2!', -55, 6),
+                            ('--3', 3, 3), ('2-', 2, 2), ('2*-x', 2, 3)):
+        for state in run_both(p, inp):
+            assert state.result.get() == value and state.pos == pos
+    for state in run_both(p, '-x'):
+        assert isinstance(state.result, ParseError) and state.pos == 1
+    with pytest.raises(ValueError):
+        expression(num, [('infix', char('+'))])
+
+
+def test_long_expression():
+    num = many1(digit()).map(lambda ds: int(''.join(ds)))
+    p = expression(num, [
+        ('left', char('*') >> op(lambda a, b: a * b)),
+        ('left', char('+') >> op(lambda a, b: a + b)),
+    ])
+    inp = '+'.join(['2*3'] * 100000)
+    assert p.run(inp).result.get() == 600000
+    assert p.compile().run(inp).result.get() == 600000
@@ -0,0 +1,105 @@
+import random
+
+import pytest
+
+from gparser.parser import char, alpha, string, many, many1, maybe, \
+    regex, satisfy, undef, cut, located
+from gparser.incremental import Session, _reach
+from .test_compiler import json_like
+from .test_left_recursion import sub_grammar
+
+
+def program(counter=None):
+    # 每行一条语句：name '=' expr ';'，expr为数字、名字或括号中的求和
+    def pred(c):
+        if counter is not None:
+            counter[0] += 1
+        return c.isdigit()
+
+    name = many1(alpha()).map(''.join)
+    number = many1(satisfy(pred)).map(lambda ds: int(''.join(ds)))
+    expr, stmt = undef(), undef()
+    term = number | name | (char('(') >> expr << char(')'))
+    expr.assign((term + many(char('+') >> term)).map(lambda x, xs: [x] + xs))
+    stmt.assign((maybe(name << char('=') << cut()) + (expr << char(';')))
+                .map(lambda n, e: (n, e)) << many(char('\n')))
+    return many(stmt)
+
+
+def same(session: Session, parser, strict=False):
+    fresh = (parser.run_strict if strict else parser.run)(session.text)
+    state = session.state
+    assert state.pos == fresh.pos
+    assert type(state.result) is type(fresh.result)
+    if state.is_successful():
+        assert state.result.value == fresh.result.value
+    else:
+        assert str(state) == str(fresh)
+
+
+def random_edits(session, parser, alphabet, n, seed=0, strict=False):
+    rnd = random.Random(seed)
+    for _ in range(n):
+        start = rnd.randint(0, len(session.text))
+        end = min(len(session.text), start + rnd.choice([0, 0, 1, 2, 5]))
+        text = ''.join(rnd.choice(alphabet)
+                       for _ in range(rnd.choice([0, 1, 1, 3])))
+        session.edit(start, end, text)
+        same(session, parser, strict)
+
+
+def test_session_matches_full_parse():
+    text = ''.join('v{}=({}+x)+{};\n'.format('a' * (i % 3), i, i * 7)
+                   for i in range(30))
+    for parser in (program(), json_like(), sub_grammar()):
+        session = parser.session(text)
+        same(session, parser)
+        random_edits(session, parser, 'ab1+=();\n', 300)
+    p = json_like()
+    session = p.session('[1, [2, abc], [], [[-3]]]', strict=True)
+    random_edits(session, p, '[], -1ab', 300, seed=1, strict=True)
+
+
+def test_session_reuses_results():
+    text = ''.join('v=({}+x)+{};\n'.format(i, i * 7) for i in range(500))
+    counter = [0]
+    parser = program(counter)
+    session = parser.session(text)
+    full = counter[0]
+    middle = text.index('250+x')
+    counter[0] = 0
+    state = session.edit(middle, middle + 3, '9')
+    assert state.result.get()[250] == ('v', [[9, 'x'], 1750])
+    assert counter[0] < full / 50
+    same(session, parser)
+    # 之后的语句已平移，其错误报告在新的位置
+    counter[0] = 0
+    end = len(session.text) - 2
+    state = session.edit(end, end + 1, ')')
+    assert counter[0] < full / 50
+    same(session, parser)
+    assert not state.is_successful()
+
+
+def test_session_spans_and_regex():
+    word = located(regex(r'[a-z]+')).map(lambda w, span: (w, span))
+    words = undef()
+    words.assign(many(word << many(char(' ')) << maybe(string('\n'))))
+    parser = words.compile()
+    session = parser.session('ab cd\nef gh\n')
+    random_edits(session, words, 'ab \n', 200, seed=2)
+    with pytest.raises(ValueError):
+        session.edit(3, 2, 'x')
+
+
+def test_regex_reach():
+    assert _reach(regex(r'[a-z_]\w*').node[1]) == (0, True)
+    assert _reach(regex(r'"[^"\n]*"').node[1]) == (0, True)
+    assert _reach(regex(r'"[^"]*"').node[1]) == (0, False)
+    assert _reach(regex(r'\d+$').node[1]) == (0, False)
+    assert _reach(regex(r'(?m)\d+$').node[1]) == (0, True)
+    assert _reach(regex(r'\bif\b').node[1]) == (1, True)
+    assert _reach(regex(r'(?<=a)b').node[1]) == (None, True)
+    assert _reach(regex(r'\s+').node[1])[1] is False
+    assert _reach(regex(r'a.b').node[1])[1] is True
+    assert _reach(regex(r'(?s)a.b').node[1])[1] is False
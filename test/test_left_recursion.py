@@ -0,0 +1,58 @@
+from gparser.parser import char, undef, number, regex, ParseError, Success, \
+    MemoTable
+
+
+def sub_grammar():
+    # E = E '-' N | N
+    e = undef(left_recursive=True)
+    e.assign((e + char('-') + number()).map(lambda a, _, b: a - b) |
+             number())
+    return e
+
+
+def test_direct():
+    e = sub_grammar()
+    assert e.run_strict('10-2-3').result.value.get() == 5
+    assert e.run_strict('7').result.value.get() == 7
+    state = e.run('10-2-x')
+    assert state.result.value.get() == 8
+    assert state.text.remaining() == '-x'
+    assert isinstance(e.run('x').result, ParseError)
+
+
+def test_direct_packrat():
+    e = sub_grammar()
+    state = e.run_strict('10-2-3', packrat=True, memo=MemoTable(window=2))
+    assert state.result.value.get() == 5
+
+
+def test_indirect():
+    # A = B 'a' | 'x' ;  B = A 'b' | 'y'
+    a = undef(left_recursive=True)
+    b = undef()
+    a.assign((b + char('a')).map(lambda x, y: x + y) | char('x'))
+    b.assign((a + char('b')).map(lambda x, y: x + y) | char('y'))
+    for packrat in [False, True]:
+        state = a.run_strict('xbaba', packrat=packrat)
+        assert state.result.value.get() == 'xbaba'
+        state = a.run_strict('ya', packrat=packrat)
+        assert state.result.value.get() == 'ya'
+        state = b.run_strict('xbab', packrat=packrat)
+        assert state.result.value.get() == 'xbab'
+
+
+def test_precedence():
+    # E = E '+' T | T ;  T = T '*' F | F ;  F = <数字>
+    e = undef(left_recursive=True)
+    t = undef(left_recursive=True)
+    f = regex(r'\d+').map(int)
+    e.assign((e + char('+') + t).map(lambda x, _, y: x + y) | t)
+    t.assign((t + char('*') + f).map(lambda x, _, y: x * y) | f)
+    assert e.run_strict('1+2*3*4+5').result.value.get() == 30
+
+
+def test_long_chain():
+    n = 20000
+    state = sub_grammar().run_strict('-'.join(['1'] * n))
+    assert isinstance(state.result, Success)
+    assert state.result.value.get() == 2 - n
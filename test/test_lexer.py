@@ -0,0 +1,84 @@
+import pytest
+
+from gparser.lexer import Lexer, INVALID
+from gparser.parser import undef, many, sep_by, expression, maybe, just, \
+    label, located, eof
+from gparser.optimizer import first_chars
+from .utils import run_both
+
+
+def program():
+    # stmt = 'let' name '=' expr ';'，expr由数字、名字、调用及+、*、-组成
+    lexer = Lexer([('num', r'\d+(?:\.\d+)?'), ('name', r'[a-z_]\w*'),
+                   ('op', r'[-+*(),;=]')], skip=r'\s+|#[^\n]*')
+    lit = lexer.literal
+    expr = undef()
+    args = lit('(') >> sep_by(expr, lit(',')) << lit(')')
+    call = (lexer.kind('name') + args).map(lambda f, a: (f, a))
+    term = (lexer.kind('num').map(float) | maybe(call) |
+            lexer.kind('name') | lit('(') >> expr << lit(')'))
+    expr.assign(expression(term, [
+        ('prefix', lit('-') >> just(lambda x: ('-', x))),
+        ('left', lit('*') >> just(lambda a, b: ('*', a, b))),
+        ('left', lit('+') >> just(lambda a, b: ('+', a, b))),
+    ]))
+    stmt = ((lit('let') >> lexer.kind('name') << lit('=')) + expr) \
+        .map(lambda n, e: (n, e)) << lit(';')
+    return lexer, many(stmt)
+
+
+def test_tokenize():
+    lexer, _ = program()
+    text = lexer.tokenize('let x = 12.5 * f(y)  # 注释\n;')
+    assert [lexer.names[k] for k in text.kinds[:4]] == \
+        ['name', 'name', 'op', 'num']
+    assert [text.token_text(i) for i in range(len(text.kinds))] == \
+        ['let', 'x', '=', '12.5', '*', 'f', '(', 'y', ')', ';']
+    assert (text.starts[3], text.ends[3]) == (8, 12)
+    assert text.text_is(0, 'let') and not text.text_is(0, 'le')
+    bad = lexer.tokenize('1 + $ 2')
+    assert [lexer.names[k] for k in bad.kinds] == ['num', 'op', INVALID]
+    with pytest.raises(ValueError):
+        Lexer([('x', r'a*')])
+    for s in ('let x', '#', '12a'):
+        with pytest.raises(ValueError):
+            lexer.literal(s)
+    with pytest.raises(ValueError):
+        lexer.kind('string')
+
+
+def test_token_parsing():
+    lexer, parser = program()
+    source = 'let x = 1 + 2 * 3;\nlet let = -f(x, 2) * (4 + g());'
+    for state in run_both(parser, lexer.tokenize(source)):
+        assert state.result.get() == [
+            ('x', ('+', 1.0, ('*', 2.0, 3.0))),
+            ('let', ('*', ('-', ('f', ['x', 2.0])),
+                     ('+', 4.0, ('g', []))))]
+        assert state.pos == 28
+    # 同一输入可多次解析，位置以词法单元计
+    tokens = lexer.tokenize('  42 x')
+    for _ in range(2):
+        state = located(lexer.kind('num')).run(tokens)
+        assert tuple(state.result.value) == ('42', (0, 1))
+        assert state.text.remaining() == 'x'
+
+
+def test_token_errors():
+    lexer, parser = program()
+    source = 'let x = 1;\nlet y = * 2;'
+    for state in run_both(parser << eof(), lexer.tokenize(source)):
+        assert state.result.msg == 'Excepted: <EOF>' and state.pos == 8
+        assert str(state).splitlines()[1:] == ['(2,9)', 'let y = * 2;',
+                                               '        ^']
+    # 无法识别的字符处解析失败
+    for state in run_both(parser << eof(), lexer.tokenize('let z = 1; $')):
+        assert state.pos == 5 and str(state).splitlines()[1] == '(1,12)'
+    for state in run_both(lexer.literal('-') | lexer.kind('num'),
+                          lexer.tokenize('*')):
+        assert state.result.msg == 'Excepted: - or num' and state.pos == 0
+    for state in run_both(label(lexer.literal('+'), 'plus'),
+                          lexer.tokenize('-')):
+        assert state.result.msg == 'plus'
+    assert first_chars(lexer.literal('+') | lexer.kind('num')) == \
+        (frozenset(map(chr, (2, 0))), False)
@@ -1,3 +1,5 @@
+import re
+
 from gparser.parser import LocatedText
 
 test_str = '01234\n54321\nabcde'
@@ -30,3 +32,35 @@ def test_column_caret():
     assert LocatedText(test_str, 6).column_caret() == '^'
     assert LocatedText(test_str, 16).column_caret() == '    ^'
     assert LocatedText(test_str, 11).column_caret() == '     ^'
+
+
+def test_cursor():
+    t = LocatedText(test_str, 6)
+    assert t.offset == 6
+    assert t.char_at(6) == '5' and t.char_at(8) == '3'
+    assert t.char_at(17) == ''
+    assert t.starts_with('5432', 6) and t.starts_with('21', 9)
+    assert not t.starts_with('abc', 6)
+    assert t.match(re.compile(r'\d+'), 6).group() == '54321'
+    assert t.match(re.compile(r'[a-z]+'), 6) is None
+    assert t.is_end(17) and not t.is_end(16)
+
+
+def test_position():
+    t = LocatedText(test_str, 13)
+    assert t.position() == (3, 2)
+    assert t.position(0) == (1, 1)
+    assert t.position(5) == (1, 6)
+    assert t.position(6) == (2, 1)
+    assert t.at(17).position() == (3, 6)
+    assert t.at(6).offset == 6 and t.offset == 13
+    assert LocatedText('ab\r\ncd\n', 2).current_line() == 'ab'
+    assert LocatedText('ab\r\ncd\n', 7).current_line() == ''
+    assert LocatedText('', 0).position() == (1, 1)
+
+
+def test_origin():
+    t = LocatedText('ab\ncd', 1, origin=(5, 7))
+    assert t.position() == (5, 8)
+    assert t.position(4) == (6, 2)
+    assert t.at(3).col() == 1
@@ -0,0 +1,93 @@
+from gparser.parser import char, digit, undef, maybe, satisfy, many1, \
+    between, memo, MemoTable, Success
+
+
+def counting_digit(counter):
+    def pred(c):
+        counter[0] += 1
+        return c.isdigit()
+
+    return satisfy(pred)
+
+
+def nested_grammar(counter, memoize=False):
+    # E = T '+' E | T '-' E | T ;  T = <数字> | '(' E ')'
+    e = undef()
+    t = undef()
+    num = many1(counting_digit(counter))
+    if memoize:
+        num = num.memo()
+    e.assign(maybe(t + char('+') + e).map(lambda a, _, b: a + b) |
+             maybe(t + char('-') + e).map(lambda a, _, b: a - b) |
+             t)
+    t.assign(num.map(lambda ds: int(''.join(ds))) |
+             between(char('('), e, char(')')))
+    return e
+
+
+def test_packrat():
+    inp = '(' * 8 + '1' + ')' * 8
+    plain, fast = [0], [0]
+    assert nested_grammar(plain).run_strict(inp).result.value.get() == 1
+    state = nested_grammar(fast).run_strict(inp, packrat=True)
+    assert state.result.value.get() == 1
+    assert fast[0] * 100 < plain[0]
+
+
+def test_memo():
+    plain, fast = [0], [0]
+    inp = '(((1+2)-3)+4)'
+    assert nested_grammar(plain).run_strict(inp).result.value.get() == 4
+    assert nested_grammar(fast, memoize=True).run_strict(inp) \
+        .result.value.get() == 4
+    assert fast[0] < plain[0]
+
+
+def test_memo_hit_restores_position():
+    p = memo(digit() + digit())
+    state = (maybe(p + char('x')) | p).run('12y')
+    assert isinstance(state.result, Success)
+    assert state.text.remaining() == 'y'
+
+
+def test_memo_table_bounds():
+    t = MemoTable(capacity=3)
+    for i in range(10):
+        t.put('p', i, i)
+    assert len(t) == 3
+    assert t.get('p', 0) is None
+    assert t.get('p', 9) == 9
+
+    t = MemoTable(window=5)
+    for i in range(100):
+        t.put('p', i, i)
+        t.put('q', i, i)
+    assert len(t) <= 12
+    assert t.get('p', 99) == 99
+    assert t.get('p', 50) is None
+    t.put('p', 10, 10)
+    assert t.get('p', 10) is None
+
+    # 丢弃后重新写入的位置按新的写入顺序淘汰
+    t = MemoTable(capacity=2)
+    t.put('p', 0, 0)
+    t.put('p', 1, 1)
+    t.discard_at(0)
+    t.put('p', 0, 0)
+    t.put('p', 2, 2)
+    assert len(t) == 2 and t.get('p', 0) == 0 and t.get('p', 1) is None
+
+    t = MemoTable()
+    for i in range(100):
+        t.put('p', 99 - i, i)
+        t.discard_at(99 - i)
+        t.put('q', 99 - i, i)
+    t.release(50)
+    assert len(t) == 50 and t.get('q', 49) is None and t.get('q', 50) == 49
+    t.put('q', 10, 0)
+    assert t.get('q', 10) is None
+
+    inp = '(' * 8 + '1' + ')' * 8
+    state = nested_grammar([0]).run_strict(
+        inp, packrat=True, memo=MemoTable(window=4))
+    assert state.result.value.get() == 1
@@ -0,0 +1,86 @@
+from gparser.parser import char, digit, alpha, string, spaces, many, many1, \
+    skip_many, eof, label, number, regex, one_of, maybe, just, undef, \
+    satisfy, Success, ParseError
+from gparser.optimizer import fused, fuse, first_chars
+from .test_compiler import json_like, same
+
+
+def equal(parser, inp):
+    expected = parser.run(inp)
+    actual = parser.optimize().run(inp)
+    assert type(actual.result) is type(expected.result)
+    if isinstance(expected.result, Success):
+        assert tuple(actual.result.value) == tuple(expected.result.value)
+    else:
+        assert actual.result.msg == expected.result.msg
+    assert actual.text.offset == expected.text.offset
+    return actual
+
+
+def test_fused_node():
+    p = many(alpha()) + (string('::') >> many1(digit()))
+    f = fused(p)
+    assert f.node[0] == 'fused' and f.node[3] is p
+    assert fused(digit()) is None
+    assert fused(number()) is None
+    assert fused(label(char('a'), 'a'), keep=False) is None
+    assert fused(skip_many(char(' ')), lists_only=True) is None
+    assert fused(p, lists_only=True) is not None
+    for inp in ['ab::12x', '::1', 'ab:1', 'ab::', '']:
+        equal(p, inp)
+
+
+def test_predicate_classes():
+    # 非ASCII字符：²是isdigit而非isdecimal，٣是isdecimal，Ⅻ是isnumeric
+    inp = 'héllo_٣²Ⅻ9 x'
+    for pred in (str.isdigit, str.isalpha, str.isalnum, str.isdecimal,
+                 str.isnumeric, str.isspace):
+        p = many(satisfy(pred))
+        for i in range(len(inp)):
+            equal(p, inp[i:])
+    decimal = first_chars(satisfy(str.isdecimal))[0]
+    assert '٣' in decimal and '²' not in decimal
+    assert '²' in first_chars(satisfy(str.isdigit))[0]
+
+
+def test_no_backtrack():
+    p = many(alpha()) + char('a')
+    state = equal(p, 'aaa')
+    assert isinstance(state.result, ParseError)
+    equal(skip_many(char(' ')) >> char(' '), '   ')
+    equal(many1(char('a') | char('b')) << eof(), 'abab')
+
+
+def test_discarded_values():
+    p = (spaces() >> many(alpha()) << spaces()) + (char(',') >> digit())
+    assert equal(p, '  ab ,1').result.value == (['a', 'b'], '1')
+    equal(p, '  ab ;1')
+
+
+def test_fuse_grammar():
+    p = json_like()
+    q = fuse(p)
+    assert q is not p and q.node[0] == 'rule'
+    assert p.node[1].node[0] != 'fused'
+    for inp in ['[1, [2, abc], [], [[-3]]]', '[1, [2', '[1 2]', '"']:
+        equal(p, inp)
+        same(p, inp)
+
+
+def test_first_chars():
+    assert first_chars(char('a')) == (frozenset('a'), False)
+    assert set(' \t\n') <= first_chars(spaces())[0]
+    assert first_chars(string('null').tk()) == \
+        (first_chars(spaces())[0] | {'n'}, False)
+    assert first_chars(one_of('+-').or_not() + digit())[0] >= set('+-0')
+    assert first_chars(regex(r'(?:ab|c)?[x-z]')) == (frozenset('acxyz'),
+                                                     False)
+    assert first_chars(regex(r'a*')) == (frozenset('a'), True)
+    assert first_chars(regex(r'.')) is None
+    assert first_chars(maybe(char('a') >> char('b'))) == \
+        (frozenset('a'), False)
+    assert first_chars(many(char('a')) >> just(1)) == (frozenset('a'), True)
+    assert first_chars(alpha()) is None
+    rule = undef()
+    rule.assign(char('(') >> rule << char(')') | char('x'))
+    assert first_chars(rule) == (frozenset('(x'), False)
@@ -0,0 +1,116 @@
+import multiprocessing
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from gparser.parser import Parser, char, digit, many1, regex, ParseError, \
+    Success, string, maybe
+from gparser.parallel import run_many, split_parse
+from .test_compiler import json_like
+
+
+def compiled_grammar():
+    return json_like().compile()
+
+
+def dividing():
+    return Parser(lambda loc, pos: many1(digit()).fn(loc, pos)).map(
+        lambda ds: 1 // int(''.join(ds)))
+
+
+def inputs():
+    return ['[{}, [x, -{}]]'.format(i, i) for i in range(50)] + ['[1, ', '']
+
+
+def test_run_many_factory():
+    texts = inputs()
+    expected = [compiled_grammar().run(t) for t in texts]
+    for workers in (1, 2):
+        states = run_many(compiled_grammar, texts, workers=workers,
+                          chunksize=8)
+        assert len(states) == len(texts)
+        for state, exp in zip(states, expected):
+            assert type(state.result) is type(exp.result)
+            assert state.pos == exp.pos
+            if isinstance(exp.result, Success):
+                assert state.result.get() == exp.result.get()
+    assert states[-2].text.remaining() == ''
+
+
+def test_run_many_parser():
+    states = run_many(json_like(), ['[1]', '[1', '[[2]]'], workers=2,
+                      packrat=True)
+    assert states[0].result.get() == [1]
+    assert isinstance(states[1].result, ParseError)
+    assert states[2].result.get() == [[2]]
+
+
+def test_run_many_concurrent():
+    # 每个进程池的工作进程使用各自的语法，同时进行的调用互不影响
+    grammars = [many1(digit()).map(''.join), many1(char('a')).map(''.join)]
+    texts = ['12a', 'aa1']
+    with ThreadPoolExecutor(2) as threads:
+        runs = [threads.submit(run_many, g, texts * 20, workers=2)
+                for g in grammars * 3]
+        for i, run in enumerate(runs):
+            ends = [state.pos for state in run.result()]
+            assert ends == [[2, 0], [0, 2]][i % 2] * 20
+
+
+def test_run_many_spawn(monkeypatch):
+    context = multiprocessing.get_context('spawn')
+    monkeypatch.setattr(multiprocessing, 'get_context', lambda *a: context)
+    monkeypatch.setattr(multiprocessing, 'get_all_start_methods',
+                        lambda: ['spawn'])
+    states = run_many(compiled_grammar, ['[1]', '[2, [x]]'], workers=2)
+    assert [state.result.get() for state in states] == [[1], [2, ['x']]]
+    with pytest.raises(ValueError):
+        run_many(json_like(), ['[1]'], workers=2)
+
+
+def test_run_many_errors():
+    states = run_many(dividing, ['1', '0', 'x'], workers=2)
+    assert states[0].result.get() == 1
+    assert states[1].result.msg.startswith('ZeroDivisionError')
+    assert isinstance(states[2].result, ParseError)
+
+
+def ndjson():
+    return json_like() << char('\n')
+
+
+def test_split_parse():
+    lines = ['[{}, [x, {}]]\n'.format(i, i * 3) for i in range(300)]
+    text = ''.join(lines)
+    expected = list(ndjson().iter_parse(text))
+    for boundary in ('\n', re.compile('\n'), char('\n'), regex('\n')):
+        for workers in (1, 3):
+            state = split_parse(ndjson, text, boundary, workers=workers,
+                                parts=7)
+            assert state.result.get() == expected
+            assert state.pos == len(text)
+
+
+def test_split_parse_error():
+    text = '[1]\n[2]\n' * 50 + '[3]\n[4, x]]\n[5]\n' + '[6]\n' * 50
+    state = split_parse(ndjson(), text, workers=2, parts=5)
+    assert isinstance(state.result, ParseError)
+    assert state.pos == text.index('[4, x]]') + 6
+    assert state.text.position() == (102, 7)
+    assert state.text.current_line() == '[4, x]]'
+    whole = split_parse(ndjson(), text, workers=1, parts=1)
+    assert whole.pos == state.pos and whole.result.msg == state.result.msg
+
+
+def pinned():
+    # maybe回溯后，错误的位置固定在实际出错处
+    return maybe(string('ab') >> char('\n')) | string('x\n')
+
+
+def test_split_parse_pinned_error():
+    text = 'ab\n' * 5 + 'ac\n' + 'ab\n' * 2
+    for workers in (1, 2):
+        state = split_parse(pinned, text, workers=workers, parts=4)
+        assert state.result.offset == 16 and state.pos == 15
+        assert str(state).splitlines()[1:] == ['(6,2)', 'ac', ' ^']
@@ -0,0 +1,74 @@
+from gparser.parser import char, digit, many1, undef, maybe, name, \
+    chain_left, just
+from gparser.profiler import Profiler, profile
+from .test_compiler import json_like
+from .utils import run_both
+
+
+def calc():
+    expr = undef().name('expr')
+    num = name(many1(digit()).map(lambda ds: int(''.join(ds))), 'num')
+    term = num | char('(') >> expr << char(')')
+    expr.assign(chain_left(term, char('+') >> just(lambda a, b: a + b)))
+    return expr
+
+
+def test_stats():
+    parser = calc()
+    state, profiler = profile(parser, '1+(2+30)')
+    assert state.result.get() == 33
+    assert parser.run('1+(2+30)').result.get() == 33
+    stats = profiler.stats
+    assert stats['num'].calls == 3 and stats['num'].successes == 3
+    assert stats['num'].consumed == 4
+    assert stats['expr'].calls == 2 and stats['expr'].consumed == 8 + 4
+    assert stats['digit'].failures == 3
+    assert stats['expr'].time >= stats['expr'].self_time >= 0
+    report = profiler.report(limit=2)
+    assert report.splitlines()[1].startswith('expr')
+    assert len(report.splitlines()) == 3
+
+
+def test_name_copy():
+    # name()返回副本，原Parser不被命名
+    digits = many1(digit())
+    named = digits.name('digits')
+    assert digits.rule_name is None and named.rule_name == 'digits'
+    _, profiler = profile(digits, '12')
+    assert 'digits' not in profiler.stats
+    _, profiler = profile(named, '12')
+    assert profiler.stats['digits'].consumed == 2
+    for state in run_both(named + char('x'), '12x'):
+        assert tuple(state.result.value) == (['1', '2'], 'x')
+
+
+def test_backtracks():
+    p = maybe(name(char('a') >> char('b'), 'ab')) | char('a')
+    state, profiler = profile(p, 'ac')
+    assert state.result.get() == 'a'
+    assert profiler.stats['ab'].backtracks == 1
+    assert profiler.stats['ab'].failures == 1
+
+
+def test_flamegraph(tmp_path):
+    profiler = Profiler()
+    parser = profiler.instrument(calc())
+    parser.run('(1)')
+    parser.run('2')
+    assert profiler.stats['expr'].calls == 3
+    lines = profiler.flamegraph(str(tmp_path / 'out.folded'))
+    stacks = [line.rsplit(' ', 1)[0] for line in lines]
+    assert 'expr;num' in stacks and 'expr;(' in stacks
+    assert 'expr;expr;num;digit' in stacks
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+    assert (tmp_path / 'out.folded').read_text().splitlines() == lines
+    profiler.clear()
+    assert not profiler.stats and not profiler.flamegraph()
+
+
+def test_same_results():
+    parser = json_like()
+    inp = '[1, [2, abc], [], [[-3]]]'
+    state, profiler = profile(parser, inp)
+    assert state.result.get() == parser.run(inp).result.get()
+    assert profiler.stats
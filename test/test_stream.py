@@ -0,0 +1,124 @@
+import re
+
+import pytest
+
+from gparser.parser import char, digit, string, many, many1, maybe, regex, \
+    eof, ParseError, StreamText
+from .test_compiler import json_like
+from .test_left_recursion import sub_grammar
+
+
+def chunked(text, size):
+    for i in range(0, len(text), size):
+        yield text[i:i + size]
+
+
+def records():
+    number = many1(digit()).map(''.join)
+    item = maybe(number << string(';;')) | (number << char(';'))
+    return many(item << many(char('\n'))) << eof()
+
+
+def test_stream_same_result():
+    text = '[1, [2, abc], [], [[-3]]]'
+    p = json_like()
+    for size in (1, 3, 7, 100):
+        for parser in (p, p.optimize(), p.compile()):
+            state = parser.run_stream(chunked(text, size), lookahead=2)
+            assert state.result.get() == p.run(text).result.get()
+            assert state.pos == len(text)
+    state = sub_grammar().run_stream(chunked('10-2-3-x', 2))
+    assert state.result.get() == 5 and state.pos == 6
+    state = regex(r'\d+').run_stream(chunked('1234567', 2), lookahead=1)
+    assert state.result.get() == '1234567'
+
+
+def test_stream_long_token():
+    # 匹配失败可能只是因为数据未读完，此时继续读入并重试
+    state = regex(r'\d+;').run_stream(chunked('12345;', 2), lookahead=2)
+    assert state.result.get() == '12345;'
+    text = '"' + 'x' * 10000 + '"'
+    state = regex(r'"[^"]*"').run_stream(chunked(text, 100))
+    assert state.result.get() == text
+    # pos处的字符不能开始匹配时不读入其余数据
+    stream = StreamText(chunked('a' * 100, 4), lookahead=2)
+    assert stream.match(re.compile(r'\d+;'), 0) is None
+    assert len(stream) <= 4
+    stream = StreamText(chunked('1' * 100, 4), lookahead=2)
+    stream.max_token = 10
+    with pytest.raises(RuntimeError):
+        stream.match(re.compile(r'\d+'), 0)
+
+
+def test_stream_dispatch():
+    # |在消耗了字符的分支失败后不回到已被丢弃的位置
+    p = (char('a') >> many(char('b')) >> char('c')) | char('x')
+    state = p.run_stream(chunked('a' + 'b' * 100 + 'd', 4), lookahead=8)
+    assert state.result.msg == 'Excepted: c or x' and state.pos == 101
+    for text in ('[a ,   a[', '[ b   [', '[1, [2, ab'):
+        expected = json_like().run(text)
+        state = json_like().run_stream(chunked(text, 3), lookahead=4)
+        assert state.pos == expected.pos
+        assert state.result.msg == expected.result.msg
+
+
+def test_stream_bounded_buffer():
+    text = ''.join('{};;\n'.format(i) if i % 2 else '{};\n'.format(i)
+                   for i in range(2000)).replace('\n', '')
+    sizes = []
+
+    def chunks():
+        for chunk in chunked(text, 16):
+            sizes.append(len(stream))
+            yield chunk
+
+    stream = StreamText(chunks(), lookahead=8)
+    state = records().fn(stream, 0)
+    assert len(state.result.get()) == 2000 and state.pos == len(text)
+    assert max(sizes) < 64 and stream.base > len(text) - 64
+
+
+def test_stream_error_position():
+    text = '1;22;;\n333;\n4x'
+    state = records().run_stream(chunked(text, 2), lookahead=1)
+    assert isinstance(state.result, ParseError)
+    assert state.pos == 13
+    assert state.text.position() == (3, 2)
+    assert state.text.current_line() == '4x'
+
+
+def test_run_file(tmp_path):
+    path = tmp_path / 'data.txt'
+    path.write_text('7;' * 5000, encoding='utf-8')
+    state = records().run_file(str(path), chunk_size=100)
+    assert state.result.get() == ['7'] * 5000
+
+
+def test_iter_parse():
+    item = many1(digit()).map(''.join) << char(';') << char('\n').or_not()
+    assert list(item.iter_parse('1;22;\n333;')) == ['1', '22', '333']
+    assert list(item.compile().iter_parse('4;5;', packrat=True)) == ['4', '5']
+    assert list(item.iter_parse('')) == []
+    pulled = []
+
+    def chunks():
+        for chunk in chunked('1;22;333;' * 100, 4):
+            pulled.append(chunk)
+            yield chunk
+
+    values = item.iter_parse(chunks(), lookahead=2)
+    assert next(values) == '1' and len(pulled) == 1
+    assert len(list(values)) == 299
+    values = item.iter_parse(['1;', '2', 'x;'])
+    assert next(values) == '1'
+    with pytest.raises(RuntimeError) as e:
+        next(values)
+    assert '(1,4)' in str(e.value)
+
+
+def test_iter_parse_file(tmp_path):
+    path = tmp_path / 'data.txt'
+    path.write_text('1;\n2;\n' * 1000, encoding='utf-8')
+    item = many1(digit()).map(''.join) << char(';') << char('\n')
+    with open(str(path), encoding='utf-8') as f:
+        assert sum(int(v) for v in item.iter_parse(f)) == 3000
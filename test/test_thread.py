@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from gparser.parser import char, undef, ParseError
+from .test_compiler import json_like
+from .test_left_recursion import sub_grammar
+
+
+def inputs(n):
+    for i in range(n):
+        yield '[{0}, [{1}, abc], [[-{0}]], {1}'.format(i, i * 7) + \
+            (']' if i % 3 else '')
+
+
+def outcome(state):
+    if isinstance(state.result, ParseError):
+        return 'error', state.result.msg, state.pos
+    return 'ok', repr(state.result.value), state.pos
+
+
+@pytest.mark.parametrize('mode', ['interpreted', 'optimized', 'compiled'])
+def test_concurrent_runs(mode):
+    grammar = json_like().freeze()
+    if mode == 'optimized':
+        grammar = grammar.optimize()
+    elif mode == 'compiled':
+        grammar = grammar.compile()
+    texts = list(inputs(200))
+    expected = [outcome(grammar.run(t)) for t in texts]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        actual = list(pool.map(lambda t: outcome(grammar.run(t)), texts))
+        packrat = list(pool.map(
+            lambda t: outcome(grammar.run(t, packrat=True)), texts))
+    assert actual == expected and packrat == expected
+
+
+def test_concurrent_left_recursion():
+    grammar = sub_grammar().freeze()
+    texts = ['-'.join(str(j) for j in range(i, i + 50)) for i in range(100)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda t: grammar.run(t).result.get(), texts))
+    assert results == [i - sum(range(i + 1, i + 50)) for i in range(100)]
+
+
+def test_freeze():
+    e = undef()
+    p = char('(') >> e << char(')')
+    with pytest.raises(RuntimeError):
+        p.freeze()
+    e.assign(char('x') | p)
+    assert p.freeze() is p and e.frozen
+    with pytest.raises(RuntimeError):
+        e.assign(char('y'))
+    assert p.run('((x))').result.get() == 'x'
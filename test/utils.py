@@ -6,19 +6,28 @@ __author__ = 'Gaufoo, zhongzc_arch@outlook.com'
 from gparser.parser import Parser, Result, run_parser
 
 
+def run_both(parser: Parser, inp: str):
+    """
+    分别解释执行、融合后及编译后执行，三者结果应一致
+    """
+    yield run_parser(parser, inp)
+    yield run_parser(parser.optimize(), inp)
+    yield run_parser(parser.compile(), inp)
+
+
 def check_type(inp: (Parser, str), res_type, remaining: str):
-    state = run_parser(inp[0], inp[1])
-    assert type(state.result) == res_type
-    assert state.text.remaining() == remaining
+    for state in run_both(inp[0], inp[1]):
+        assert type(state.result) is res_type
+        assert state.text.remaining() == remaining
 
 
 def check_succ_cont(inp: (Parser, str), result, remaining: str):
-    state = run_parser(inp[0], inp[1])
-    assert state.result.value == Result(result)
-    assert state.text.remaining() == remaining
+    for state in run_both(inp[0], inp[1]):
+        assert state.result.value == Result(result)
+        assert state.text.remaining() == remaining
 
 
 def check_fail_msg(inp: (Parser, str), msg, remaining: str):
-    state = run_parser(inp[0], inp[1])
-    assert state.result.msg == msg
-    assert state.text.remaining() == remaining
+    for state in run_both(inp[0], inp[1]):
+        assert state.result.msg == msg
+        assert state.text.remaining() == remaining